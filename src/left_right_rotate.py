@@ -1,17 +0,0 @@
-def right_rotate(self, y):
-        x = y.left
-        T2 = x.right
-        x.right = y
-        y.left = T2
-        y.height = 1 + max(self.get_height(y.left), self.get_height(y.right))
-        x.height = 1 + max(self.get_height(x.left), self.get_height(x.right))
-        return x
-
-    def left_rotate(self, x):
-        y = x.right
-        T2 = y.left
-        y.left = x
-        x.right = T2
-        x.height = 1 + max(self.get_height(x.left), self.get_height(x.right))
-        y.height = 1 + max(self.get_height(y.left), self.get_height(y.right))
-        return y
\ No newline at end of file
@@ -0,0 +1,36 @@
+"""
+Versioned patient records kept in an AVL tree keyed by patient_id.
+
+The tree and the store (AVLNode, AVLPatientTree, PatientRecord) are imported
+with the package; everything else is imported the first time it is used, so
+a one-off lookup does not pay for the engines, analytics or servers.
+"""
+
+from .main import (DURABILITY_MODES, AVLNode, AVLPatientTree, InteractiveAVLTester, LogReader,
+                   PatientRecord, UpdateDelta)
+
+# name -> module it is imported from on first access
+_LAZY = {
+    "create_patient_index": "index_engines",
+    "BPlusPatientTree": "bplus_tree",
+    "CohortIndex": "cohort",
+    "LogCompactor": "compaction",
+    "ShardedPatientStore": "sharding",
+    "diff_versions": "version_diff",
+    "export_columns": "analytics",
+    "bulk_import": "bulk_import",
+    "QueryServer": "query_server",
+    "QueryClient": "query_server",
+}
+
+__all__ = ["DURABILITY_MODES", "AVLNode", "AVLPatientTree", "InteractiveAVLTester", "LogReader",
+           "PatientRecord", "UpdateDelta", *_LAZY]
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    value = getattr(import_module(f".{_LAZY[name]}", __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,88 @@
+import contextlib
+import os
+import sys
+
+from .main import InteractiveAVLTester, PatientRecord, parse_when
+
+# python -m patient_records                      interactive menu
+# python -m patient_records get <id> [<id> ...]  one line per patient
+# python -m patient_records range <lo> <hi>
+# python -m patient_records asof <time> [<id> ...]  the version current then, and those patients in it
+# python -m patient_records importtime [budget ms]
+#
+# Lookups only import the tree and the store; `importtime` checks that stays
+# under IMPORT_BUDGET_MS (cumulative -X importtime of the package, warm
+# bytecode cache, so run it once before trusting the number).
+
+IMPORT_BUDGET_MS = 25
+
+
+def _row(node):
+    return f"ID: {node.patient_id} | Name: {node.patient_name} | Cured: {node.is_cured} | Diseases: {', '.join(node.diseases)}"
+
+
+def _open_store():
+    # recovery reports on stdout; a lookup prints only its answer
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        return PatientRecord()
+
+
+def import_time(module="patient_records"):
+    # (cumulative microseconds of `module`, [(self us, cumulative us, name)] slowest first)
+    import re
+    import subprocess
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                         capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in out.splitlines():
+        m = re.match(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)", line)
+        if m:
+            rows.append((int(m.group(1)), int(m.group(2)), m.group(3) + m.group(4)))
+    total = next(cum for _, cum, name in rows if name == module)
+    return total, sorted(rows, reverse=True)
+
+
+def main(argv):
+    if not argv:
+        InteractiveAVLTester().run()
+        return 0
+    command, args = argv[0], argv[1:]
+    if command == "get" and args:
+        records, missing = _open_store(), 0
+        for pid in map(int, args):
+            node = records.search(pid)
+            print(_row(node) if node else f"ID: {pid} | not found")
+            missing += node is None
+        return 1 if missing else 0
+    if command == "range" and len(args) == 2:
+        records = _open_store()
+        records.tree_obj.root = records.root
+        for node in records.tree_obj.range_query(int(args[0]), int(args[1])):
+            print(_row(node))
+        return 0
+    if command == "asof" and args:
+        records = _open_store()
+        try:
+            version, root = records.as_of(parse_when(args[0]))
+        except ValueError as e:
+            print(e)
+            return 1
+        how = records.last_as_of
+        print(f"version {version} ({how['source']}, {how['steps']} steps, {how['seconds'] * 1000:.1f} ms)")
+        for pid in map(int, args[1:]):
+            node = records.tree_obj._search(root, pid)
+            print(_row(node) if node else f"ID: {pid} | not found")
+        return 0
+    if command == "importtime":
+        budget = float(args[0]) if args else IMPORT_BUDGET_MS
+        total, rows = import_time()
+        for own, cum, name in rows[:10]:
+            print(f"{own / 1000:8.2f} ms self {cum / 1000:8.2f} ms total  {name}")
+        print(f"import patient_records: {total / 1000:.2f} ms (budget {budget:g} ms)")
+        return 0 if total / 1000 <= budget else 1
+    print("usage: python -m patient_records [get <id>... | range <lo> <hi> | asof <time> [<id>...] | importtime [budget ms]]")
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
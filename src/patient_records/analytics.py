@@ -0,0 +1,180 @@
+from array import array
+
+from .main import DISEASES, PatientRecord
+
+
+_np = False
+
+
+def _numpy():
+    # NumPy is optional (the stdlib array module is used instead) and slow to
+    # import, so it is only looked for the first time columns are built
+    global _np
+    if _np is False:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _np = numpy
+    return _np
+
+
+class PatientColumns:
+    """
+    Column-oriented copy of the patient set, in patient_id order.
+    Names and diseases are dictionary encoded: name_codes[i] indexes
+    name_dictionary, and the diseases of patient i are
+    disease_values[disease_offsets[i]:disease_offsets[i + 1]] (CSR layout)
+    indexing disease_dictionary.
+    """
+
+    def __init__(self, patient_id, is_cured, name_codes, name_dictionary,
+                 disease_offsets, disease_values, disease_dictionary):
+        self.patient_id = patient_id
+        self.is_cured = is_cured
+        self.name_codes = name_codes
+        self.name_dictionary = name_dictionary
+        self.disease_offsets = disease_offsets
+        self.disease_values = disease_values
+        self.disease_dictionary = disease_dictionary
+
+    def __len__(self):
+        return len(self.patient_id)
+
+    def as_dict(self):
+        return {
+            "patient_id": self.patient_id,
+            "is_cured": self.is_cured,
+            "name_codes": self.name_codes,
+            "name_dictionary": self.name_dictionary,
+            "disease_offsets": self.disease_offsets,
+            "disease_values": self.disease_values,
+            "disease_dictionary": self.disease_dictionary,
+        }
+
+    def names(self):
+        return [self.name_dictionary[c] for c in self.name_codes]
+
+    def diseases_of(self, i):
+        lo, hi = self.disease_offsets[i], self.disease_offsets[i + 1]
+        return [self.disease_dictionary[c] for c in self.disease_values[lo:hi]]
+
+
+# ---------- export ----------
+def export_columns(root):
+    # one iterative in-order walk, no per-node printing
+    np = _numpy()
+    ids, cured, name_codes, offsets, values = array('q'), array('b'), array('l'), array('q', [0]), array('l')
+    names, diseases = {}, {}  # diseases: vocabulary code -> local code
+    stack, node = [], root
+    while stack or node:
+        while node:
+            stack.append(node)
+            node = node.left
+        node = stack.pop()
+        ids.append(node.patient_id)
+        cured.append(1 if node.is_cured else 0)
+        name_codes.append(names.setdefault(node.patient_name, len(names)))
+        for c in node.disease_codes:
+            values.append(diseases.setdefault(c, len(diseases)))
+        offsets.append(len(values))
+        node = node.right
+
+    name_dictionary = list(names)
+    disease_dictionary = DISEASES.decode(diseases)
+    if np is not None:
+        return PatientColumns(
+            np.frombuffer(ids, dtype=np.int64).copy(), np.frombuffer(cured, dtype=np.int8).astype(bool),
+            np.asarray(name_codes, dtype=np.int32), name_dictionary,
+            np.frombuffer(offsets, dtype=np.int64).copy(), np.asarray(values, dtype=np.int32),
+            disease_dictionary)
+    return PatientColumns(ids, cured, name_codes, name_dictionary, offsets, values, disease_dictionary)
+
+
+# ---------- aggregates ----------
+# A disease listed twice on one patient counts once, in every aggregate (as in
+# the cohort index).
+def _pairs(cols, lo=0, hi=None):
+    # distinct (row, disease) pairs of rows lo..hi-1 as two NumPy arrays, sorted by row
+    np = _numpy()
+    hi = len(cols) if hi is None else hi
+    a, b = cols.disease_offsets[lo], cols.disease_offsets[hi]
+    rows = np.repeat(np.arange(lo, hi, dtype=np.int64), np.diff(cols.disease_offsets[lo:hi + 1]))
+    keys = np.unique(rows * len(cols.disease_dictionary) + cols.disease_values[a:b])
+    return np.divmod(keys, len(cols.disease_dictionary))
+
+
+def _distinct(cols, i):
+    o = cols.disease_offsets
+    return set(cols.disease_values[o[i]:o[i + 1]])
+
+
+def disease_counts(cols):
+    np = _numpy()
+    k = len(cols.disease_dictionary)
+    if np is not None:
+        return np.bincount(_pairs(cols)[1], minlength=k)
+    counts = [0] * k
+    for i in range(len(cols)):
+        for v in _distinct(cols, i):
+            counts[v] += 1
+    return counts
+
+
+def cure_rate_per_disease(cols):
+    # cured patients / patients, per disease name
+    np = _numpy()
+    k = len(cols.disease_dictionary)
+    totals = disease_counts(cols)
+    if np is not None:
+        rows, values = _pairs(cols)
+        cured = np.bincount(values, weights=cols.is_cured[rows], minlength=k)
+    else:
+        cured = [0] * k
+        for i in range(len(cols)):
+            if cols.is_cured[i]:
+                for v in _distinct(cols, i):
+                    cured[v] += 1
+    return {cols.disease_dictionary[d]: (float(cured[d] / totals[d]) if totals[d] else 0.0) for d in range(k)}
+
+
+def disease_cooccurrence(cols, chunk_rows=65536):
+    """
+    k x k matrix of how many patients have both diseases (diagonal = patients
+    with that disease). Only the pairs each patient actually has are counted:
+    with NumPy, the rows of a chunk are grouped by how many diseases they
+    have, and a group of m-disease rows adds its m x m pairs at once. The work
+    is the sum of m^2 over patients, not patients x k^2.
+    """
+    np = _numpy()
+    k = len(cols.disease_dictionary)
+    if np is not None:
+        out = np.zeros((k, k), dtype=np.int64)
+        flat = out.reshape(-1)
+        for lo in range(0, len(cols), chunk_rows):
+            rows, values = _pairs(cols, lo, min(lo + chunk_rows, len(cols)))
+            lengths = np.bincount(rows - lo)
+            per_value = lengths[rows - lo]
+            for m in np.unique(lengths):
+                if m == 0:
+                    continue
+                group = values[per_value == m].reshape(-1, m)
+                keys, counts = np.unique((group[:, :, None] * k + group[:, None, :]).reshape(-1),
+                                         return_counts=True)
+                flat[keys] += counts
+        return out
+    out = [[0] * k for _ in range(k)]
+    for i in range(len(cols)):
+        row = _distinct(cols, i)
+        for x in row:
+            for y in row:
+                out[x][y] += 1
+    return out
+
+
+if __name__ == "__main__":
+    records = PatientRecord()
+    cols = export_columns(records.root)
+    print(f"Exported {len(cols)} patients, {len(cols.disease_dictionary)} distinct diseases")
+    for disease, rate in sorted(cure_rate_per_disease(cols).items()):
+        print(f"{disease}: {rate:.1%} cured")
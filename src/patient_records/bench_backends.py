@@ -0,0 +1,111 @@
+import os
+import random
+import sys
+import tempfile
+import time
+
+from . import instrumentation
+from .index_engines import create_patient_index
+
+DISEASES = ["flu", "covid", "cold", "fever", "cough", "asthma", "diabetes", "malaria"]
+
+
+def bench(backend, n, lookups, ranges, seed=1, cache_pages=1024):
+    rng = random.Random(seed)
+    ids = list(range(n))
+    rng.shuffle(ids)
+    path = os.path.join(tempfile.mkdtemp(), "patients.bpt")
+    index = create_patient_index(backend, path, cache_pages=cache_pages) if backend == "bplus" \
+        else create_patient_index(backend)
+    result = {"backend": backend, "n": n}
+
+    t = time.perf_counter()
+    for pid in ids:
+        index.insert(pid, f"P{pid}", pid % 3 == 0, rng.sample(DISEASES, 2))
+    if backend == "bplus":
+        index.flush()
+    result["insert_ops_s"] = n / (time.perf_counter() - t)
+
+    t = time.perf_counter()
+    for _ in range(lookups):
+        index.search(rng.randrange(n))
+    result["search_ops_s"] = lookups / (time.perf_counter() - t)
+
+    t = time.perf_counter()
+    rows = 0
+    for _ in range(ranges):
+        lo = rng.randrange(n)
+        rows += sum(1 for _ in index.range_query(lo, lo + 1000))
+    result["range_rows_s"] = rows / (time.perf_counter() - t)
+
+    if backend == "bplus":
+        result["page_reads"] = index.page_reads
+        result["pages"] = index.page_count
+        index.close()
+        result["file_mb"] = os.path.getsize(path) / 2 ** 20
+    return result
+
+
+MIXES = {"read-heavy": 0.9, "write-heavy": 0.2}  # share of operations that are lookups
+
+
+def bench_mix(backend, n, ops, read_share, seed=1):
+    """
+    Steady-state mix on an index preloaded with n patients: `read_share` of the
+    ops are lookups, the rest alternate between inserting a new patient and
+    removing a random one, so the size stays around n.
+    """
+    index, rng, ids = preload(backend, n, seed)
+    t = time.perf_counter()
+    writes = run_mix(index, rng, ids, n, ops, read_share)
+    elapsed = time.perf_counter() - t
+    # rotations come from a second, untimed run of the same mix with the counters on
+    index, rng, ids = preload(backend, n, seed)
+    metrics = instrumentation.Metrics()
+    instrumentation.enable(metrics)
+    try:
+        run_mix(index, rng, ids, n, ops, read_share)
+    finally:
+        instrumentation.disable()
+    return {"backend": backend, "n": n, "reads": f"{read_share:.0%}", "ops_s": ops / elapsed,
+            "rotations_per_write": metrics.counters.get("rotations_total", 0) / max(writes, 1)}
+
+
+def preload(backend, n, seed):
+    rng = random.Random(seed)
+    ids = list(range(0, 2 * n, 2))
+    rng.shuffle(ids)
+    index = create_patient_index(backend)
+    for pid in ids:
+        index.insert(pid, f"P{pid}", pid % 3 == 0, rng.sample(DISEASES, 2))
+    return index, rng, ids
+
+
+def run_mix(index, rng, ids, n, ops, read_share):
+    # returns how many of the ops were writes
+    next_id, writes = 2 * n + 1, 0
+    for _ in range(ops):
+        if rng.random() < read_share:
+            index.search(ids[rng.randrange(len(ids))])
+        elif writes % 2 == 0:
+            index.insert(next_id, f"P{next_id}", False, rng.sample(DISEASES, 2))
+            ids.append(next_id)
+            next_id, writes = next_id + 2, writes + 1
+        else:
+            i = rng.randrange(len(ids))
+            ids[i], ids[-1] = ids[-1], ids[i]
+            index.remove(ids.pop())
+            writes += 1
+    return writes
+
+
+if __name__ == "__main__":
+    # python -m patient_records.bench_backends [n] [backends...]   e.g. python -m patient_records.bench_backends 1000000 avl rbtree bplus
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    backends = sys.argv[2:] or ["avl", "rbtree", "treap", "sorted", "bplus"]
+    rows = [bench(backend, n, lookups=min(n, 100000), ranges=100) for backend in backends]
+    for share in MIXES.values():
+        rows += [bench_mix(backend, n, min(n, 100000), share) for backend in backends if backend != "bplus"]
+    for r in rows:
+        print(" | ".join(f"{k}: {v:,.2f}" if isinstance(v, float) and v < 100 else
+                         f"{k}: {v:,.0f}" if isinstance(v, float) else f"{k}: {v}" for k, v in r.items()))
@@ -0,0 +1,109 @@
+import contextlib
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from .main import LogReader, PatientRecord
+from .segments import CODECS
+
+# Runs in a temp directory; point TMPDIR at the disk to measure.
+
+DISEASES = ["flu", "covid", "cold", "fever", "cough", "asthma", "diabetes", "malaria",
+            "hypertension", "migraine", "bronchitis", "pneumonia"]
+
+
+def footprint(storage, names):
+    # (bytes in the files, bytes the file system allocated for them)
+    size = blocks = 0
+    for name in names:
+        st = os.stat(os.path.join(storage, name))
+        size += st.st_size
+        blocks += getattr(st, "st_blocks", (st.st_size + 4095) // 4096 * 8) * 512
+    return size, blocks
+
+
+def replay(records):
+    # every version applied from an empty tree, returns records/s
+    reader, root = LogReader(records), None
+    for name in records.list_version_files():
+        root, ok, _ = reader.apply(root, name)
+    return reader.records_per_second()
+
+
+def random_reads(records, n, seed=1):
+    names = records.list_version_files()
+    rng = random.Random(seed)
+    t = time.perf_counter()
+    for _ in range(n):
+        records.read_version_file(rng.choice(names))
+    return (time.perf_counter() - t) / n
+
+
+def build_store(ops, seed=1):
+    storage = tempfile.mkdtemp(prefix="compression-")
+    rng = random.Random(seed)
+    records = PatientRecord(storage, checkpoint_every_ops=10 ** 9, checkpoint_every_bytes=1 << 40)
+    live = []
+    for i in range(ops):
+        r = rng.random()
+        if r < 0.5 or not live:
+            pid = len(live) * 7 + 1
+            records.add(pid, f"Patient{pid}", False, rng.sample(DISEASES, rng.randint(1, 4)))
+            live.append(pid)
+        elif r < 0.75:
+            records.set_cured(rng.choice(live), rng.random() < 0.5)
+        elif r < 0.95:
+            records.add_disease(rng.choice(live), rng.choice(DISEASES))
+        else:
+            records.remove(live.pop(rng.randrange(len(live))))
+    records.checkpoint()
+    return storage
+
+
+def bench(ops):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        storage = build_store(ops)
+        records = PatientRecord(storage)
+    names = records.loose_version_files()
+    size, allocated = footprint(storage, names)
+    rows = [{"storage": "loose files", "versions": len(names), "bytes": size, "allocated": allocated,
+             "replay_rec_s": replay(records), "random_read_us": random_reads(records, 2000) * 1e6}]
+    # the preset dictionary pays off on small blocks, which keep random reads cheap
+    for codec, block_size in [(codec, 1 << 14) for codec in CODECS] + [("zlib", 1024), ("zdict", 1024)]:
+        copy = f"{storage}-{codec}-{block_size}"
+        shutil.copytree(storage, copy)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            sealed = PatientRecord(copy)
+            t = time.perf_counter()
+            segment = sealed.seal_versions(codec, block_size=block_size)
+            seal_s = time.perf_counter() - t
+            sealed = PatientRecord(copy)  # replay through freshly opened segments
+        size, allocated = footprint(copy, [segment])
+        rows.append({"storage": f"segment {codec} {block_size // 1024} KiB", "versions": len(sealed.segments),
+                     "bytes": size, "allocated": allocated, "seal_s": seal_s, "replay_rec_s": replay(sealed),
+                     "random_read_us": random_reads(sealed, 2000) * 1e6})
+        shutil.rmtree(copy, ignore_errors=True)
+
+    for codec in (None, "zlib", "lzma"):
+        records.snapshot_compression = codec
+        t = time.perf_counter()
+        path = records.write_snapshot(records.root, "bench_snapshot", records.last_version,
+                                      records.hash_function(records.root))
+        write_s = time.perf_counter() - t
+        t = time.perf_counter()
+        records.load_snapshot("bench_snapshot")
+        rows.append({"storage": f"snapshot {codec or 'none'}", "bytes": os.path.getsize(path),
+                     "write_s": write_s, "load_s": time.perf_counter() - t})
+    shutil.rmtree(storage, ignore_errors=True)
+    return rows
+
+
+if __name__ == "__main__":
+    # python -m patient_records.bench_compression [ops]
+    ops = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    for r in bench(ops):
+        print(" | ".join(f"{k}: {v:,.3f}" if isinstance(v, float) else
+                         f"{k}: {v:,}" if isinstance(v, int) else f"{k}: {v}" for k, v in r.items()))
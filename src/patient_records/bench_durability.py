@@ -0,0 +1,88 @@
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+
+from .main import DURABILITY_MODES, PatientRecord
+
+# Runs in a temp directory; point TMPDIR at the disk to measure.
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def bench_mode(mode, writers, ops, batch_size=32, interval_ms=10):
+    """
+    `writers` threads add `ops` patients in total to one store. Call latency is
+    how long add() took; commit latency is from a record being written to the
+    sync that covered it (not measured for "none", which never syncs).
+    """
+    storage = tempfile.mkdtemp(prefix="durability-")
+    records = PatientRecord(storage, durability=mode, commit_interval_ms=interval_ms,
+                            checkpoint_every_ops=10 ** 9, checkpoint_every_bytes=1 << 40)
+    committer = records.committer
+    written_at, synced = {}, []
+    enqueue = committer.enqueue
+
+    def timed_enqueue(path):
+        ticket = enqueue(path)
+        written_at[ticket] = time.perf_counter()
+        return ticket
+    committer.enqueue = timed_enqueue
+    committer.listener = lambda upto, t: synced.append((upto, t))
+
+    per_writer = ops // writers
+    call_latencies = [[] for _ in range(writers)]
+
+    def writer(k):
+        out = call_latencies[k]
+        for i in range(per_writer):
+            pid = k * per_writer + i
+            t = time.perf_counter()
+            records.add(pid, f"P{pid}", False, ["flu"])
+            out.append(time.perf_counter() - t)
+            if mode == "per-batch" and (i + 1) % batch_size == 0:
+                records.commit()
+        if mode == "per-batch":
+            records.commit()
+
+    threads = [threading.Thread(target=writer, args=(k,)) for k in range(writers)]
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        t = time.perf_counter()
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        records.close()
+        elapsed = time.perf_counter() - t
+
+    commit_latencies = []
+    marks = [upto for upto, _ in synced]
+    for ticket, at in written_at.items():
+        i = bisect_left(marks, ticket)
+        if i < len(marks):
+            commit_latencies.append(synced[i][1] - at)
+    calls = [x for out in call_latencies for x in out]
+    shutil.rmtree(storage, ignore_errors=True)
+    return {"mode": mode, "writers": writers, "ops_s": len(calls) / elapsed,
+            "call_p50_ms": percentile(calls, 0.5) * 1e3, "call_p99_ms": percentile(calls, 0.99) * 1e3,
+            "commit_p99_ms": percentile(commit_latencies, 0.99) * 1e3 if mode != "none" else None,
+            "syncs": committer.commits, "files_per_sync": committer.files_synced / max(committer.commits, 1)}
+
+
+if __name__ == "__main__":
+    # python -m patient_records.bench_durability [ops] [writers...]   e.g. python -m patient_records.bench_durability 2000 1 8
+    ops = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    writer_counts = [int(w) for w in sys.argv[2:]] or [1, 8]
+    for writers in writer_counts:
+        for mode in DURABILITY_MODES:
+            r = bench_mode(mode, writers, ops)
+            print(" | ".join(f"{k}: {v:,.2f}" if isinstance(v, float) else f"{k}: {v}" for k, v in r.items()))
@@ -0,0 +1,74 @@
+import random
+import sys
+import tempfile
+import time
+
+from .main import AVLPatientTree
+from .paging import PagedPatientTree
+
+DISEASES = ["flu", "covid", "cold", "fever", "cough", "asthma", "diabetes", "malaria"]
+
+
+def _ids(n, lookups, skew, rng):
+    # skew: share of lookups that go to the hottest 1% of patients, a block of consecutive ids
+    hot = max(n // 100, 1)
+    for _ in range(lookups):
+        yield rng.randrange(hot) if rng.random() < skew else rng.randrange(n)
+
+
+def bench(n, budget_mb, lookups, ranges, skew=0.0, page_height=6, seed=1):
+    """
+    n patients inserted in random order into a PagedPatientTree with a budget
+    of budget_mb (None: a plain AVLPatientTree), then `lookups` searches and
+    `ranges` scans of 1000 ids. Reports the paging counters after the reads.
+    """
+    rng = random.Random(seed)
+    ids = list(range(n))
+    rng.shuffle(ids)
+    tree = AVLPatientTree() if budget_mb is None else \
+        PagedPatientTree(int(budget_mb * 2 ** 20), tempfile.gettempdir(), page_height)
+    result = {"n": n, "budget_mb": budget_mb or "none", "skew": skew}
+
+    t = time.perf_counter()
+    for pid in ids:
+        tree.insert(pid, f"P{pid}", pid % 3 == 0, rng.sample(DISEASES, 2))
+    result["insert_ops_s"] = n / (time.perf_counter() - t)
+
+    paged = isinstance(tree, PagedPatientTree)
+    if paged:
+        faults, evictions = tree.faults, tree.evictions
+    t = time.perf_counter()
+    for pid in _ids(n, lookups, skew, rng):
+        tree.search(pid)
+    elapsed = time.perf_counter() - t
+    result["search_ops_s"] = lookups / elapsed
+    if paged:
+        result["search_faults_s"] = (tree.faults - faults) / elapsed
+        result["search_evictions"] = tree.evictions - evictions
+
+    t = time.perf_counter()
+    rows = 0
+    for _ in range(ranges):
+        lo = rng.randrange(n)
+        rows += sum(1 for _ in tree.range_query(lo, lo + 1000))
+    result["range_rows_s"] = rows / (time.perf_counter() - t)
+
+    if paged:
+        stats = tree.stats()
+        result.update(resident_nodes=stats["resident_nodes"], resident_mb=stats["resident_bytes"] / 2 ** 20,
+                      faults=stats["faults"], evictions=stats["evictions"],
+                      swap_mb=stats["swap_bytes"] / 2 ** 20)
+        tree.swap.close()
+    return result
+
+
+if __name__ == "__main__":
+    # python -m patient_records.bench_memory [n] [budget MB ...]   e.g. python -m patient_records.bench_memory 1000000 8 32
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    budgets = [float(b) for b in sys.argv[2:]] or [4.0, 16.0]
+    rows = [bench(n, None, min(n, 100000), 50)]
+    for budget in budgets:
+        rows += [bench(n, budget, min(n, 100000), 50, skew) for skew in (0.0, 0.9)]
+    for r in rows:
+        print(" | ".join(f"{k}: {v:,.2f}" if isinstance(v, float) and v < 100 else
+                         f"{k}: {v:,.0f}" if isinstance(v, float) else f"{k}: {v}" for k, v in r.items()))
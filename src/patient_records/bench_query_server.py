@@ -0,0 +1,146 @@
+import asyncio
+import contextlib
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .bench_durability import percentile
+from .main import AVLNode, AVLPatientTree, PatientRecord
+
+DISEASES = ["flu", "covid", "cold", "fever", "cough", "asthma", "diabetes", "malaria"]
+# share of requests per kind; multiget asks for MULTIGET ids in one request
+MIX = {"get": 0.6, "multiget": 0.2, "range": 0.1, "cohort": 0.05, "history": 0.05}
+MULTIGET = 16
+
+
+def make_store(n, changes=2000, seed=1):
+    # n patients as a base snapshot plus `changes` logged updates, so history has something to show
+    rng = random.Random(seed)
+    storage = tempfile.mkdtemp(prefix="query-server-")
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        records = PatientRecord(storage, checkpoint_every_ops=10 ** 9, checkpoint_every_bytes=1 << 40)
+        nodes = [AVLNode(pid, f"P{pid}", pid % 3 == 0, rng.sample(DISEASES, 2)) for pid in range(n)]
+        records.install_base(AVLPatientTree().build_from_sorted(nodes))
+        for _ in range(changes):
+            pid = rng.randrange(min(n, 1000))
+            records.set_cured(pid, rng.random() < 0.5)
+    return storage
+
+
+def start_server(storage, socket_path):
+    # the server in a process of its own, so the load generator does not share its GIL
+    package_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.Popen([sys.executable, "-m", "patient_records.query_server", socket_path, storage],
+                            cwd=package_parent, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while not os.path.exists(socket_path):
+        if proc.poll() is not None or time.monotonic() > deadline:
+            raise RuntimeError("query server did not start")
+        time.sleep(0.05)
+    return proc
+
+
+def _request(kind, n, rng):
+    if kind == "get":
+        return {"op": "get", "ids": [rng.randrange(n)]}
+    if kind == "multiget":
+        return {"op": "get", "ids": [rng.randrange(n) for _ in range(MULTIGET)]}
+    if kind == "range":
+        lo = rng.randrange(n)
+        return {"op": "range", "lo": lo, "hi": lo + 99}
+    if kind == "cohort":
+        return {"op": "cohort", "query": f"{rng.choice(DISEASES)} AND NOT cured", "count_only": True}
+    return {"op": "history", "patient_id": rng.randrange(min(n, 1000))}
+
+
+async def _connection(socket_path, n, seconds, depth, seed, latencies):
+    # keeps `depth` requests in flight; a reply's latency runs from its request being written
+    rng = random.Random(seed)
+    kinds, weights = list(MIX), list(MIX.values())
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    in_flight = deque()
+    deadline = time.perf_counter() + seconds
+
+    def send():
+        kind = rng.choices(kinds, weights)[0]
+        writer.write(json.dumps(_request(kind, n, rng)).encode() + b"\n")
+        in_flight.append((kind, time.perf_counter()))
+
+    for _ in range(depth):
+        send()
+    errors = 0
+    while in_flight:
+        line = await reader.readline()
+        now = time.perf_counter()
+        kind, sent = in_flight.popleft()
+        latencies[kind].append(now - sent)
+        errors += not json.loads(line)["ok"]
+        if now < deadline:
+            send()
+            await writer.drain()
+    writer.close()
+    return errors
+
+
+def run_clients(socket_path, n, seconds, connections, depth, seed=1):
+    # one client process: `connections` pipelined connections on one event loop
+    latencies = {kind: [] for kind in MIX}
+
+    async def main():
+        return await asyncio.gather(*(_connection(socket_path, n, seconds, depth, seed * 1000 + i, latencies)
+                                      for i in range(connections)))
+    errors = sum(asyncio.run(main()))
+    return latencies, errors
+
+
+def bench(socket_path, n, seconds=5.0, processes=2, connections=4, depth=16):
+    """
+    `processes` client processes with `connections` connections each, every one
+    keeping `depth` requests pipelined, for `seconds`. Returns QPS and latency
+    percentiles in ms, overall and per request kind.
+    """
+    t = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        parts = list(pool.map(run_clients, [socket_path] * processes, [n] * processes, [seconds] * processes,
+                              [connections] * processes, [depth] * processes, range(1, processes + 1)))
+    elapsed = time.perf_counter() - t
+    merged = {kind: [v for latencies, _ in parts for v in latencies[kind]] for kind in MIX}
+    every = [v for values in merged.values() for v in values]
+    result = {"connections": processes * connections, "depth": depth, "requests": len(every),
+              "errors": sum(errors for _, errors in parts), "qps": len(every) / elapsed}
+    for name, values in [("all", every)] + list(merged.items()):
+        for p in (0.5, 0.99, 0.999):
+            result[f"{name}_p{p * 100:g}_ms"] = percentile(values, p) * 1000
+    return result
+
+
+if __name__ == "__main__":
+    # python -m patient_records.bench_query_server [n] [seconds] [connections per process] [depth] [socket]
+    # Without a socket it builds a store of n patients in a temp directory and starts a server on it;
+    # with one, it loads a running `python -m patient_records.query_server <socket>` (ids below n).
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    connections = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    depths = [int(sys.argv[4])] if len(sys.argv) > 4 else [1, 16]
+    server, storage, socket_path = None, None, sys.argv[5] if len(sys.argv) > 5 else None
+    if socket_path is None:
+        storage = make_store(n)
+        socket_path = os.path.join(storage, "query.sock")
+        server = start_server(storage, socket_path)
+    try:
+        for depth in depths:
+            r = bench(socket_path, n, seconds, connections=connections, depth=depth)
+            print(" | ".join(f"{k}: {v:,.3f}" if isinstance(v, float) and v < 100 else
+                             f"{k}: {v:,.0f}" if isinstance(v, float) else f"{k}: {v}" for k, v in r.items()))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+            shutil.rmtree(storage, ignore_errors=True)
@@ -0,0 +1,325 @@
+import os
+import struct
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+from .main import AVLNode
+
+# ---------------- ON-DISK LAYOUT ----------------
+# page 0: header | page n >= 1: one tree node, padded to page_size
+#   leaf:     type, count, next leaf page, then per patient: id, is_cured, payload length, payload
+#   internal: type, count, then count keys and count + 1 child page numbers
+# payload = name + "\x1f" + comma separated diseases (utf-8)
+
+MAGIC = b"PBT1"
+HEADER = struct.Struct("<4sIqqq")  # magic, page_size, root page, page count, patient count
+PAGE_HEAD = struct.Struct("<BHq")  # type, entries, next leaf (0 = none)
+ENTRY = struct.Struct("<qBH")
+LEAF, INTERNAL = 1, 2
+
+
+class _Leaf:
+    __slots__ = ("page", "keys", "values", "next", "size")
+
+    def __init__(self, page):
+        self.page = page
+        self.keys = []
+        self.values = []  # (is_cured, payload bytes)
+        self.next = 0
+        self.size = PAGE_HEAD.size
+
+
+class _Internal:
+    __slots__ = ("page", "keys", "children")
+
+    def __init__(self, page):
+        self.page = page
+        self.keys = []
+        self.children = []
+
+
+def _encode_payload(name, diseases):
+    return (name + "\x1f" + ",".join(diseases)).encode()
+
+
+def _decode_row(pid, value):
+    cured, payload = value
+    name, _, dis = payload.decode().partition("\x1f")
+    return AVLNode(pid, name, bool(cured), dis.split(",") if dis else [])
+
+
+class BPlusPatientTree:
+    """
+    Page-oriented B+-tree over patient_id kept in a single file, with an LRU
+    page cache of decoded nodes (dirty pages are written back on eviction and
+    on flush()). Same operations as AVLPatientTree; returned nodes are
+    detached copies, so changes must go through update(). It is a standalone
+    index (see create_patient_index); PatientRecord does not store into it.
+
+    Deletes do not merge underfull pages and emptied pages are not reused,
+    so under insert/remove churn the file only grows. To reclaim the space,
+    copy inorder_nodes() into a new tree and replace the file with it.
+    """
+
+    def __init__(self, path, page_size=4096, cache_pages=1024):
+        self.path = path
+        # a split touches at most two pages per level, keep well above that
+        self.cache_pages = max(cache_pages, 64)
+        self.cache = OrderedDict()
+        self.dirty = set()
+        self.page_reads = 0
+        self.page_writes = 0
+        exists = os.path.exists(path) and os.path.getsize(path) >= HEADER.size
+        self.file = open(path, "r+b" if exists else "w+b")
+        if exists:
+            magic, self.page_size, self.root_page, self.page_count, self.count = HEADER.unpack(
+                self.file.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a B+-tree file")
+        else:
+            self.page_size, self.page_count, self.count = page_size, 1, 0
+            root = self._new(_Leaf)
+            self.root_page = root.page
+            self.flush()
+        self.max_keys = (self.page_size - PAGE_HEAD.size - 8) // 16
+
+    # ---------- page cache ----------
+    def _new(self, cls):
+        node = cls(self.page_count)
+        self.page_count += 1
+        self._cache(node)
+        self.dirty.add(node.page)
+        return node
+
+    def _cache(self, node):
+        self.cache[node.page] = node
+        while len(self.cache) > self.cache_pages:
+            page, old = self.cache.popitem(last=False)
+            if page in self.dirty:
+                self._write(old)
+                self.dirty.discard(page)
+
+    def _touch(self, node):
+        # mark modified; re-cache in case the page was evicted while the caller held it
+        self.dirty.add(node.page)
+        if node.page not in self.cache:
+            self._cache(node)
+
+    def _get(self, page):
+        node = self.cache.get(page)
+        if node is not None:
+            self.cache.move_to_end(page)
+            return node
+        self.file.seek(page * self.page_size)
+        node = self._decode(page, self.file.read(self.page_size))
+        self.page_reads += 1
+        self._cache(node)
+        return node
+
+    def _decode(self, page, raw):
+        kind, n, nxt = PAGE_HEAD.unpack_from(raw, 0)
+        pos = PAGE_HEAD.size
+        if kind == LEAF:
+            node = _Leaf(page)
+            node.next = nxt
+            for _ in range(n):
+                pid, cured, length = ENTRY.unpack_from(raw, pos)
+                pos += ENTRY.size
+                node.keys.append(pid)
+                node.values.append((cured, raw[pos:pos + length]))
+                pos += length
+            node.size = pos
+            return node
+        node = _Internal(page)
+        node.keys = list(struct.unpack_from(f"<{n}q", raw, pos))
+        node.children = list(struct.unpack_from(f"<{n + 1}q", raw, pos + 8 * n))
+        return node
+
+    def _write(self, node):
+        if isinstance(node, _Leaf):
+            parts = [PAGE_HEAD.pack(LEAF, len(node.keys), node.next)]
+            for pid, (cured, payload) in zip(node.keys, node.values):
+                parts.append(ENTRY.pack(pid, cured, len(payload)))
+                parts.append(payload)
+        else:
+            n = len(node.keys)
+            parts = [PAGE_HEAD.pack(INTERNAL, n, 0), struct.pack(f"<{n}q", *node.keys),
+                     struct.pack(f"<{n + 1}q", *node.children)]
+        data = b"".join(parts)
+        if len(data) > self.page_size:
+            # padding does not truncate: an oversized page would run into the next one
+            raise ValueError(f"page {node.page} holds {len(data)} bytes, more than the {self.page_size}-byte page")
+        self.file.seek(node.page * self.page_size)
+        self.file.write(data.ljust(self.page_size, b"\0"))
+        self.page_writes += 1
+
+    def flush(self):
+        for page in sorted(self.dirty):
+            node = self.cache.get(page)
+            if node is not None:
+                self._write(node)
+        self.dirty.clear()
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, self.page_size, self.root_page, self.page_count, self.count)
+                        .ljust(self.page_size, b"\0"))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    # ---------- lookup ----------
+    def _find_leaf(self, patient_id, path=None):
+        node = self._get(self.root_page)
+        while isinstance(node, _Internal):
+            idx = bisect_right(node.keys, patient_id)
+            if path is not None:
+                path.append((node, idx))
+            node = self._get(node.children[idx])
+        return node
+
+    def search(self, patient_id):
+        leaf = self._find_leaf(patient_id)
+        i = bisect_left(leaf.keys, patient_id)
+        if i < len(leaf.keys) and leaf.keys[i] == patient_id:
+            return _decode_row(patient_id, leaf.values[i])
+        return None
+
+    def range_query(self, lo, hi):
+        leaf = self._find_leaf(lo)
+        i = bisect_left(leaf.keys, lo)
+        while True:
+            while i < len(leaf.keys):
+                if leaf.keys[i] > hi:
+                    return
+                yield _decode_row(leaf.keys[i], leaf.values[i])
+                i += 1
+            if not leaf.next:
+                return
+            leaf, i = self._get(leaf.next), 0
+
+    def inorder_nodes(self):
+        return self.range_query(float("-inf"), float("inf"))
+
+    def __len__(self):
+        return self.count
+
+    # ---------- insert ----------
+    def insert(self, patient_id, patient_name, is_cured, diseases):
+        path = []
+        leaf = self._find_leaf(patient_id, path)
+        i = bisect_left(leaf.keys, patient_id)
+        if i < len(leaf.keys) and leaf.keys[i] == patient_id:
+            return False
+        payload = self._payload(patient_id, patient_name, diseases)
+        leaf.keys.insert(i, patient_id)
+        leaf.values.insert(i, (1 if is_cured else 0, payload))
+        leaf.size += ENTRY.size + len(payload)
+        self.count += 1
+        if leaf.size > self.page_size:
+            self._split(leaf, path)
+        self._touch(leaf)
+        return True
+
+    def _payload(self, patient_id, patient_name, diseases):
+        payload = _encode_payload(patient_name, diseases)
+        if PAGE_HEAD.size + ENTRY.size + len(payload) > self.page_size:
+            raise ValueError(f"patient {patient_id} does not fit in a {self.page_size}-byte page")
+        return payload
+
+    def _split(self, leaf, path):
+        # rows vary in size, so a leaf is split at its byte midpoint; a half that
+        # is still over the page (a large row between small ones) is split again
+        right = self._split_once(leaf, path)
+        for half in (leaf, right):
+            if half.size > self.page_size:
+                path = []
+                self._find_leaf(half.keys[0], path)
+                self._split(half, path)
+
+    def _split_once(self, leaf, path):
+        right = self._new(_Leaf)
+        sizes = [ENTRY.size + len(p) for _, p in leaf.values]
+        half, acc, mid = (leaf.size - PAGE_HEAD.size) / 2, sizes[0], 1
+        while mid < len(sizes) - 1 and acc + sizes[mid] / 2 <= half:
+            acc += sizes[mid]
+            mid += 1
+        right.keys, leaf.keys = leaf.keys[mid:], leaf.keys[:mid]
+        right.values, leaf.values = leaf.values[mid:], leaf.values[:mid]
+        right.size = PAGE_HEAD.size + sum(ENTRY.size + len(p) for _, p in right.values)
+        leaf.size = PAGE_HEAD.size + sum(ENTRY.size + len(p) for _, p in leaf.values)
+        right.next, leaf.next = leaf.next, right.page
+        self._touch(right)
+        sep, new_page = right.keys[0], right.page
+
+        while path:
+            parent, idx = path.pop()
+            parent.keys.insert(idx, sep)
+            parent.children.insert(idx + 1, new_page)
+            if len(parent.keys) <= self.max_keys:
+                self._touch(parent)
+                return right
+            sibling = self._new(_Internal)
+            mid = len(parent.keys) // 2
+            sep = parent.keys[mid]
+            sibling.keys, sibling.children = parent.keys[mid + 1:], parent.children[mid + 1:]
+            parent.keys, parent.children = parent.keys[:mid], parent.children[:mid + 1]
+            self._touch(sibling)
+            self._touch(parent)
+            new_page = sibling.page
+
+        root = self._new(_Internal)
+        root.keys, root.children = [sep], [self.root_page, new_page]
+        self._touch(root)
+        self.root_page = root.page
+        return right
+
+    # ---------- remove / update ----------
+    def remove(self, patient_id):
+        leaf = self._find_leaf(patient_id)
+        i = bisect_left(leaf.keys, patient_id)
+        if i == len(leaf.keys) or leaf.keys[i] != patient_id:
+            return False
+        leaf.keys.pop(i)
+        _, payload = leaf.values.pop(i)
+        leaf.size -= ENTRY.size + len(payload)
+        self._touch(leaf)
+        self.count -= 1
+        return True
+
+    def update(self, patient_id, new_name=None, new_is_cured=None, new_diseases=None):
+        node = self.search(patient_id)
+        if not node:
+            return False
+        name = new_name if new_name is not None else node.patient_name
+        cured = new_is_cured if new_is_cured is not None else node.is_cured
+        diseases = new_diseases if new_diseases is not None else node.diseases
+        self._payload(patient_id, name, diseases)  # refuse before the old row is gone
+        self.remove(patient_id)
+        self.insert(patient_id, name, cured, diseases)
+        return True
+
+    # ---------- display & validate ----------
+    def display_tree(self):
+        if not self.count:
+            print("Tree is empty")
+            return
+        print("\n" + "="*50)
+        print("PATIENT TREE (B+-tree, in-order)")
+        print("="*50)
+        for node in self.inorder_nodes():
+            print(f"ID: {node.patient_id} | Name: {node.patient_name} | Cured: {node.is_cured} | Diseases: {', '.join(node.diseases)}")
+
+    def check_properties(self):
+        # keys sorted across the leaf chain and the patient count matches the header
+        last, seen = None, 0
+        for node in self.inorder_nodes():
+            if last is not None and node.patient_id <= last:
+                print(f"✗ Out of order at ID {node.patient_id}")
+                return False
+            last, seen = node.patient_id, seen + 1
+        ok = seen == self.count
+        print(f"{'✓ Ordered' if ok else '✗ Count mismatch'} ({seen} patients, {self.page_count} pages)")
+        return ok
+
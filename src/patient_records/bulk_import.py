@@ -0,0 +1,147 @@
+import heapq
+import os
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from .main import AVLNode, AVLPatientTree, PatientRecord
+
+# Input: the line format written by deconstruct_tree_to_file,
+#   <id> <name> <True|False> [<disease>,<disease>,...]
+# "None" lines and version/hash trailers are skipped, so saved tree files import as-is.
+
+ON_DUPLICATE = ("first", "last", "error")
+
+
+def split_ranges(path, parts):
+    # [(start, end)] byte ranges covering the file, each ending on a line boundary
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, "rb") as f:
+        for i in range(1, parts):
+            f.seek(max(size * i // parts, bounds[-1]))
+            f.readline()
+            pos = min(f.tell(), size)
+            if pos > bounds[-1]:
+                bounds.append(pos)
+    if bounds[-1] != size:
+        bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def parse_range(path, start, end):
+    """
+    Worker: parses one byte range and returns it as compact columns sorted by
+    (patient_id, line offset): ids and offsets as array('q') bytes, cured as
+    bytes, names and comma-joined diseases as newline-joined strings.
+    """
+    parse = AVLPatientTree()._parse_line
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    rows = []
+    offset = start
+    for raw in data.split(b"\n"):
+        line = raw.decode()
+        if line.strip() and line.strip() != "None" and not line.startswith(("version:", "hash:")):
+            row = parse(line)
+            if row:
+                rows.append((row[0], offset, row))
+        offset += len(raw) + 1
+    rows.sort(key=lambda r: (r[0], r[1]))
+    return (array('q', [r[0] for r in rows]).tobytes(),
+            array('q', [r[1] for r in rows]).tobytes(),
+            "\n".join(r[2][1] for r in rows),
+            bytes(1 if r[2][2] else 0 for r in rows),
+            "\n".join(",".join(r[2][3]) for r in rows))
+
+
+def _chunk_rows(chunk, source):
+    id_bytes, off_bytes, names, cured, diseases = chunk
+    ids, offsets = array('q'), array('q')
+    ids.frombytes(id_bytes)
+    offsets.frombytes(off_bytes)
+    if not ids:
+        return
+    names, diseases = names.split("\n"), diseases.split("\n")
+    for i in range(len(ids)):
+        yield ids[i], source, offsets[i], (ids[i], names[i], cured[i] == 1, diseases[i].split(",") if diseases[i] else [])
+
+
+def merge_rows(chunks, existing=(), on_duplicate="first"):
+    """
+    k-way merge of sorted chunks into one row per patient_id. `existing` rows
+    (already sorted, e.g. the current tree) count as earlier than anything in
+    the file. on_duplicate: "first" keeps the earliest row (what inserting the
+    lines one by one does), "last" the latest, "error" raises ValueError, or a
+    callable (kept_row, new_row) -> row.
+    """
+    if not callable(on_duplicate) and on_duplicate not in ON_DUPLICATE:
+        raise ValueError(f"on_duplicate must be one of {ON_DUPLICATE} or a callable")
+    sources = [((row[0], -1, i, row) for i, row in enumerate(existing))]
+    sources += [_chunk_rows(chunk, i) for i, chunk in enumerate(chunks)]
+    rows, duplicates = [], 0
+    for pid, _, _, row in heapq.merge(*sources, key=lambda r: (r[0], r[1], r[2])):
+        if rows and rows[-1][0] == pid:
+            duplicates += 1
+            if on_duplicate == "error":
+                raise ValueError(f"duplicate patient_id {pid}")
+            if on_duplicate == "last":
+                rows[-1] = row
+            elif callable(on_duplicate):
+                rows[-1] = on_duplicate(rows[-1], row)
+            continue
+        rows.append(row)
+    return rows, duplicates
+
+
+def bulk_import(path, workers=None, chunks=None, on_duplicate="first", existing=()):
+    """
+    Parses `path` in parallel and returns (root, stats) for a balanced tree over
+    its patients (merged with `existing` rows). The file is cut into `chunks`
+    byte ranges (default 4 per worker) parsed by a ProcessPoolExecutor.
+    """
+    workers = workers or os.cpu_count() or 1
+    stats = {"workers": workers}
+    t = time.perf_counter()
+    ranges = split_ranges(path, chunks or workers * 4) if os.path.getsize(path) else []
+    stats["chunks"] = len(ranges)
+    if workers > 1 and len(ranges) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parsed = list(pool.map(parse_range, [path] * len(ranges), *zip(*ranges)))
+    else:
+        parsed = [parse_range(path, start, end) for start, end in ranges]
+    stats["parse_seconds"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    rows, stats["duplicates"] = merge_rows(parsed, existing, on_duplicate)
+    stats["merge_seconds"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    root = AVLPatientTree().build_from_sorted([AVLNode(*row) for row in rows])
+    stats["build_seconds"] = time.perf_counter() - t
+    stats["patients"] = len(rows)
+    return root, stats
+
+
+def import_into(records, path, workers=None, on_duplicate="first"):
+    # merges a file into a PatientRecord store and makes the result its new base snapshot;
+    # the store lock is held throughout, or a change made during the import would be lost
+    with records.lock:
+        records.tree_obj.root = records.root
+        existing = [records.row(n) for n in records.tree_obj.inorder_nodes()]
+        root, stats = bulk_import(path, workers=workers, on_duplicate=on_duplicate, existing=existing)
+        t = time.perf_counter()
+        records.install_base(root)
+        stats["snapshot_seconds"] = time.perf_counter() - t
+    return stats
+
+
+if __name__ == "__main__":
+    # python -m patient_records.bulk_import <file> [workers] [first|last|error]   (imports into ../storage)
+    path = sys.argv[1]
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    policy = sys.argv[3] if len(sys.argv) > 3 else "first"
+    stats = import_into(PatientRecord(), path, workers, policy)
+    print(" | ".join(f"{k}: {v:.3f}" if isinstance(v, float) else f"{k}: {v}" for k, v in stats.items()))
@@ -0,0 +1,364 @@
+import re
+import sys
+import time
+import weakref
+from array import array
+from bisect import bisect_left, bisect_right
+
+from .main import DISEASES, PatientRecord
+
+# ---------------- ROARING BITMAP ----------------
+# Values are split into a 16-bit high key and a 16-bit low part. Each high key
+# owns one container: a sorted array('H') of lows while it holds at most
+# ARRAY_MAX values, else a 65536-bit int used as a bitmap.
+
+ARRAY_MAX = 4096
+CHUNK = 1 << 16
+
+
+class _Lows(array):
+    # array container of a built bitmap; remembers its bitmap form once an operator needed it
+    __slots__ = ("bits",)
+
+
+def _bits(lows):
+    if isinstance(lows, int):
+        return lows
+    cached = getattr(lows, "bits", None)
+    if cached is not None:
+        return cached
+    buf = bytearray(CHUNK // 8)
+    for v in lows:
+        buf[v >> 3] |= 1 << (v & 7)
+    bits = int.from_bytes(buf, "little")
+    if isinstance(lows, _Lows):
+        lows.bits = bits
+    return bits
+
+
+def _lows(bits):
+    out = array('H')
+    raw = bits.to_bytes(CHUNK // 8, "little")
+    for i, byte in enumerate(raw):
+        if byte:
+            base = i << 3
+            for j in range(8):
+                if byte >> j & 1:
+                    out.append(base + j)
+    return out
+
+
+def _test(lows, bits, want):
+    # lows whose bit in `bits` is `want`; reads bytes instead of shifting the big int per value
+    raw = bits.to_bytes(CHUNK // 8, "little")
+    return array('H', [v for v in lows if (raw[v >> 3] >> (v & 7) & 1) == want])
+
+
+def _card(c):
+    return c.bit_count() if isinstance(c, int) else len(c)
+
+
+def _shrink(c):
+    # None when empty; arrays that outgrow ARRAY_MAX become bitmaps. Bitmap results of
+    # query operators stay bitmaps even when sparse: converting them back to arrays
+    # would cost more than the operators that follow save.
+    if isinstance(c, int):
+        return c or None
+    if not c:
+        return None
+    return _bits(c) if len(c) > ARRAY_MAX else c
+
+
+def _cached(c):
+    # bitmaps, and array containers of built bitmaps (their bitmap form is computed once)
+    return isinstance(c, (int, _Lows))
+
+
+def _and(a, b):
+    if _cached(a) and _cached(b):
+        return _shrink(_bits(a) & _bits(b))
+    if isinstance(a, int):
+        a, b = b, a
+    if isinstance(b, int):
+        return _shrink(_test(a, b, 1))
+    return _shrink(array('H', sorted(set(a).intersection(b))))
+
+
+def _or(a, b):
+    if _cached(a) or _cached(b) or len(a) + len(b) > ARRAY_MAX:
+        return _shrink(_bits(a) | _bits(b))
+    return _shrink(array('H', sorted(set(a).union(b))))
+
+
+def _andnot(a, b):
+    if isinstance(a, int) or (_cached(a) and _cached(b)):
+        # a ^ (a & b) rather than a & ~b, which builds a negative int of the same size
+        a = _bits(a)
+        return _shrink(a ^ (a & _bits(b)))
+    if isinstance(b, int):
+        return _shrink(_test(a, b, 0))
+    return _shrink(array('H', sorted(set(a).difference(b))))
+
+
+class RoaringBitmap:
+    __slots__ = ("containers",)
+
+    def __init__(self, containers=None):
+        self.containers = containers or {}
+
+    @classmethod
+    def from_sorted(cls, values):
+        containers, high, lows = {}, None, _Lows('H')
+        for v in values:
+            if v >> 16 != high:
+                if lows:
+                    containers[high] = _shrink(lows)
+                high, lows = v >> 16, _Lows('H')
+            lows.append(v & 0xFFFF)
+        if lows:
+            containers[high] = _shrink(lows)
+        return cls(containers)
+
+    @classmethod
+    def from_range(cls, lo, hi):
+        # values lo <= v < hi
+        containers = {}
+        while lo < hi:
+            high, start = lo >> 16, lo & 0xFFFF
+            stop = min(hi - (high << 16), CHUNK)
+            containers[high] = ((1 << stop) - 1) ^ ((1 << start) - 1)
+            lo = (high + 1) << 16
+        return cls(containers)
+
+    def _combine(self, other, op, keep_left=False, keep_right=False):
+        out = {}
+        for high, a in self.containers.items():
+            b = other.containers.get(high)
+            if b is None:
+                if keep_left:
+                    out[high] = a
+                continue
+            c = op(a, b)
+            if c is not None:
+                out[high] = c
+        if keep_right:
+            for high, b in other.containers.items():
+                if high not in self.containers:
+                    out[high] = b
+        return RoaringBitmap(out)
+
+    def __and__(self, other):
+        return self._combine(other, _and)
+
+    def __or__(self, other):
+        return self._combine(other, _or, keep_left=True, keep_right=True)
+
+    def __sub__(self, other):
+        return self._combine(other, _andnot, keep_left=True)
+
+    def __len__(self):
+        return sum(_card(c) for c in self.containers.values())
+
+    def __iter__(self):
+        for high in sorted(self.containers):
+            c = self.containers[high]
+            base = high << 16
+            for low in (_lows(c) if isinstance(c, int) else c):
+                yield base + low
+
+    def __contains__(self, v):
+        c = self.containers.get(v >> 16)
+        if c is None:
+            return False
+        low = v & 0xFFFF
+        if isinstance(c, int):
+            return (c >> low) & 1 == 1
+        i = bisect_left(c, low)
+        return i < len(c) and c[i] == low
+
+    def size_in_bytes(self):
+        return sum(8192 if isinstance(c, int) else 2 * len(c) for c in self.containers.values())
+
+
+# ---------------- QUERY LANGUAGE ----------------
+# expr   := term (OR term)*
+# term   := factor (AND factor)*
+# factor := NOT factor | "(" expr ")" | cured | id:LO..HI | disease
+# Keywords are case-insensitive; a disease whose name clashes with one (or has
+# spaces) can be written in double quotes. Either side of an id range may be
+# left out, both ends are inclusive.
+
+_TOKEN = re.compile(r'\s*(\(|\)|"[^"]*"|[^\s()]+)')
+
+
+def _tokenize(text):
+    tokens, pos, text = [], 0, text.strip()
+    while pos < len(text):
+        m = _TOKEN.match(text, pos)
+        if not m:
+            raise ValueError(f"cannot parse query at {text[pos:]!r}")
+        tokens.append(m.group(1))
+        pos = m.end()
+    return tokens
+
+
+def parse_query(text):
+    tokens = _tokenize(text)
+    pos = 0
+
+    def peek():
+        return tokens[pos] if pos < len(tokens) else None
+
+    def keyword(tok, word):
+        return tok is not None and tok.upper() == word
+
+    def expr():
+        nonlocal pos
+        node = term()
+        while keyword(peek(), "OR"):
+            pos += 1
+            node = ("or", node, term())
+        return node
+
+    def term():
+        nonlocal pos
+        node = factor()
+        while keyword(peek(), "AND"):
+            pos += 1
+            node = ("and", node, factor())
+        return node
+
+    def factor():
+        nonlocal pos
+        tok = peek()
+        if tok is None:
+            raise ValueError("query ended early")
+        pos += 1
+        if keyword(tok, "NOT"):
+            return ("not", factor())
+        if tok == "(":
+            node = expr()
+            if peek() != ")":
+                raise ValueError("missing ')'")
+            pos += 1
+            return node
+        if tok == ")" or keyword(tok, "AND") or keyword(tok, "OR"):
+            raise ValueError(f"unexpected {tok!r}")
+        if tok.startswith('"'):
+            return ("disease", tok[1:-1])
+        if tok.lower() == "cured":
+            return ("cured",)
+        if tok.lower().startswith("id:"):
+            lo, sep, hi = tok[3:].partition("..")
+            if not sep:
+                lo = hi = tok[3:]
+            try:
+                return ("id", int(lo) if lo else None, int(hi) if hi else None)
+            except ValueError:
+                raise ValueError(f"bad id range {tok!r}") from None
+        return ("disease", tok)
+
+    node = expr()
+    if pos != len(tokens):
+        raise ValueError(f"unexpected {tokens[pos]!r}")
+    return node
+
+
+# ---------------- COHORT INDEX ----------------
+
+class CohortIndex:
+    """
+    Bitmaps over dense patient ordinals (position in patient_id order) for
+    every disease code and for is_cured, built from one in-order walk.
+    The index is a point-in-time view: for_records() rebuilds it after the
+    store has changed. It keeps the patient ids by ordinal, not the nodes,
+    so pages the memory budget mode swaps out stay out until a match on
+    them is read.
+    """
+
+    _cache = weakref.WeakKeyDictionary()
+
+    def __init__(self, root):
+        self.root, self.ids = root, array('q')
+        per_code, cured = {}, []
+        stack, node = [], root
+        while stack or node:
+            while node:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            ordinal = len(self.ids)
+            self.ids.append(node.patient_id)
+            if node.is_cured:
+                cured.append(ordinal)
+            # a disease listed twice on one patient only counts once
+            for c in set(node.disease_codes):
+                per_code.setdefault(c, []).append(ordinal)
+            node = node.right
+        self.all = RoaringBitmap.from_range(0, len(self.ids))
+        self.cured = RoaringBitmap.from_sorted(cured)
+        self.diseases = {c: RoaringBitmap.from_sorted(o) for c, o in per_code.items()}
+        self._compiled = {}
+
+    @classmethod
+    def for_records(cls, records):
+        entry = cls._cache.get(records)
+        if entry is None or entry[0] != (records.last_version, id(records.root)):
+            entry = ((records.last_version, id(records.root)), cls(records.root))
+            cls._cache[records] = entry
+        return entry[1]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def node(self, ordinal):
+        # the patient at an ordinal, found from the root by its id
+        patient_id, node = self.ids[ordinal], self.root
+        while node is not None and node.patient_id != patient_id:
+            node = node.left if patient_id < node.patient_id else node.right
+        return node
+
+    def _eval(self, node):
+        kind = node[0]
+        if kind == "and":
+            return self._eval(node[1]) & self._eval(node[2])
+        if kind == "or":
+            return self._eval(node[1]) | self._eval(node[2])
+        if kind == "not":
+            return self.all - self._eval(node[1])
+        if kind == "cured":
+            return self.cured
+        if kind == "disease":
+            c = DISEASES.codes.get(node[1])
+            return self.diseases.get(c, RoaringBitmap())
+        lo, hi = node[1], node[2]
+        start = 0 if lo is None else bisect_left(self.ids, lo)
+        stop = len(self.ids) if hi is None else bisect_right(self.ids, hi)
+        return RoaringBitmap.from_range(start, stop)
+
+    def bitmap(self, query):
+        tree = self._compiled.get(query)
+        if tree is None:
+            tree = self._compiled[query] = parse_query(query)
+        return self._eval(tree)
+
+    def count(self, query):
+        return len(self.bitmap(query))
+
+    def select(self, query):
+        # matching AVLNodes in patient_id order, produced one at a time
+        for ordinal in self.bitmap(query):
+            yield self.node(ordinal)
+
+
+if __name__ == "__main__":
+    # python -m patient_records.cohort 'flu AND NOT cured AND id:100..500'
+    records = PatientRecord()
+    index = CohortIndex.for_records(records)
+    query = " ".join(sys.argv[1:]) or "cured"
+    index.count(query)
+    t = time.perf_counter()
+    n = index.count(query)
+    print(f"{n} of {len(index)} patients match ({(time.perf_counter() - t) * 1e6:.0f} µs)")
+    for node in index.select(query):
+        print(f"ID: {node.patient_id} | Name: {node.patient_name} | Cured: {node.is_cured} | Diseases: {', '.join(node.diseases)}")
@@ -0,0 +1,151 @@
+import os
+import stat
+import threading
+import time
+from datetime import datetime, timedelta
+
+from .main import MERKLE_PREFIX, LogReader, PatientRecord
+
+
+class LogCompactor:
+    """
+    Folds version files older than the retention window into one snapshot.
+    The replayed state is verified against the saved hash chain before the
+    snapshot is swapped in and the folded versions are deleted.
+    """
+
+    def __init__(self, records, retention_seconds=7 * 24 * 3600, disk_budget_bytes=None, interval_seconds=300):
+        self.records = records
+        self.retention_seconds = retention_seconds
+        self.disk_budget_bytes = disk_budget_bytes
+        self.interval_seconds = interval_seconds
+        self.last_report = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # ---------- sizing helpers ----------
+    def _size(self, name):
+        try:
+            return os.path.getsize(os.path.join(self.records.storage_dir, name))
+        except OSError:
+            return 0
+
+    def storage_bytes(self):
+        d = self.records.storage_dir
+        return sum(self._size(f) for f in os.listdir(d) if os.path.isfile(os.path.join(d, f)))
+
+    def _remove_file(self, name):
+        path = os.path.join(self.records.storage_dir, name)
+        try:
+            os.chmod(path, stat.S_IWRITE if os.name == "nt" else 0o644)
+        except Exception:
+            pass
+        os.remove(path)
+
+    # ---------- selection ----------
+    def select_versions(self, files, now=None):
+        # versions older than the retention window, plus the oldest in-window
+        # versions while storage is over the disk budget (the newest is always kept)
+        now = now or datetime.now()
+        cutoff = now - timedelta(seconds=self.retention_seconds)
+        fold = [f for f in files[:-1] if self.records.version_time(f) < cutoff]
+        if self.disk_budget_bytes is not None:
+            excess = self.storage_bytes() - self.disk_budget_bytes
+            excess -= sum(self._size(f) for f in fold)
+            i = len(fold)
+            while excess > 0 and i < len(files) - 1:
+                excess -= self._size(files[i])
+                fold.append(files[i])
+                i += 1
+        return fold
+
+    # ---------- compaction ----------
+    def run_once(self, now=None):
+        """
+        The store lock is held while the log is listed and while the snapshot is
+        swapped in, not while the versions are replayed: snapshots and version
+        files never change once written, and the replay builds a tree of its own.
+        """
+        with self._lock:
+            start = time.perf_counter()
+            report = {"folded": 0, "bytes_reclaimed": 0, "seconds": 0.0, "snapshot": None, "error": None}
+            records = self.records
+
+            with records.lock:
+                old_snapshots = records.snapshot_files()
+                files = records.list_version_files()
+            tree = records.new_tree()
+            base_root, base_version = records.load_base_snapshot(tree)
+            fold = self.select_versions(records.versions_after(base_version, files), now)
+
+            if fold:
+                root = base_root
+                reader = LogReader(records, tree=tree)
+                for name in fold:
+                    root, ok, digest = reader.apply(root, name)
+                    saved_hash = (MERKLE_PREFIX if reader.merkle else "") + digest.hex()
+                    if not ok or not records.hash_matches(root, saved_hash):
+                        report["error"] = f"hash chain broken at version '{name}'"
+                        break
+                    if records.memory_budget:
+                        tree.maybe_evict(root)
+                else:
+                    with records.lock:
+                        if records.snapshot_files() != old_snapshots:
+                            # a base was installed (bulk import, another compactor) while this one replayed
+                            report["error"] = "base snapshot changed during compaction"
+                        else:
+                            self._swap_in(root, tree, fold, old_snapshots, saved_hash, report)
+
+            report["seconds"] = time.perf_counter() - start
+            if self.disk_budget_bytes is not None:
+                report["within_budget"] = self.storage_bytes() <= self.disk_budget_bytes
+            self.last_report = report
+            return report
+
+    def _swap_in(self, root, tree, fold, old_snapshots, saved_hash, report):
+        # writes the folded tree as the new base and deletes what it replaces (store lock held)
+        records = self.records
+        # sealed versions go with their segment once the whole segment is folded
+        before = sum(self._size(f) for f in fold + old_snapshots + records.segment_files())
+        last = fold[-1]
+        snapshot = "snapshot " + last
+        records.write_snapshot(root, snapshot, last, saved_hash, tree=tree)
+        for name in fold + old_snapshots:
+            if name != snapshot and name not in records.segments:
+                self._remove_file(name)
+        records.drop_sealed(last)
+        records.fsync_dir()
+        report["folded"] = len(fold)
+        report["snapshot"] = snapshot
+        report["bytes_reclaimed"] = (before - self._size(snapshot)
+                                     - sum(self._size(f) for f in records.segment_files()))
+
+    # ---------- background job ----------
+    def _loop(self):
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.run_once()
+            except Exception as e:
+                self.last_report = {"error": str(e)}
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="log-compactor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+
+if __name__ == "__main__":
+    r = LogCompactor(PatientRecord()).run_once()
+    print(f"Folded {r['folded']} versions, reclaimed {r['bytes_reclaimed']} bytes in {r['seconds']:.3f}s")
+    if r["error"]:
+        print("⚠️", r["error"])
@@ -0,0 +1,593 @@
+import contextlib
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from .index_engines import create_patient_index
+from .main import AVLNode, AVLPatientTree, PatientRecord, UpdateDelta
+from .paging import PagedPatientTree
+from .version_diff import PathCopyTree
+
+# Differential checks of the fast paths against AVLPatientTree, whose insert,
+# remove and update stay the definition of what an operation does. Random
+# operation sequences go to the reference and to every candidate; at each check
+# a candidate must hold the same patients in the same order, AVL candidates must
+# pass check_avl_properties with correct stored heights, and candidates that keep
+# the reference's shape must have its heights and its root hash (a Merkle digest
+# recomputed from scratch on the reference). A divergence is shrunk to a short
+# operation sequence that still shows it.
+#
+# python -m patient_records.differential check [steps] [seed] [candidates...]
+# python -m patient_records.differential fuzz [ops] [seed] [candidates...]
+
+DISEASE_POOL = ["flu", "covid", "cold", "fever", "cough", "asthma", "diabetes", "malaria",
+                "chronic obstructive pulmonary disease", "hand foot and mouth disease",
+                "tuberculosis", "hepatitis B", "ménière's disease", "influenza A/H1N1"]
+OP_WEIGHTS = {"add": 40, "remove": 20, "update": 8, "set_cured": 10, "rename": 6,
+              "add_disease": 10, "remove_disease": 6, "reopen": 1}
+NAME_CHARS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-'.éøßžΩЖ中"
+# also whitespace and newlines, which the text log cannot hold (it keeps a name as one
+# space-separated field): check() uses these when store-text is not among the candidates
+WIDE_NAME_CHARS = NAME_CHARS + "  \n\t"
+LONG_NAME_CHARS = 1200  # up to 3 bytes each, so a row still fits a 4 KiB B+-tree page
+
+
+def _random_name(rng, chars):
+    # mostly short, sometimes very long (a few per hundred)
+    length = rng.randint(1, LONG_NAME_CHARS) if rng.random() < 0.04 else rng.randint(1, 24)
+    return "".join(rng.choices(chars, k=length))
+
+
+def _random_diseases(rng):
+    # empty to the whole pool
+    return rng.sample(DISEASE_POOL, min(int(rng.expovariate(0.4)), len(DISEASE_POOL)))
+
+
+def random_ops(n, keys, seed=0, name_chars=NAME_CHARS):
+    """
+    n operations on patient ids below `keys`, as tuples:
+      ("add", id, name, cured, diseases)  ("remove", id)
+      ("update", id, name, cured, diseases) with None for fields left alone
+      ("set_cured", id, cured)  ("rename", id, name)
+      ("add_disease", id, disease)  ("remove_disease", id, disease)
+      ("reopen", None): candidates that persist close and reopen from disk
+    Ids collide on purpose, so some ops hit missing or existing patients.
+    Names and disease lists vary in length, names from 1 to LONG_NAME_CHARS
+    characters of `name_chars`.
+    """
+    rng = random.Random(seed)
+    kinds, weights = list(OP_WEIGHTS), list(OP_WEIGHTS.values())
+    ops = []
+    for kind in rng.choices(kinds, weights, k=n):
+        pid = rng.randrange(keys)
+        if kind == "add":
+            ops.append((kind, pid, _random_name(rng, name_chars), rng.random() < 0.3, _random_diseases(rng)))
+        elif kind == "remove":
+            ops.append((kind, pid))
+        elif kind == "update":
+            ops.append((kind, pid, rng.choice([None, _random_name(rng, name_chars)]), rng.choice([None, True, False]),
+                        rng.choice([None, _random_diseases(rng)])))
+        elif kind == "set_cured":
+            ops.append((kind, pid, rng.random() < 0.5))
+        elif kind == "rename":
+            ops.append((kind, pid, _random_name(rng, name_chars)))
+        elif kind == "reopen":
+            ops.append((kind, None))
+        else:
+            ops.append((kind, pid, rng.choice(DISEASE_POOL)))
+    return ops
+
+
+def reference_change(tree, op):
+    """
+    Applies op to the reference tree with its own insert/remove/update and
+    returns the row-level change (operation, old row, new row), or None when
+    the op changes nothing.
+    """
+    kind, pid = op[0], op[1]
+    if kind == "reopen":
+        return None
+    node = tree.search(pid)
+    if kind == "add":
+        if node:
+            return None
+        tree.insert(pid, op[2], op[3], list(op[4]))
+        return "add", None, [pid, op[2], op[3], list(op[4])]
+    if not node:
+        return None
+    old = [pid, node.patient_name, node.is_cured, node.diseases]
+    if kind == "remove":
+        tree.remove(pid)
+        return "remove", old, None
+    new = [pid, old[1], old[2], old[3].copy()]
+    if kind == "update":
+        new = [pid, op[2] if op[2] is not None else old[1], op[3] if op[3] is not None else old[2],
+               list(op[4]) if op[4] is not None else new[3]]
+    elif kind == "set_cured":
+        new[2] = op[2]
+    elif kind == "rename":
+        new[1] = op[2]
+    elif kind == "add_disease":
+        if op[2] not in new[3]:
+            new[3].append(op[2])
+    elif op[2] in new[3]:
+        new[3].remove(op[2])
+    if new == old:
+        return None
+    tree.update(pid, new[1], new[2], new[3])
+    return "update", old, new
+
+
+# ---------------- reference state ----------------
+
+def _inorder(root):
+    stack, node = [], root
+    while stack or node:
+        if node:
+            stack.append(node)
+            node = node.left
+        else:
+            node = stack.pop()
+            yield node
+            node = node.right
+
+
+def _rows(nodes):
+    return [(n.patient_id, n.patient_name, n.is_cured, tuple(n.diseases)) for n in nodes]
+
+
+def _shape(root):
+    # (patient_id, stored height) in preorder: equal lists mean equal trees
+    out, stack = [], [root] if root else []
+    while stack:
+        node = stack.pop()
+        out.append((node.patient_id, node.height))
+        stack.extend(child for child in (node.right, node.left) if child)
+    return out
+
+
+def _bad_heights(root):
+    # ids whose stored height is not 1 + the taller child's
+    bad = []
+
+    def height(node):
+        if not node:
+            return 0
+        h = 1 + max(height(node.left), height(node.right))
+        if node.height != h:
+            bad.append(node.patient_id)
+        return h
+    height(root)
+    return bad
+
+
+def _quiet(check, *args):
+    # (result, what it printed): the validators report on stdout
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        ok = check(*args)
+    return ok, out.getvalue().strip()
+
+
+def _avl_problems(root):
+    tree = AVLPatientTree()
+    tree.root = root
+    problems = []
+    ok, report = _quiet(tree.check_avl_properties)
+    if not ok:
+        problems.append(f"check_avl_properties failed: {report}")
+    bad = _bad_heights(root)
+    if bad:
+        problems.append(f"stored heights wrong at ids {bad[:5]}")
+    return problems
+
+
+class Expected:
+    # what the reference looks like after a step; the from-scratch digest is computed on demand
+    def __init__(self, tree, hasher):
+        self.root = tree.root
+        self.rows = _rows(_inorder(tree.root))
+        self.shape = _shape(tree.root)
+        self._hasher = hasher
+        self._digest = None
+
+    @property
+    def digest(self):
+        if self._digest is None:
+            for node in _inorder(self.root):
+                node.digest = None
+            self._digest = self._hasher.merkle_digest(self.root)
+        return self._digest
+
+
+def _compare(name, rows, expected):
+    if rows == expected.rows:
+        return []
+    have, want = dict((r[0], r) for r in rows), dict((r[0], r) for r in expected.rows)
+    diff = sorted(pid for pid in have.keys() | want.keys() if have.get(pid) != want.get(pid))
+    if not diff and len(rows) != len(expected.rows):
+        return [f"{name}: duplicate patients ({len(rows)} rows, expected {len(expected.rows)})"]
+    if not diff:
+        return [f"{name}: patients out of order"]
+    pid = diff[0]
+    return [f"{name}: {len(diff)} patients differ, first {pid}: {have.get(pid)} != expected {want.get(pid)}"]
+
+
+# ---------------- candidates ----------------
+
+class PathCopyCandidate:
+    """
+    version_diff.PathCopyTree fed the reference's row changes. A PathCopyTree
+    changes its own copies in place and leaves the tree it started from alone,
+    so each check hands over to a fresh one and the root seen there must hold
+    the same patients at the next check.
+    """
+    shape = True
+
+    def __init__(self, rows):
+        self.tree = PathCopyTree()
+        self.root = None
+        for row in rows:
+            self.root, _ = self.tree.apply(self.root, "add", None, list(row))
+        self.kept = None
+
+    def apply(self, op, change):
+        if change is None:
+            return
+        operation, old, new = change
+        if operation == "update":
+            new = UpdateDelta.between(old, new)
+        self.root, ok = self.tree.apply(self.root, operation, old, new)
+        if not ok:
+            raise AssertionError(f"PathCopyTree.apply refused {change}")
+
+    def check(self, expected):
+        problems = _compare("pathcopy", _rows(_inorder(self.root)), expected)
+        if self.kept and _rows(_inorder(self.kept[0])) != self.kept[1]:
+            problems.append("pathcopy: an earlier root changed")
+        self.kept = (self.root, expected.rows)
+        self.tree = PathCopyTree()
+        return problems
+
+    def digest(self, hasher):
+        # the copies start without digests; shared nodes keep theirs
+        return hasher.merkle_digest(self.root)
+
+    def close(self):
+        pass
+
+
+class BulkLoadCandidate:
+    """
+    AVLPatientTree built with build_from_sorted, as bulk_import and compaction
+    do, then rebuilt the same way every `rebuild_every` changes (by default
+    about as many changes as it started with patients, so rebuilding stays
+    amortized O(1) per op). Its shape is not the reference's, so only contents
+    and AVL validity are compared.
+    """
+    shape = False
+
+    def __init__(self, rows, rebuild_every=None):
+        self.tree = AVLPatientTree()
+        self.tree.root = self.tree.build_from_sorted([AVLNode(*row[:3], list(row[3])) for row in rows])
+        self.rebuild_every = rebuild_every or max(len(rows), 97)
+        self.changes = 0
+
+    def apply(self, op, change):
+        if change is None:
+            return
+        operation, old, new = change
+        if operation == "add":
+            self.tree.insert(*new)
+        elif operation == "remove":
+            self.tree.remove(old[0])
+        else:
+            self.tree.update(*new)
+        self.changes += 1
+        if self.changes % self.rebuild_every == 0:
+            self.tree.root = self.tree.build_from_sorted(list(_inorder(self.tree.root)))
+
+    def check(self, expected):
+        root = self.tree.root
+        return _compare("bulkload", _rows(_inorder(root)), expected) + \
+            [f"bulkload: {p}" for p in _avl_problems(root)]
+
+    def close(self):
+        pass
+
+
+class EngineCandidate:
+    # an index_engines backend through the OrderedPatientIndex calls; checked with its own check_properties
+    shape = False
+
+    def __init__(self, rows, backend):
+        self.backend = backend
+        self.path = tempfile.mkdtemp(prefix="differential-") if backend == "bplus" else None
+        self.index = create_patient_index(backend, os.path.join(self.path, "index.bpt") if self.path else None)
+        for row in rows:
+            self.index.insert(row[0], row[1], row[2], list(row[3]))
+        self.unchanged = []
+
+    def apply(self, op, change):
+        if op[0] == "reopen" and self.path:
+            self.index.close()
+            self.index = create_patient_index(self.backend, os.path.join(self.path, "index.bpt"))
+        if change is None:
+            return
+        operation, old, new = change
+        # every change the reference made must be reported as one by the engine too
+        if operation == "add":
+            changed = self.index.insert(*new)
+        elif operation == "remove":
+            changed = self.index.remove(old[0])
+        else:
+            changed = self.index.update(*new)
+        if changed is not True:
+            self.unchanged.append(f"{self.backend}: {operation} of {(new or old)[0]} returned {changed!r}")
+
+    def check(self, expected):
+        problems = _compare(self.backend, _rows(self.index.inorder_nodes()), expected) + self.unchanged
+        self.unchanged = []
+        ok, report = _quiet(self.index.check_properties)
+        if not ok:
+            problems.append(f"{self.backend}: check_properties failed: {report}")
+        return problems
+
+    def close(self):
+        if self.path:
+            with contextlib.suppress(Exception):
+                self.index.close()
+            shutil.rmtree(self.path, ignore_errors=True)
+
+
+class PagedCandidate:
+    """
+    paging.PagedPatientTree fed the reference's row changes with a budget of
+    a few pages, so most operations fault a page in and evict others. Same
+    algorithms as the reference, so the same shape and root hash.
+    """
+    shape = True
+
+    def __init__(self, rows, budget_nodes=40, page_height=3):
+        self.path = tempfile.mkdtemp(prefix="differential-")
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            hasher = PatientRecord(self.path)
+        self.tree = PagedPatientTree(0, self.path, page_height, hasher.merkle_digest)
+        self.tree.budget_bytes = budget_nodes * self.tree.node_bytes
+        for row in rows:
+            self.tree.insert(row[0], row[1], row[2], list(row[3]))
+
+    @property
+    def root(self):
+        return self.tree.root
+
+    def apply(self, op, change):
+        if change is None:
+            return
+        operation, old, new = change
+        if operation == "add":
+            self.tree.insert(*new)
+        elif operation == "remove":
+            self.tree.remove(old[0])
+        else:
+            self.tree.update(*new)
+
+    def check(self, expected):
+        problems = _compare("paged", _rows(self.tree.inorder_nodes()), expected)
+        self.tree.maybe_evict()
+        return problems
+
+    def digest(self, hasher):
+        # digests kept on swapped-out pages, the rest cached or recomputed along changed paths
+        return self.tree.hasher(self.tree.root)
+
+    def close(self):
+        self.tree.swap.close()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class StoreCandidate:
+    """
+    PatientRecord in a temp directory, driven through its own add/remove/update
+    and single-field methods, so the binary log records, incremental Merkle
+    hashing and checkpoints are all on the path. On a reopen op the store is
+    closed and recovered from its snapshot and log, and the recovered one
+    carries on.
+    """
+    shape = True
+
+    def __init__(self, rows, log_format="binary", memory_budget=None):
+        self.path = tempfile.mkdtemp(prefix="differential-")
+        self.options = {"log_format": log_format, "checkpoint_every_ops": 100}
+        if memory_budget:
+            self.options.update(memory_budget=memory_budget, page_height=3)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            self.records = PatientRecord(self.path, **self.options)
+            for row in rows:
+                self.records.add(row[0], row[1], row[2], list(row[3]))
+
+    def apply(self, op, change):
+        kind, pid, args = op[0], op[1], op[2:]
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            if kind == "reopen":
+                self.records.close()
+                self.records = PatientRecord(self.path, **self.options)
+            elif kind == "add":
+                self.records.add(pid, args[0], args[1], list(args[2]))
+            elif kind == "update":
+                self.records.update(pid, *args)
+            else:
+                getattr(self.records, kind)(pid, *args)
+
+    def check(self, expected):
+        return _compare("store", _rows(_inorder(self.records.root)), expected)
+
+    @property
+    def root(self):
+        return self.records.root
+
+    def digest(self, hasher):
+        # the hash the store would write next: cached digests, recomputed only along changed paths
+        return self.records.merkle_digest(self.records.root)
+
+    def close(self):
+        self.records.close()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+CANDIDATES = {
+    "pathcopy": PathCopyCandidate,
+    "bulkload": BulkLoadCandidate,
+    "store": StoreCandidate,
+    "store-text": lambda rows: StoreCandidate(rows, log_format="text"),
+    "paged": PagedCandidate,
+    "store-paged": lambda rows: StoreCandidate(rows, memory_budget=32 << 10),
+    "rbtree": lambda rows: EngineCandidate(rows, "rbtree"),
+    "treap": lambda rows: EngineCandidate(rows, "treap"),
+    "sorted": lambda rows: EngineCandidate(rows, "sorted"),
+    "bplus": lambda rows: EngineCandidate(rows, "bplus"),
+}
+# writing a version file per op keeps the stores out of the default fuzz run
+FUZZ_CANDIDATES = ["pathcopy", "bulkload", "paged", "rbtree", "treap", "sorted", "bplus"]
+
+
+# ---------------- runs ----------------
+
+class Divergence(AssertionError):
+    def __init__(self, step, op, candidate, problems, ops):
+        self.step, self.op, self.candidate, self.problems, self.ops = step, op, candidate, problems, ops
+        super().__init__(f"step {step} {op}: " + "; ".join(problems))
+
+
+def _check(name, candidate, expected, hasher):
+    problems = candidate.check(expected)
+    if candidate.shape and not problems:
+        shape = _shape(candidate.root)
+        if shape != expected.shape:
+            i = next((i for i, (a, b) in enumerate(zip(shape, expected.shape)) if a != b),
+                     min(len(shape), len(expected.shape)))
+            problems.append(f"{name}: shape differs at preorder position {i}: "
+                            f"{shape[i:i + 1]} != expected {expected.shape[i:i + 1]}")
+        else:
+            digest = candidate.digest(hasher)
+            if digest != expected.digest:
+                problems.append(f"{name}: root hash {digest.hex()[:16]} != expected {expected.digest.hex()[:16]}")
+    return problems
+
+
+def run(ops, candidates, prefill=(), check_every=1, stats=None):
+    """
+    Applies ops to the reference and every candidate (names in CANDIDATES),
+    comparing them every `check_every` ops and after the last one. Raises
+    Divergence on the first mismatch; `stats`, if given, collects seconds
+    spent per candidate (reference and checks included under their names).
+    """
+    stats = stats if stats is not None else {}
+    with tempfile.TemporaryDirectory(prefix="differential-") as tmp:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            hasher = PatientRecord(tmp)
+        reference = AVLPatientTree()
+        for row in prefill:
+            reference.insert(row[0], row[1], row[2], list(row[3]))
+        live = {name: CANDIDATES[name](prefill) for name in candidates}
+        try:
+            for step, op in enumerate(ops):
+                t = time.perf_counter()
+                change = reference_change(reference, op)
+                stats["reference"] = stats.get("reference", 0.0) + time.perf_counter() - t
+                for name, candidate in live.items():
+                    t = time.perf_counter()
+                    try:
+                        candidate.apply(op, change)
+                    except Exception as e:
+                        raise Divergence(step, op, name, [f"{name}: {type(e).__name__}: {e}"], ops[:step + 1]) from e
+                    stats[name] = stats.get(name, 0.0) + time.perf_counter() - t
+                if (step + 1) % check_every and step != len(ops) - 1:
+                    continue
+                t = time.perf_counter()
+                expected = Expected(reference, hasher)
+                for name, candidate in live.items():
+                    problems = _check(name, candidate, expected, hasher)
+                    if problems:
+                        raise Divergence(step, op, name, problems, ops[:step + 1])
+                stats["checks"] = stats.get("checks", 0.0) + time.perf_counter() - t
+        finally:
+            for candidate in live.values():
+                candidate.close()
+    return stats
+
+
+def shrink(divergence, prefill=()):
+    """
+    Shortest op sequence found (by dropping chunks, halving the chunk size down
+    to single ops) that still makes the same candidate diverge. Returns the
+    Divergence it raises.
+    """
+    best = divergence
+    chunk = max(len(best.ops) // 2, 1)
+    while chunk >= 1:
+        i, shrunk = 0, False
+        while i < len(best.ops):
+            trial = best.ops[:i] + best.ops[i + chunk:]
+            try:
+                run(trial, [divergence.candidate], prefill)
+            except Divergence as d:
+                best, shrunk = d, True
+                continue
+            i += chunk
+        if not shrunk:
+            chunk //= 2
+    return best
+
+
+def check(steps=2000, seed=0, candidates=None, keys=None, prefill=64):
+    # every candidate checked after every op; on a divergence prints it shrunk and re-raises
+    keys = keys or max(steps // 8, 16)
+    rows = [(pid, f"P{pid}", pid % 3 == 0, DISEASE_POOL[pid % 4:pid % 4 + 2]) for pid in range(0, prefill * 2, 2)]
+    candidates = candidates or list(CANDIDATES)
+    ops = random_ops(steps, keys, seed, NAME_CHARS if "store-text" in candidates else WIDE_NAME_CHARS)
+    try:
+        return run(ops, candidates, rows)
+    except Divergence as d:
+        small = shrink(d, rows)
+        print(f"✗ {d.candidate} diverged at step {d.step} (seed {seed}); shrunk to {len(small.ops)} ops:")
+        for op in small.ops:
+            print("   ", op)
+        print("   ", "; ".join(small.problems))
+        raise
+
+
+def fuzz(ops=1_000_000, seed=0, candidates=None, check_every=10_000):
+    """
+    Throughput mode: a large random sequence with full comparisons only every
+    `check_every` ops. Returns ops/s per candidate and the comparisons made.
+    """
+    keys = max(ops // 4, 16)
+    rng = random.Random(seed)
+    rows = [(pid, f"P{pid}", rng.random() < 0.3, rng.sample(DISEASE_POOL, 2)) for pid in range(0, keys, 2)]
+    candidates = candidates or FUZZ_CANDIDATES
+    name_chars = NAME_CHARS if "store-text" in candidates else WIDE_NAME_CHARS
+    stats = run(random_ops(ops, keys, seed, name_chars), candidates, rows, check_every, {})
+    result = {"ops": ops, "prefill": len(rows), "comparisons": -(-ops // check_every),
+              "check_s": stats.pop("checks", 0.0)}
+    result.update({f"{name}_ops_s": ops / seconds for name, seconds in stats.items()})
+    return result
+
+
+if __name__ == "__main__":
+    mode = sys.argv[1] if len(sys.argv) > 1 else "check"
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    names = sys.argv[4:] or None
+    if mode == "fuzz":
+        r = fuzz(n or 1_000_000, seed, names)
+        print(" | ".join(f"{k}: {v:,.0f}" if isinstance(v, float) else f"{k}: {v:,}" for k, v in r.items()))
+    else:
+        t = time.perf_counter()
+        check(n or 2000, seed, names)
+        print(f"✓ {n or 2000} steps, {len(names or CANDIDATES)} candidates agree with AVLPatientTree "
+              f"(seed {seed}, {time.perf_counter() - t:.1f}s)")
@@ -0,0 +1,418 @@
+import random
+from bisect import bisect_left, bisect_right
+from typing import Protocol
+
+from .main import AVLNode, AVLPatientTree, rotate_left, rotate_right
+
+
+class OrderedPatientIndex(Protocol):
+    """
+    What a store needs from a patient index, whatever keeps it ordered.
+    Nodes handed out carry patient_id, patient_name, is_cured and diseases.
+    insert, remove and update return whether the patient set changed (an
+    existing id is not inserted again, a missing one not removed).
+    """
+
+    def insert(self, patient_id, patient_name, is_cured, diseases): ...
+
+    def remove(self, patient_id): ...
+
+    def search(self, patient_id): ...
+
+    def update(self, patient_id, new_name=None, new_is_cured=None, new_diseases=None): ...
+
+    def range_query(self, lo, hi): ...
+
+    def inorder_nodes(self): ...
+
+    def check_properties(self): ...
+
+
+def _apply_update(node, new_name, new_is_cured, new_diseases):
+    if new_name is not None:
+        node.patient_name = new_name
+    if new_is_cured is not None:
+        node.is_cured = new_is_cured
+    if new_diseases is not None:
+        node.diseases = new_diseases
+
+
+def _copy_fields(dst, src):
+    dst.patient_id, dst.patient_name, dst.is_cured = src.patient_id, src.patient_name, src.is_cured
+    dst.set_disease_codes(src.disease_codes)
+
+
+# ---------------- RED-BLACK TREE ----------------
+
+RED, BLACK = 0, 1
+
+
+class RBNode(AVLNode):
+    def __init__(self, patient_id, patient_name, is_cured, diseases, nil=None):
+        super().__init__(patient_id, patient_name, is_cured, diseases)
+        self.color = RED
+        self.left = self.right = self.parent = nil
+
+
+class RedBlackPatientTree:
+    """
+    Classic red-black tree (parent pointers, shared black NIL leaf). At most
+    two rotations per insert and three per remove, against up to O(log n)
+    for AVL removes, in exchange for a looser height bound (2·log n).
+    """
+
+    def __init__(self):
+        self.nil = RBNode(None, None, False, ())
+        self.nil.color = BLACK
+        self.root = self.nil
+
+    def _rotate(self, x, left):
+        parent = x.parent
+        y = rotate_left(x) if left else rotate_right(x)
+        inner = x.right if left else x.left
+        if inner is not self.nil:
+            inner.parent = x
+        y.parent, x.parent = parent, y
+        if parent is self.nil:
+            self.root = y
+        elif parent.left is x:
+            parent.left = y
+        else:
+            parent.right = y
+
+    def search(self, patient_id):
+        node = self.root
+        while node is not self.nil:
+            if patient_id == node.patient_id:
+                return node
+            node = node.left if patient_id < node.patient_id else node.right
+        return None
+
+    def insert(self, patient_id, patient_name, is_cured, diseases):
+        parent, node = self.nil, self.root
+        while node is not self.nil:
+            if patient_id == node.patient_id:
+                return False
+            parent = node
+            node = node.left if patient_id < node.patient_id else node.right
+        z = RBNode(patient_id, patient_name, is_cured, diseases, self.nil)
+        z.parent = parent
+        if parent is self.nil:
+            self.root = z
+        elif patient_id < parent.patient_id:
+            parent.left = z
+        else:
+            parent.right = z
+        # fix a red node under a red parent
+        while z.parent.color == RED:
+            p, g = z.parent, z.parent.parent
+            left = p is g.left
+            uncle = g.right if left else g.left
+            if uncle.color == RED:
+                p.color = uncle.color = BLACK
+                g.color = RED
+                z = g
+                continue
+            if z is (p.right if left else p.left):
+                z = p
+                self._rotate(z, left)
+                p = z.parent
+            p.color, g.color = BLACK, RED
+            self._rotate(g, not left)
+        self.root.color = BLACK
+        return True
+
+    def _transplant(self, u, v):
+        if u.parent is self.nil:
+            self.root = v
+        elif u is u.parent.left:
+            u.parent.left = v
+        else:
+            u.parent.right = v
+        v.parent = u.parent
+
+    def remove(self, patient_id):
+        z = self.search(patient_id)
+        if z is None:
+            return False
+        y, color = z, z.color
+        if z.left is self.nil:
+            x = z.right
+            self._transplant(z, z.right)
+        elif z.right is self.nil:
+            x = z.left
+            self._transplant(z, z.left)
+        else:
+            y = z.right
+            while y.left is not self.nil:
+                y = y.left
+            color, x = y.color, y.right
+            if y.parent is z:
+                x.parent = y
+            else:
+                self._transplant(y, y.right)
+                y.right = z.right
+                y.right.parent = y
+            self._transplant(z, y)
+            y.left = z.left
+            y.left.parent = y
+            y.color = z.color
+        if color == BLACK:
+            self._remove_fixup(x)
+        return True
+
+    def _remove_fixup(self, x):
+        while x is not self.root and x.color == BLACK:
+            left = x is x.parent.left
+            w = x.parent.right if left else x.parent.left
+            if w.color == RED:
+                w.color, x.parent.color = BLACK, RED
+                self._rotate(x.parent, left)
+                w = x.parent.right if left else x.parent.left
+            near, far = (w.left, w.right) if left else (w.right, w.left)
+            if near.color == BLACK and far.color == BLACK:
+                w.color = RED
+                x = x.parent
+                continue
+            if far.color == BLACK:
+                near.color, w.color = BLACK, RED
+                self._rotate(w, not left)
+                w = x.parent.right if left else x.parent.left
+                far = w.right if left else w.left
+            w.color, x.parent.color, far.color = x.parent.color, BLACK, BLACK
+            self._rotate(x.parent, left)
+            x = self.root
+        x.color = BLACK
+
+    def update(self, patient_id, new_name=None, new_is_cured=None, new_diseases=None):
+        node = self.search(patient_id)
+        if not node:
+            return False
+        _apply_update(node, new_name, new_is_cured, new_diseases)
+        return True
+
+    def range_query(self, lo, hi):
+        stack, node, nil = [], self.root, self.nil
+        while stack or node is not nil:
+            if node is not nil:
+                if node.patient_id < lo:
+                    node = node.right
+                else:
+                    stack.append(node)
+                    node = node.left
+            else:
+                node = stack.pop()
+                if node.patient_id > hi:
+                    return
+                yield node
+                node = node.right
+
+    def inorder_nodes(self):
+        return self.range_query(float("-inf"), float("inf"))
+
+    def check_properties(self):
+        # red nodes have black children and every root-to-leaf path has the same black count
+        def black_height(node):
+            if node is self.nil:
+                return 1
+            if node.color == RED and RED in (node.left.color, node.right.color):
+                return -1
+            lh, rh = black_height(node.left), black_height(node.right)
+            if lh < 0 or lh != rh:
+                return -1
+            return lh + (node.color == BLACK)
+        ok = self.root.color == BLACK and black_height(self.root) > 0
+        print(f"{'✓ Red-black' if ok else '✗ Red-black violated'}")
+        return ok
+
+
+# ---------------- TREAP ----------------
+
+class TreapNode(AVLNode):
+    def __init__(self, patient_id, patient_name, is_cured, diseases, priority):
+        super().__init__(patient_id, patient_name, is_cured, diseases)
+        self.priority = priority
+
+
+class TreapPatientTree(AVLPatientTree):
+    """
+    Binary search tree on patient_id that is a max-heap on random priorities,
+    so it is balanced in expectation. An insert makes 2 rotations on average
+    and nothing is rebalanced on the way back up.
+    Reuses the AVL tree's search, range queries and display.
+    """
+
+    def __init__(self, seed=None):
+        super().__init__()
+        self.random = random.Random(seed)
+
+    def _rotate(self, node, left):
+        # every treap rotation goes through here, so instrumentation can count them
+        return rotate_left(node) if left else rotate_right(node)
+
+    def _insert(self, node, patient_id, patient_name, is_cured, diseases):
+        if not node:
+            return TreapNode(patient_id, patient_name, is_cured, diseases, self.random.random())
+        if patient_id < node.patient_id:
+            node.left = self._insert(node.left, patient_id, patient_name, is_cured, diseases)
+            if node.left.priority > node.priority:
+                return self._rotate(node, False)
+        elif patient_id > node.patient_id:
+            node.right = self._insert(node.right, patient_id, patient_name, is_cured, diseases)
+            if node.right.priority > node.priority:
+                return self._rotate(node, True)
+        else:
+            self._unchanged = True
+        return node
+
+    def _remove(self, node, patient_id):
+        if not node:
+            self._unchanged = True
+            return node
+        if patient_id < node.patient_id:
+            node.left = self._remove(node.left, patient_id)
+        elif patient_id > node.patient_id:
+            node.right = self._remove(node.right, patient_id)
+        else:
+            # rotate the node down below its higher-priority child until it is a leaf's parent
+            if not node.left:
+                return node.right
+            if not node.right:
+                return node.left
+            if node.left.priority > node.right.priority:
+                top = self._rotate(node, False)
+                top.right = self._remove(node, patient_id)
+            else:
+                top = self._rotate(node, True)
+                top.left = self._remove(node, patient_id)
+            return top
+        return node
+
+    def check_properties(self):
+        ok = True
+        for node in self.inorder_nodes():
+            for child in (node.left, node.right):
+                if child and child.priority > node.priority:
+                    ok = False
+        print(f"{'✓ Heap-ordered' if ok else '✗ Heap order violated'}")
+        return ok
+
+
+# ---------------- SORTED BLOCKS ----------------
+
+class SortedBlocksIndex:
+    """
+    Sorted array split into blocks of at most `block_size` patients (ids and
+    nodes in parallel lists), with the last id of each block kept for
+    bisection. Writes shift at most one block, reads are two bisections, and
+    range scans walk contiguous lists. No rotations at all.
+    """
+
+    def __init__(self, block_size=512):
+        self.block_size = block_size
+        self.keys = []   # per block: sorted patient ids
+        self.nodes = []  # per block: nodes in the same order
+        self.maxes = []  # last id of every block
+
+    def _locate(self, patient_id):
+        b = bisect_left(self.maxes, patient_id)
+        return min(b, len(self.maxes) - 1)
+
+    def search(self, patient_id):
+        if not self.maxes:
+            return None
+        b = self._locate(patient_id)
+        keys = self.keys[b]
+        i = bisect_left(keys, patient_id)
+        return self.nodes[b][i] if i < len(keys) and keys[i] == patient_id else None
+
+    def insert(self, patient_id, patient_name, is_cured, diseases):
+        node = AVLNode(patient_id, patient_name, is_cured, diseases)
+        if not self.maxes:
+            self.keys, self.nodes, self.maxes = [[patient_id]], [[node]], [patient_id]
+            return True
+        b = self._locate(patient_id)
+        keys = self.keys[b]
+        i = bisect_left(keys, patient_id)
+        if i < len(keys) and keys[i] == patient_id:
+            return False
+        keys.insert(i, patient_id)
+        self.nodes[b].insert(i, node)
+        self.maxes[b] = keys[-1]
+        if len(keys) > self.block_size:
+            half = len(keys) // 2
+            self.keys[b + 1:b + 1] = [keys[half:]]
+            self.nodes[b + 1:b + 1] = [self.nodes[b][half:]]
+            del keys[half:], self.nodes[b][half:]
+            self.maxes[b:b + 1] = [keys[-1], self.keys[b + 1][-1]]
+        return True
+
+    def remove(self, patient_id):
+        if not self.maxes:
+            return False
+        b = self._locate(patient_id)
+        keys = self.keys[b]
+        i = bisect_left(keys, patient_id)
+        if i == len(keys) or keys[i] != patient_id:
+            return False
+        del keys[i], self.nodes[b][i]
+        if keys:
+            self.maxes[b] = keys[-1]
+        else:
+            del self.keys[b], self.nodes[b], self.maxes[b]
+        return True
+
+    def update(self, patient_id, new_name=None, new_is_cured=None, new_diseases=None):
+        node = self.search(patient_id)
+        if not node:
+            return False
+        _apply_update(node, new_name, new_is_cured, new_diseases)
+        return True
+
+    def range_query(self, lo, hi):
+        b = bisect_left(self.maxes, lo)
+        i = bisect_left(self.keys[b], lo) if b < len(self.keys) else 0
+        while b < len(self.keys):
+            keys, nodes = self.keys[b], self.nodes[b]
+            j = bisect_right(keys, hi)
+            yield from nodes[i:j]
+            if j < len(keys):
+                return
+            b, i = b + 1, 0
+
+    def inorder_nodes(self):
+        return self.range_query(float("-inf"), float("inf"))
+
+    def __len__(self):
+        return sum(len(k) for k in self.keys)
+
+    def check_properties(self):
+        flat = [k for keys in self.keys for k in keys]
+        ok = flat == sorted(set(flat)) and self.maxes == [keys[-1] for keys in self.keys]
+        print(f"{'✓ Ordered' if ok else '✗ Out of order'} ({len(flat)} patients, {len(self.keys)} blocks)")
+        return ok
+
+
+# ---------------- FACTORY ----------------
+
+ENGINES = {
+    "avl": AVLPatientTree,
+    "rbtree": RedBlackPatientTree,
+    "treap": TreapPatientTree,
+    "sorted": SortedBlocksIndex,
+}
+
+
+def create_patient_index(backend="avl", path=None, **options) -> OrderedPatientIndex:
+    """
+    A standalone index for the benchmarks and the differential harness.
+    In-memory engines: "avl", "rbtree", "treap", "sorted"; "bplus" keeps a
+    page file at `path`. PatientRecord always uses AVLPatientTree, since its
+    version hashes and snapshots encode the AVL shape.
+    """
+    if backend == "bplus":
+        from .bplus_tree import BPlusPatientTree
+        return BPlusPatientTree(path, **options)
+    if backend not in ENGINES:
+        raise ValueError(f"unknown backend '{backend}'")
+    return ENGINES[backend](**options)
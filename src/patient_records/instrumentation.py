@@ -0,0 +1,278 @@
+import cProfile
+import functools
+import json
+import pstats
+import sys
+import threading
+import time
+from bisect import bisect_left
+
+from .index_engines import RedBlackPatientTree, TreapPatientTree
+from .main import AVLPatientTree, LogReader, PatientRecord, InteractiveAVLTester
+
+# bucket upper bounds; the last bucket is +Inf
+SECONDS_BUCKETS = (1e-6, 5e-6, 1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+COUNT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128)
+BYTES_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1 << 20, 4 << 20, 16 << 20, 64 << 20)
+NODES_BUCKETS = (0, 1, 4, 16, 64, 256, 1024, 4096, 16384, 65536, 262144, 1 << 20)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        # upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return 0
+        rank, seen = q * self.count, 0
+        for bound, c in zip(self.buckets + (float("inf"),), self.counts):
+            seen += c
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], self.counts)),
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def inc(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, value, buckets=SECONDS_BUCKETS):
+        with self.lock:
+            h = self.histograms.get(name)
+            if h is None:
+                h = self.histograms[name] = Histogram(buckets)
+            h.observe(value)
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "counters": dict(self.counters),
+                "histograms": {k: h.snapshot() for k, h in self.histograms.items()},
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self, prefix="patient_store"):
+        lines = []
+        with self.lock:
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE {prefix}_{name} counter")
+                lines.append(f"{prefix}_{name} {value}")
+            for name, h in sorted(self.histograms.items()):
+                lines.append(f"# TYPE {prefix}_{name} histogram")
+                seen = 0
+                for bound, c in zip([str(b) for b in h.buckets] + ["+Inf"], h.counts):
+                    seen += c
+                    lines.append(f'{prefix}_{name}_bucket{{le="{bound}"}} {seen}')
+                lines.append(f"{prefix}_{name}_sum {h.sum}")
+                lines.append(f"{prefix}_{name}_count {h.count}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+# original methods while instrumentation is enabled; empty means disabled.
+# Disabled costs nothing: the classes keep their plain methods.
+_originals = {}
+
+# store changes in progress on this thread; their own searches (the lookup of the
+# patient to change, the tree's walk) are counted apart from read lookups
+_writing = threading.local()
+
+# store change -> name of its metrics (insert_seconds, update_total, ...)
+STORE_OPS = {"add": "insert", "remove": "remove", "update": "update", "set_cured": "update",
+             "rename": "update", "add_disease": "update", "remove_disease": "update"}
+
+
+# ---------- wrappers ----------
+def _rotation(orig, metrics):
+    @functools.wraps(orig)
+    def wrapper(self, *args):
+        metrics.inc("rotations_total")
+        return orig(self, *args)
+    return wrapper
+
+
+def _store_op(orig, metrics, op):
+    # one observation per store call; a change made through another store method is part of it
+    @functools.wraps(orig)
+    def wrapper(self, *args, **kwargs):
+        depth = getattr(_writing, "depth", 0)
+        if depth:
+            return orig(self, *args, **kwargs)
+        before = metrics.counters.get("rotations_total", 0)
+        t = time.perf_counter()
+        _writing.depth = 1
+        try:
+            return orig(self, *args, **kwargs)
+        finally:
+            _writing.depth = 0
+            metrics.observe(f"{op}_seconds", time.perf_counter() - t)
+            metrics.observe("rotations_per_op", metrics.counters.get("rotations_total", 0) - before, COUNT_BUCKETS)
+            metrics.inc(f"{op}_total")
+    return wrapper
+
+
+def _search(metrics):
+    # iterative twin of AVLPatientTree._search that also measures the path length:
+    # search_path_length for lookups, write_search_path_length inside a store change
+    def _search(self, node, patient_id):
+        depth = 0
+        while node and node.patient_id != patient_id:
+            depth += 1
+            node = node.left if patient_id < node.patient_id else node.right
+        name = "write_search_path_length" if getattr(_writing, "depth", 0) else "search_path_length"
+        metrics.observe(name, depth + 1 if node else depth, COUNT_BUCKETS)
+        return node
+    return _search
+
+
+def _hash_bytes(orig, metrics):
+    @functools.wraps(orig)
+    def wrapper(self, root):
+        data = orig(self, root)
+        metrics.observe("hash_bytes", len(data), BYTES_BUCKETS)
+        return data
+    return wrapper
+
+
+def _merkle_digest(orig, metrics):
+    # merkle_digest recurses through the patched method, so each call is one node;
+    # the outermost call observes how many nodes had no cached digest and were rehashed
+    local = threading.local()
+
+    @functools.wraps(orig)
+    def wrapper(self, node):
+        if getattr(local, "rehashed", None) is not None:
+            if node is not None and node.digest is None:
+                local.rehashed += 1
+            return orig(self, node)
+        local.rehashed = 0
+        try:
+            return wrapper(self, node)
+        finally:
+            metrics.observe("merkle_nodes_rehashed", local.rehashed, NODES_BUCKETS)
+            local.rehashed = None
+    return wrapper
+
+
+def _timed(orig, metrics, name):
+    @functools.wraps(orig)
+    def wrapper(*args, **kwargs):
+        t = time.perf_counter()
+        try:
+            return orig(*args, **kwargs)
+        finally:
+            metrics.observe(name, time.perf_counter() - t)
+    return wrapper
+
+
+def _replay_step(orig, metrics):
+    @functools.wraps(orig)
+    def wrapper(self, *args, **kwargs):
+        before = metrics.counters.get("rotations_total", 0)
+        t = time.perf_counter()
+        try:
+            return orig(self, *args, **kwargs)
+        finally:
+            metrics.observe("replay_step_seconds", time.perf_counter() - t)
+            metrics.observe("rotations_per_op", metrics.counters.get("rotations_total", 0) - before, COUNT_BUCKETS)
+            metrics.inc("replay_steps_total")
+    return wrapper
+
+
+# ---------- switching ----------
+def is_enabled():
+    return bool(_originals)
+
+
+def _patch(cls, name, replacement):
+    _originals[(cls, name)] = cls.__dict__[name]
+    setattr(cls, name, replacement)
+
+
+def enable(metrics=METRICS):
+    if _originals:
+        return
+    for name in ("right_rotate", "left_rotate"):
+        _patch(AVLPatientTree, name, _rotation(getattr(AVLPatientTree, name), metrics))
+    for cls in (RedBlackPatientTree, TreapPatientTree):
+        _patch(cls, "_rotate", _rotation(cls._rotate, metrics))
+    # changes are timed at the store: PatientRecord.update changes the node in place
+    # and never calls AVLPatientTree.update
+    for name, op in STORE_OPS.items():
+        _patch(PatientRecord, name, _store_op(getattr(PatientRecord, name), metrics, op))
+    _patch(AVLPatientTree, "_search", _search(metrics))
+    _patch(PatientRecord, "hash_function", _timed(PatientRecord.hash_function, metrics, "hash_seconds"))
+    # hash_bytes is the input of the level-order scheme, merkle_digest the default one
+    _patch(PatientRecord, "hash_bytes", _hash_bytes(PatientRecord.hash_bytes, metrics))
+    _patch(PatientRecord, "merkle_digest", _merkle_digest(PatientRecord.merkle_digest, metrics))
+    _patch(PatientRecord, "fsync", _timed(PatientRecord.fsync, metrics, "fsync_seconds"))
+    _patch(PatientRecord, "add_node", _timed(PatientRecord.add_node, metrics, "add_node_seconds"))
+    _patch(PatientRecord, "checkpoint", _timed(PatientRecord.checkpoint, metrics, "checkpoint_seconds"))
+    # replay (recovery, as-of reads, compaction) applies each version through LogReader.apply
+    _patch(LogReader, "apply", _replay_step(LogReader.apply, metrics))
+
+
+def disable():
+    while _originals:
+        (cls, name), orig = _originals.popitem()
+        setattr(cls, name, orig)
+
+
+# ---------- cProfile-wrapped CLI ----------
+def profile_cli(argv):
+    """
+    python -m patient_records.instrumentation [--profile out.prof] [--metrics out.json|out.prom]
+    Runs the interactive tester with metrics enabled under cProfile, then prints
+    the top functions by cumulative time and the metrics snapshot.
+    """
+    args = dict(zip(argv[::2], argv[1::2]))
+    enable()
+    profiler = cProfile.Profile()
+    try:
+        profiler.runcall(lambda: InteractiveAVLTester().run())
+    finally:
+        disable()
+        if "--profile" in args:
+            profiler.dump_stats(args["--profile"])
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+        out = METRICS.to_prometheus() if args.get("--metrics", "").endswith(".prom") else METRICS.to_json()
+        if "--metrics" in args:
+            with open(args["--metrics"], "w") as f:
+                f.write(out)
+        print(out)
+
+
+if __name__ == "__main__":
+    profile_cli(sys.argv[1:])
@@ -0,0 +1,2228 @@
+from collections import deque
+from datetime import datetime
+from array import array
+import os
+import hashlib
+import marshal
+import struct
+import stat
+import time
+import contextlib
+import functools
+import threading
+
+from .manifest import VersionManifest
+from .name_index import NameIndex
+
+# binary snapshot files start with this line; anything else is the level-order text format
+SNAPSHOT_MAGIC = b"PRS1\n"
+# same, with a "codec:" header line and the payload compressed (see segments.compress)
+SNAPSHOT_MAGIC_COMPRESSED = b"PRS2\n"
+
+# Binary version records: header, then op specific fields.
+#   add / remove: name, is_cured, diseases (remove keeps the removed row so it can be undone)
+#   update: only the fields in the mask; strings and lists are length prefixed
+RECORD_MAGIC = b"PRV1"
+RECORD_HEAD = struct.Struct("<4sBBq32s")  # magic, op, field mask, patient id, sha256 of the tree
+RECORD_OPS = {"add": 1, "remove": 2, "update": 3}
+RECORD_OP_NAMES = {v: k for k, v in RECORD_OPS.items()}
+F_NAME, F_CURED, F_DISEASES = 1, 2, 4
+F_UNDO = 8  # record compensates an earlier one (written by PatientRecord.undo)
+F_MERKLE = 16  # the digest is the Merkle root of the tree, not the level-order sha256
+
+# Tree hashes come in two schemes. The original one is sha256 over the level-order
+# hash_input tokens, which needs the whole tree for every record. The Merkle scheme
+# hashes each node's token with its children's digests, caches that on the node and
+# only recomputes the path of a change. Merkle hashes are written "merkle:<hex>".
+MERKLE_PREFIX = "merkle:"
+EMPTY_DIGEST = bytes(32)
+
+# versions by commit time (manifest.py), for as_of
+MANIFEST_FILE = "versions.manifest"
+# as_of picks the cheapest way to a version from these estimates (100k patients):
+# seconds per version stepped back from the live tree, per version replayed
+# forward, and per byte of snapshot loaded
+AS_OF_BACK_SECONDS = 4e-5
+AS_OF_REPLAY_SECONDS = 5e-6
+AS_OF_LOAD_SECONDS_PER_BYTE = 1.4e-7
+
+# ---------------- PERSON 1 & 2 & 3 LIBRARY CLASSES ----------------
+
+class DiseaseVocabulary:
+    """
+    Process-wide table of disease names to small integer codes, assigned in
+    first-seen order. Nodes keep codes instead of strings, and a set of
+    diseases is an int bitset with bit `code` set.
+    """
+
+    def __init__(self):
+        self.codes = {}
+        self.names = []
+        self.initials = []  # lower-cased first letter per code, all the tree hash looks at
+        self.lock = threading.Lock()
+
+    def code(self, name):
+        c = self.codes.get(name)
+        if c is None:
+            # threads (a compaction replay, say) may meet the same new name at once
+            with self.lock:
+                c = self.codes.get(name)
+                if c is None:
+                    # the name goes in before its code can be looked up
+                    self.names.append(name)
+                    self.initials.append(name[:1].lower())
+                    c = self.codes[name] = len(self.names) - 1
+        return c
+
+    def encode(self, names):
+        return tuple(map(self.code, names))
+
+    def decode(self, codes):
+        names = self.names
+        return [names[c] for c in codes]
+
+    def mask(self, names):
+        # bitset of the known names; unknown names have no bit
+        bits = 0
+        for name in names:
+            c = self.codes.get(name)
+            if c is not None:
+                bits |= 1 << c
+        return bits
+
+    def __len__(self):
+        return len(self.names)
+
+
+DISEASES = DiseaseVocabulary()
+
+
+class AVLNode:
+    # Person 1: Node model for patients
+    def __init__(self, patient_id, patient_name, is_cured, diseases):
+        self.patient_id = patient_id
+        self.patient_name = patient_name
+        self.is_cured = is_cured
+        self.diseases = diseases
+        self.left = None
+        self.right = None
+        self.height = 1  # Person 1
+        self.digest = None  # cached Merkle digest of this subtree, None once it changed
+
+    # diseases are held as codes of the DISEASES vocabulary (in order) plus their bitset
+    @property
+    def diseases(self):
+        return DISEASES.decode(self.disease_codes)
+
+    @diseases.setter
+    def diseases(self, names):
+        self.set_disease_codes(DISEASES.encode(names))
+
+    def set_disease_codes(self, codes):
+        mask = 0
+        for c in codes:
+            mask |= 1 << c
+        self.disease_codes = codes
+        self.disease_mask = mask
+
+    def has_disease(self, name):
+        c = DISEASES.codes.get(name)
+        return c is not None and (self.disease_mask >> c) & 1 == 1
+
+def rotate_right(y):
+    # plain pointer rotation shared by the tree engines; each engine fixes its own balance data
+    x = y.left
+    y.left, x.right = x.right, y
+    return x
+
+
+def rotate_left(x):
+    y = x.right
+    x.right, y.left = y.left, x
+    return y
+
+
+class AVLPatientTree:
+    def __init__(self):
+        self.root = None  # Person 1
+
+    # ---------- Utilities (Person 1) ----------
+    def get_height(self, node):
+        return node.height if node else 0
+
+    def get_balance(self, node):
+        return self.get_height(node.left) - self.get_height(node.right) if node else 0
+
+    # ---------- Rotations (Person 3) ----------
+    def right_rotate(self, y):
+        x = rotate_right(y)
+        x.digest = y.digest = None
+        y.height = 1 + max(self.get_height(y.left), self.get_height(y.right))
+        x.height = 1 + max(self.get_height(x.left), self.get_height(x.right))
+        return x
+
+    def left_rotate(self, x):
+        y = rotate_left(x)
+        x.digest = y.digest = None
+        x.height = 1 + max(self.get_height(x.left), self.get_height(x.right))
+        y.height = 1 + max(self.get_height(y.left), self.get_height(y.right))
+        return y
+
+    # ---------- Insert / Search (Person 2) ----------
+    def insert(self, patient_id, patient_name, is_cured, diseases):
+        # False, and nothing changes, when the id is already there
+        self._unchanged = False
+        self.root = self._insert(self.root, patient_id, patient_name, is_cured, diseases)
+        return not self._unchanged
+
+    def _insert(self, node, patient_id, patient_name, is_cured, diseases):
+        if not node:
+            return AVLNode(patient_id, patient_name, is_cured, diseases)
+        if patient_id < node.patient_id:
+            node.left = self._insert(node.left, patient_id, patient_name, is_cured, diseases)
+        elif patient_id > node.patient_id:
+            node.right = self._insert(node.right, patient_id, patient_name, is_cured, diseases)
+        else:
+            self._unchanged = True
+            return node
+        node.height = 1 + max(self.get_height(node.left), self.get_height(node.right))
+        return self._balance(node)
+
+    def search(self, patient_id):
+        return self._search(self.root, patient_id)
+
+    def _search(self, node, patient_id):
+        while node:
+            if patient_id == node.patient_id:
+                return node
+            node = node.left if patient_id < node.patient_id else node.right
+        return None
+
+    def _touch(self, node, patient_id):
+        # _search for a node about to be changed in place: clears the cached digests on its path
+        while node:
+            node.digest = None
+            if patient_id == node.patient_id:
+                return node
+            node = node.left if patient_id < node.patient_id else node.right
+        return None
+
+    # ---------- Remove (Person 1) ----------
+    def remove(self, patient_id):
+        self._unchanged = False
+        self.root = self._remove(self.root, patient_id)
+        return not self._unchanged
+
+    def _remove(self, node, patient_id):
+        if not node:
+            self._unchanged = True
+            return node
+        if patient_id < node.patient_id:
+            node.left = self._remove(node.left, patient_id)
+        elif patient_id > node.patient_id:
+            node.right = self._remove(node.right, patient_id)
+        else:
+            if not node.left:
+                return node.right
+            if not node.right:
+                return node.left
+            succ = self._get_min_value_node(node.right)
+            node.patient_id, node.patient_name, node.is_cured = succ.patient_id, succ.patient_name, succ.is_cured
+            node.set_disease_codes(succ.disease_codes)
+            node.right = self._remove(node.right, succ.patient_id)
+        node.height = 1 + max(self.get_height(node.left), self.get_height(node.right))
+        return self._balance(node)
+
+    def _get_min_value_node(self, node):
+        while node.left:
+            node = node.left
+        return node
+
+    # ---------- Balance Logic (Person 1) ----------
+    def _balance(self, node):
+        # every node on an insert/remove path comes through here
+        node.digest = None
+        bal = self.get_balance(node)
+        if bal > 1:
+            if self.get_balance(node.left) < 0:
+                node.left = self.left_rotate(node.left)
+            return self.right_rotate(node)
+        if bal < -1:
+            if self.get_balance(node.right) > 0:
+                node.right = self.right_rotate(node.right)
+            return self.left_rotate(node)
+        return node
+
+    # ---------- Update (Person 1) ----------
+    def update(self, patient_id, new_name=None, new_is_cured=None, new_diseases=None):
+        node = self._touch(self.root, patient_id)
+        if not node:
+            return False
+        if new_name is not None:
+            node.patient_name = new_name
+        if new_is_cured is not None:
+            node.is_cured = new_is_cured
+        if new_diseases is not None:
+            node.diseases = new_diseases
+        return True
+
+    # ---------- Display & Validate (Person 3) ----------
+
+    def display_tree(self):
+        if not self.root:
+            print("Tree is empty")
+            return
+        print("\n" + "="*50)
+        print("PATIENT TREE (In-order)")
+        print("="*50)
+        self._inorder(self.root)
+
+    def _inorder(self, node):
+        if not node:
+            return
+        self._inorder(node.left)
+        print(f"ID: {node.patient_id} | Name: {node.patient_name} | Cured: {node.is_cured} | Diseases: {', '.join(node.diseases)}")
+        self._inorder(node.right)
+
+    # ---------- Range queries ----------
+    def range_query(self, lo, hi):
+        # in-order nodes with lo <= patient_id <= hi, skipping subtrees outside the range
+        stack, node = [], self.root
+        while stack or node:
+            if node:
+                if node.patient_id < lo:
+                    node = node.right
+                else:
+                    stack.append(node)
+                    node = node.left
+            else:
+                node = stack.pop()
+                if node.patient_id > hi:
+                    return
+                yield node
+                node = node.right
+
+    def inorder_nodes(self):
+        return self.range_query(float("-inf"), float("inf"))
+
+    def nodes_with_diseases(self, names, match="any"):
+        # in-order nodes having any (or all) of the named diseases, tested on the bitsets
+        wanted = DISEASES.mask(names)
+        if match == "all":
+            if any(name not in DISEASES.codes for name in names):
+                return
+            for node in self.inorder_nodes():
+                if node.disease_mask & wanted == wanted:
+                    yield node
+        else:
+            for node in self.inorder_nodes():
+                if node.disease_mask & wanted:
+                    yield node
+
+    def check_properties(self):
+        return self.check_avl_properties()
+
+    def check_avl_properties(self):
+        h, ok = self._check_balance(self.root)
+        print(f"{'✓ Balanced' if ok else '✗ Not balanced'} (Height: {h})")
+        return ok
+
+    def _check_balance(self, node):
+        if not node:
+            return 0, True
+        lh, lb = self._check_balance(node.left)
+        rh, rb = self._check_balance(node.right)
+        h = max(lh, rh) + 1
+        bal = lh - rh
+        ok = lb and rb and abs(bal) <= 1
+        if not ok:
+            print(f" Imbalance at ID {node.patient_id}: factor {bal}")
+        return h, ok
+
+    # ---------- Parsing & File IO helpers ----------
+    def _parse_line(self, line):
+        try:
+            parts = line.strip().split(' ', 3)
+            patient_id = int(parts[0])
+            patient_name = parts[1]
+            is_cured = parts[2] == "True"
+            diseases_str = parts[3][1:-1] if len(parts) > 3 else ""
+            if diseases_str:
+                diseases = [d.strip() for d in diseases_str.split(',') if d]
+            else:
+                diseases = []
+            return (patient_id, patient_name, is_cured, diseases)
+        except Exception:
+            return None
+
+    # --------- CONSTRUCT TREE FROM FILE ----------
+    def construct_tree_from_file(self, filepath):
+        # Keep behavior: empty root then insert lines
+        self.root = None
+        if os.path.exists(filepath):
+            with open(filepath, 'r') as file:
+                lines = file.readlines()
+                for line in lines:
+                    if line.strip() == "None":
+                        continue
+                    data = self._parse_line(line)
+                    if data:
+                        # Use the internal insert so balancing happens
+                        self.root = self._insert(self.root, *data)
+            return self.root
+        return None
+
+    def from_columns(self, present, ids, names, cured, diseases):
+        # tree of a binary snapshot: level-order presence mask plus one column per field
+        real = iter(map(AVLNode, ids, names, [c == 1 for c in cured], [()] * len(ids)))
+        nodes = [next(real) if p else None for p in present]
+        for node, node_codes in zip(filter(None, nodes), diseases):
+            node.set_disease_codes(node_codes)
+        return self.link_level_order(nodes)
+
+    def preorder_depths(self, root):
+        # (node, depth) in preorder with left before right, which lists each depth in level order
+        stack = [(root, 0)] if root else []
+        pop, push = stack.pop, stack.append
+        while stack:
+            node, depth = pop()
+            yield node, depth
+            depth += 1
+            if node.right:
+                push((node.right, depth))
+            if node.left:
+                push((node.left, depth))
+
+    def link_level_order(self, nodes):
+        # O(n) rebuild of a saved shape: level-order nodes where None marks a missing child
+        if not nodes or nodes[0] is None:
+            return None
+        i = 1
+        real = []
+        for node in nodes:
+            if node is None:
+                continue
+            real.append(node)
+            node.left = nodes[i] if i < len(nodes) else None
+            node.right = nodes[i + 1] if i + 1 < len(nodes) else None
+            i += 2
+        for node in reversed(real):
+            lh = node.left.height if node.left else 0
+            rh = node.right.height if node.right else 0
+            node.height = 1 + (lh if lh > rh else rh)
+        return nodes[0]
+
+    def build_from_sorted(self, nodes):
+        # O(n) height-balanced tree over nodes already in patient_id order, returns the root
+        def build(lo, hi):
+            if lo >= hi:
+                return None
+            mid = (lo + hi) // 2
+            node = nodes[mid]
+            node.left = build(lo, mid)
+            node.right = build(mid + 1, hi)
+            lh = node.left.height if node.left else 0
+            rh = node.right.height if node.right else 0
+            node.height = 1 + (lh if lh > rh else rh)
+            return node
+        return build(0, len(nodes))
+
+    def deconstruct_tree_to_file(self, filename):
+        with open(filename, 'w') as file:
+            if not self.root:
+                return
+            queue = deque([self.root])
+            level_order_nodes = []
+            while queue:
+                node = queue.popleft()
+                level_order_nodes.append(node)
+                if node is not None:
+                    queue.append(node.left)
+                    queue.append(node.right)
+            last_real_index = len(level_order_nodes) - 1
+            while last_real_index >= 0 and level_order_nodes[last_real_index] is None:
+                last_real_index -= 1
+            level_order_nodes = level_order_nodes[:last_real_index + 1]
+            for node in level_order_nodes:
+                if node is None:
+                    file.write("None\n")
+                else:
+                    diseases_str = ",".join(node.diseases)
+                    line = f"{node.patient_id} {node.patient_name} {node.is_cured} [{diseases_str}]\n"
+                    file.write(line)
+
+
+class UpdateDelta:
+    """
+    Field-level change of one patient, as kept in binary update records.
+    Diseases are stored as the removed (index, name) pairs of the old list plus
+    the names appended after them, which is enough to go both ways.
+    """
+
+    def __init__(self, patient_id, old_name=None, new_name=None, new_is_cured=None, removed=None, added=None):
+        self.patient_id = patient_id
+        self.old_name, self.new_name = old_name, new_name
+        self.new_is_cured = new_is_cured
+        self.removed = removed
+        self.added = added
+
+    @classmethod
+    def between(cls, old, new):
+        # old/new are full [id, name, cured, diseases] rows
+        delta = cls(new[0])
+        if old[1] != new[1]:
+            delta.old_name, delta.new_name = old[1], new[1]
+        if old[2] != new[2]:
+            delta.new_is_cured = new[2]
+        if list(old[3]) != list(new[3]):
+            # keep the longest greedy subsequence of old that prefixes new, append the rest
+            removed, j = [], 0
+            for i, d in enumerate(old[3]):
+                if j < len(new[3]) and new[3][j] == d:
+                    j += 1
+                else:
+                    removed.append((i, d))
+            delta.removed, delta.added = removed, list(new[3][j:])
+        return delta
+
+    def apply(self, node):
+        if self.new_name is not None:
+            node.patient_name = self.new_name
+        if self.new_is_cured is not None:
+            node.is_cured = self.new_is_cured
+        if self.removed is not None:
+            gone = {i for i, _ in self.removed}
+            node.diseases = [d for i, d in enumerate(node.diseases) if i not in gone] + self.added
+
+    def revert(self, row):
+        # row is the patient after this change, returns it as it was before
+        old = list(row)
+        if self.new_name is not None:
+            old[1] = self.old_name
+        if self.new_is_cured is not None:
+            old[2] = not self.new_is_cured
+        if self.removed is not None:
+            diseases = list(row[3][:len(row[3]) - len(self.added)])
+            for i, d in self.removed:
+                diseases.insert(i, d)
+            old[3] = diseases
+        return old
+
+    def __repr__(self):
+        parts = [f"id={self.patient_id}"]
+        if self.new_name is not None:
+            parts.append(f"name {self.old_name!r}->{self.new_name!r}")
+        if self.new_is_cured is not None:
+            parts.append(f"cured->{self.new_is_cured}")
+        if self.removed is not None:
+            parts.append(f"diseases -{[d for _, d in self.removed]} +{self.added}")
+        return "UpdateDelta(" + ", ".join(parts) + ")"
+
+
+# ---------------- PERSON 4 & 5 PERSISTENT STORAGE ----------------
+
+class LogReader:
+    """
+    Replays version files straight from their bytes. Every file is read into
+    one reused buffer and binary records are decoded from memoryview slices,
+    only as far as the operation needs: a remove reads just the patient id, an
+    update skips the old name and the removed disease names. Text records go
+    through PatientRecord.read_version_file as before.
+    """
+
+    def __init__(self, records, buffer_size=4096, tree=None):
+        self.records = records
+        self.tree = records.tree_obj if tree is None else tree
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.records_read = 0
+        self.seconds = 0.0
+        self.merkle = False  # scheme of the last digest returned by apply()
+
+    def _read(self, name):
+        # memoryview over the file's bytes, valid until the next call
+        segment = self.records.segments.get(name)
+        if segment is not None:
+            return memoryview(segment.read(name))
+        # unbuffered readinto fills the buffer in place, like readv, and exists on every platform
+        with open(os.path.join(self.records.storage_dir, name), "rb", buffering=0) as f:
+            n = f.readinto(self.view)
+            if n == len(self.buffer):
+                # record bigger than the buffer: grow it and read the rest
+                size = os.fstat(f.fileno()).st_size
+                grown = bytearray(max(size, 2 * n))
+                grown[:n] = self.buffer
+                self.buffer, self.view = grown, memoryview(grown)
+                n += f.readinto(self.view[n:])
+        return self.view[:n]
+
+    def apply(self, root, name):
+        # applies one version file to root, returns (root, ok, saved digest as raw bytes);
+        # self.merkle tells which hash scheme that digest is in
+        t = time.perf_counter()
+        buf = self._read(name)
+        if buf[:4] != RECORD_MAGIC:
+            op, old_data, new_data, saved_hash = self.records.parse_text_record(bytes(buf).decode())
+            root, ok = self.records.apply_operation(root, op, old_data, new_data, self.tree)
+            self.merkle = saved_hash.startswith(MERKLE_PREFIX)
+            saved_hash = saved_hash[len(MERKLE_PREFIX):] if self.merkle else saved_hash
+            try:
+                saved_hash = bytes.fromhex(saved_hash)
+            except ValueError:
+                saved_hash = b""
+        else:
+            root, ok, saved_hash = self._apply_binary(root, buf)
+        self.records_read += 1
+        self.seconds += time.perf_counter() - t
+        return root, ok, saved_hash
+
+    def _apply_binary(self, root, buf):
+        _, op, mask, pid, digest = RECORD_HEAD.unpack_from(buf, 0)
+        pos = RECORD_HEAD.size
+        tree = self.tree
+        self.merkle = bool(mask & F_MERKLE)
+        if op == 2:  # remove
+            return tree._remove(root, pid), True, digest
+        unpack = struct.unpack_from
+        if op == 1:  # add
+            n, = unpack("<H", buf, pos)
+            name = str(buf[pos + 2:pos + 2 + n], "utf-8")
+            pos += 2 + n
+            cured = buf[pos] == 1
+            count, = unpack("<H", buf, pos + 1)
+            pos += 3
+            diseases = []
+            for _ in range(count):
+                n, = unpack("<H", buf, pos)
+                diseases.append(str(buf[pos + 2:pos + 2 + n], "utf-8"))
+                pos += 2 + n
+            return tree._insert(root, pid, name, cured, diseases), True, digest
+        node = tree._touch(root, pid)
+        if not node:
+            return root, False, digest
+        if mask & F_NAME:
+            n, = unpack("<H", buf, pos)
+            pos += 2 + n  # old name, not needed to go forward
+            n, = unpack("<H", buf, pos)
+            node.patient_name = str(buf[pos + 2:pos + 2 + n], "utf-8")
+            pos += 2 + n
+        if mask & F_CURED:
+            node.is_cured = buf[pos] == 1
+            pos += 1
+        if mask & F_DISEASES:
+            count, = unpack("<H", buf, pos)
+            pos += 2
+            gone = set()
+            for _ in range(count):
+                i, n = unpack("<HH", buf, pos)
+                gone.add(i)
+                pos += 4 + n  # removed names are only needed for undo
+            codes = [c for i, c in enumerate(node.disease_codes) if i not in gone]
+            count, = unpack("<H", buf, pos)
+            pos += 2
+            for _ in range(count):
+                n, = unpack("<H", buf, pos)
+                codes.append(DISEASES.code(str(buf[pos + 2:pos + 2 + n], "utf-8")))
+                pos += 2 + n
+            node.set_disease_codes(tuple(codes))
+        return root, True, digest
+
+    def records_per_second(self):
+        return self.records_read / self.seconds if self.seconds else 0.0
+
+
+DURABILITY_MODES = ("none", "per-batch", "per-op", "interval")
+# snapshots are compressed on their own, without a shared dictionary, so "zdict" is for segments only
+SNAPSHOT_CODECS = (None, "zlib", "lzma")
+
+
+class GroupCommit:
+    """
+    Makes written version files durable: an fsync of every file written since
+    the last commit, then one of the storage directory for their renames.
+    Writers get a ticket per file; commit(ticket) returns once that file is
+    synced. Whoever commits first syncs everything pending, so writers arriving
+    meanwhile wait and are covered together by the next sync.
+    """
+
+    def __init__(self, records, interval_ms=None):
+        self.records = records
+        self.cond = threading.Condition()
+        self.pending = []  # paths written but not synced yet
+        self.written = 0   # ticket of the newest written file
+        self.synced = 0    # every ticket up to this one is durable
+        self.syncing = False
+        self.commits = 0
+        self.files_synced = 0
+        self.listener = None  # called with (synced ticket, time.perf_counter()) after each sync
+        self._stop = threading.Event()
+        self._thread = None
+        if interval_ms:
+            self._thread = threading.Thread(target=self._run, args=(interval_ms / 1000,), daemon=True)
+            self._thread.start()
+
+    def enqueue(self, path):
+        with self.cond:
+            self.pending.append(path)
+            self.written += 1
+            return self.written
+
+    def commit(self, ticket=None):
+        # blocks until `ticket` (default: everything written so far) is durable
+        with self.cond:
+            target = self.written if ticket is None else ticket
+            while self.synced < target:
+                if self.syncing:
+                    self.cond.wait()
+                    continue
+                self.syncing = True
+                batch, self.pending = self.pending, []
+                upto = self.written
+                self.cond.release()
+                try:
+                    self._sync(batch)
+                except BaseException:
+                    self.cond.acquire()
+                    self.pending[:0] = batch
+                    self.syncing = False
+                    self.cond.notify_all()
+                    raise
+                self.cond.acquire()
+                self.syncing = False
+                self.synced = upto
+                self.commits += 1
+                self.files_synced += len(batch)
+                if self.listener:
+                    self.listener(upto, time.perf_counter())
+                self.cond.notify_all()
+
+    def _sync(self, batch):
+        for path in batch:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except FileNotFoundError:
+                continue  # folded into a snapshot by compaction, which synced it
+            try:
+                self.records.fsync(fd)
+            finally:
+                os.close(fd)
+        if batch:
+            self.records.fsync_dir()
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.commit()
+            except OSError:
+                pass  # retried on the next tick; the files stay pending
+
+    def close(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.commit()
+
+
+def _store_change(method):
+    # store mutators run under the write lock; in "per-op" mode they return once their
+    # records are durable, waiting outside the lock so other writers join the same fsync
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            result = method(self, *args, **kwargs)
+            ticket = self.committer.written
+        if self.durability == "per-op":
+            self.committer.commit(ticket)
+        return result
+    return wrapper
+
+
+class PatientRecord:
+    def __init__(self, storage_dir=None, checkpoint_every_ops=1000, checkpoint_every_bytes=1 << 20,
+                 checkpoint_every_seconds=300, snapshot_format="binary", log_format="binary",
+                 hash_scheme="merkle", durability="none", commit_interval_ms=100, snapshot_compression=None,
+                 memory_budget=None, page_height=6):
+        self.storage_dir = storage_dir or os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'storage'))
+        os.makedirs(self.storage_dir, exist_ok=True)
+        # memory_budget (bytes): keep about that much of the tree in memory and swap cold
+        # subtrees out (see paging.py); needs the Merkle scheme, whose cached digests
+        # let hashing stop at a swapped-out subtree
+        self.memory_budget = memory_budget
+        if memory_budget:
+            if hash_scheme != "merkle":
+                raise ValueError("memory_budget needs hash_scheme='merkle'")
+            from .paging import PagedPatientTree
+            self.tree_obj = PagedPatientTree(memory_budget, self.storage_dir, page_height, self.merkle_digest)
+        else:
+            self.tree_obj = AVLPatientTree()
+        # checkpoint thresholds: whichever is reached first triggers a checkpoint
+        self.checkpoint_every_ops = checkpoint_every_ops
+        self.checkpoint_every_bytes = checkpoint_every_bytes
+        self.checkpoint_every_seconds = checkpoint_every_seconds
+        self.snapshot_format = snapshot_format
+        # None, "zlib" or "lzma" (SNAPSHOT_CODECS): compresses binary snapshot payloads
+        if snapshot_compression not in SNAPSHOT_CODECS:
+            raise ValueError(f"snapshot_compression must be one of {SNAPSHOT_CODECS}")
+        self.snapshot_compression = snapshot_compression
+        self.log_format = log_format
+        # scheme of the digests written from now on ("merkle" or "level"); both are verified
+        self.hash_scheme = hash_scheme
+        # when version files reach the disk (DURABILITY_MODES):
+        #   none: left to the OS; per-op: before each change returns (group commit);
+        #   per-batch: at commit() / the end of a batch(); interval: every commit_interval_ms
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"durability must be one of {DURABILITY_MODES}")
+        self.durability = durability
+        self.lock = threading.RLock()
+        self.committer = GroupCommit(self, commit_interval_ms if durability == "interval" else None)
+        self.last_version = None
+        # undo history: version names of the changes that can still be undone (newest last),
+        # filled lazily from the log; redo_stack holds the undone ones until the next change
+        self.undo_stack = []
+        self.redo_stack = []
+        self._undo_scan = None
+        # name lookup index, built on first use and then kept in step by change()
+        self._name_index = None
+        # sealed version name -> SegmentReader of the segment file holding it
+        self.segments = {}
+        self.load_segments()
+        # base snapshot file names, listed on first use (see base_snapshot)
+        self._snapshots = None
+        self.manifest = VersionManifest(os.path.join(self.storage_dir, MANIFEST_FILE))
+        self.last_as_of = None
+        # load the newest valid checkpoint plus the log tail into tree_obj.root
+        self.recover()
+        self.root = self.tree_obj.root
+        self.sync_manifest()
+
+    def getCurrentTime(self):
+        return datetime.now().strftime("%d-%m-%Y %H:%M:%S.%f").replace(":", "-")
+
+    def hash_input(self, data):
+        pid, name, cured, diseases = data
+        if len((pid, name, cured, diseases)) != 4:
+            return "INVALID"
+        ni = name[0].upper() if name else "_"
+        ci = "T" if cured else "F"
+        di = "".join(d[0].lower() for d in diseases) if diseases else "_"
+        return f"{pid}{ni}{ci}{di}"
+
+    def level_order_traversal(self, root):
+        if not root:
+            return []
+        q, res = deque([root]), []
+        initials = DISEASES.initials
+        while q:
+            n = q.popleft()
+            if n:
+                res.append(self.hash_input((n.patient_id, n.patient_name, n.is_cured,
+                                            [initials[c] for c in n.disease_codes])))
+                q.append(n.left); q.append(n.right)
+            else:
+                res.append("None")
+        return res
+
+    def hash_bytes(self, root):
+        return ",".join(self.level_order_traversal(root)).encode()
+
+    def hash_function(self, root):
+        # digest of root in the store's hash scheme, as written to records and snapshots
+        if self.hash_scheme == "merkle":
+            return MERKLE_PREFIX + self.merkle_digest(root).hex()
+        return hashlib.sha256(self.hash_bytes(root)).hexdigest()
+
+    def merkle_digest(self, node):
+        # sha256 of the node's hash_input token and both child digests; cached nodes are not revisited
+        if node is None:
+            return EMPTY_DIGEST
+        digest = node.digest
+        if digest is None:
+            token = self.hash_input((node.patient_id, node.patient_name, node.is_cured,
+                                     [DISEASES.initials[c] for c in node.disease_codes]))
+            digest = node.digest = hashlib.sha256(
+                token.encode() + self.merkle_digest(node.left) + self.merkle_digest(node.right)).digest()
+        return digest
+
+    def tree_digest(self, root, merkle):
+        # raw digest of root in either scheme
+        return self.merkle_digest(root) if merkle else hashlib.sha256(self.hash_bytes(root)).digest()
+
+    def hash_matches(self, root, saved_hash):
+        # checks root against a saved digest, whichever scheme it was written in
+        merkle = saved_hash.startswith(MERKLE_PREFIX)
+        saved_hex = saved_hash[len(MERKLE_PREFIX):] if merkle else saved_hash
+        return self.tree_digest(root, merkle).hex() == saved_hex
+
+    def version_time(self, name):
+        # file names are timestamps like "08-10-2025 19-31-46" (older) or "08-10-2025 19-31-46.123456"
+        if "." in name:
+            return datetime.strptime(name, "%d-%m-%Y %H-%M-%S.%f")
+        return datetime.strptime(name, "%d-%m-%Y %H-%M-%S")
+
+    def filter_invalid_files(self, files):
+        out = []
+        for f in files:
+            try:
+                self.version_time(f)
+                out.append(f)
+            except:
+                pass
+        return out
+
+    def sort_file_names(self, files):
+        return sorted(files, key=self.version_time)
+
+    def loose_version_files(self):
+        # versions still in files of their own
+        files = [f for f in os.listdir(self.storage_dir) if os.path.isfile(os.path.join(self.storage_dir, f))]
+        return self.sort_file_names(self.filter_invalid_files(files))
+
+    def list_version_files(self):
+        # every version, loose or sealed into a segment
+        files = self.loose_version_files()
+        if self.segments:
+            files = self.sort_file_names(set(files).union(self.segments))
+        return files
+
+    def version_bytes(self, name):
+        segment = self.segments.get(name)
+        if segment is not None:
+            return segment.read(name)
+        with open(os.path.join(self.storage_dir, name), 'rb') as f:
+            return f.read()
+
+    def has_version(self, name):
+        return name in self.segments or os.path.exists(os.path.join(self.storage_dir, name))
+
+    def convert_data_to_str(self, d):
+        pid, name, cured, dis = d
+        return f"{pid} {name} {cured} [{','.join(dis)}]"
+
+    def convert_str_to_data(self, s):
+        parts = s.strip().split(' ', 3)
+        pid = int(parts[0]); name = parts[1]; cured = (parts[2] == "True")
+        dis = parts[3].strip("[]") if len(parts) > 3 else ""
+        diseases = dis.split(',') if dis else []
+        return [pid, name, cured, diseases]
+
+    def add_node(self, operation, old_data, new_data, undo=False):
+        ts = self.getCurrentTime()
+        while os.path.exists(os.path.join(self.storage_dir, ts)):
+            ts = self.getCurrentTime()
+        # Ensure the tree object root matches self.root before hashing
+        self.tree_obj.root = self.root
+        h = self.hash_function(self.tree_obj.root)
+        if self.log_format == "binary":
+            body = self.encode_record(operation, old_data, new_data, h, undo)
+        else:
+            if isinstance(new_data, UpdateDelta):
+                # text records keep the full row after the change
+                new_data = self.row(self.tree_obj._search(self.root, new_data.patient_id))
+            body = operation + (" undo" if undo else "") + "\n"
+            if operation == "update":
+                body += self.convert_data_to_str(old_data) + "\n"
+            if new_data is not None:
+                body += self.convert_data_to_str(new_data) + "\n"
+            elif operation == "remove" and old_data is not None:
+                # the removed row, so replay knows which patient to remove
+                body += self.convert_data_to_str(old_data) + "\n"
+            body += "hash: " + h
+        path = self.write_version_file(ts, body)
+        self.manifest.append(ts)
+        if self.durability != "none":
+            self.committer.enqueue(path)
+        self.last_version = ts
+        self.ops_since_checkpoint += 1
+        self.bytes_since_checkpoint += os.path.getsize(path)
+        self.maybe_checkpoint(h)
+        return ts
+
+    def write_version_file(self, name, body):
+        # written under a temp name and renamed, so readers (replicas, compaction) never see half a record
+        path = os.path.join(self.storage_dir, name)
+        tmp = path + ".tmp"
+        with open(tmp, 'wb' if isinstance(body, bytes) else 'w') as f:
+            f.write(body)
+        mode = stat.S_IREAD if os.name == "nt" else 0o444
+        try:
+            os.chmod(tmp, mode)
+        except Exception:
+            pass
+        os.replace(tmp, path)
+        return path
+
+    # ----------------- store operations (tree change + version record) -----------------
+    def row(self, node):
+        return [node.patient_id, node.patient_name, node.is_cured, node.diseases.copy()]
+
+    def change(self, operation, old_data, new_data, undo=False):
+        # applies one row-level change to the live tree and logs it, returns the version name
+        self.tree_obj.root = self.root
+        if operation == "add":
+            self.tree_obj.insert(*new_data)
+        elif operation == "remove":
+            self.tree_obj.remove(old_data[0])
+        elif isinstance(new_data, UpdateDelta):
+            new_data.apply(self.tree_obj._touch(self.root, new_data.patient_id))
+        else:
+            self.tree_obj.update(*new_data)
+        self.root = self.tree_obj.root
+        self.reindex_name(self.patient_id_of(old_data, new_data))
+        version = self.add_node(operation, old_data, new_data, undo)
+        self.trim(self.root)
+        return version
+
+    def trim(self, root):
+        # in memory budget mode, a point between operations where cold subtrees may be swapped out
+        if self.memory_budget:
+            self.tree_obj.maybe_evict(root)
+
+    def patient_id_of(self, old_data, new_data):
+        # the patient a logged change is about
+        if isinstance(new_data, UpdateDelta):
+            return new_data.patient_id
+        return (new_data if new_data is not None else old_data)[0]
+
+    def _record_change(self, operation, old_data, new_data):
+        self.undo_stack.append(self.change(operation, old_data, new_data))
+        self.redo_stack.clear()
+
+    @_store_change
+    def add(self, patient_id, patient_name, is_cured, diseases):
+        if self.tree_obj._search(self.root, patient_id):
+            return False
+        self._record_change("add", None, [patient_id, patient_name, is_cured, list(diseases)])
+        return True
+
+    @_store_change
+    def update(self, patient_id, new_name=None, new_is_cured=None, new_diseases=None):
+        node = self.tree_obj._search(self.root, patient_id)
+        if not node:
+            return False
+        old = self.row(node)
+        new = [patient_id,
+               new_name if new_name is not None else old[1],
+               new_is_cured if new_is_cured is not None else old[2],
+               list(new_diseases) if new_diseases is not None else old[3].copy()]
+        self._record_change("update", old, UpdateDelta.between(old, new))
+        return True
+
+    @_store_change
+    def remove(self, patient_id):
+        node = self.tree_obj._search(self.root, patient_id)
+        if not node:
+            return False
+        self._record_change("remove", self.row(node), None)
+        return True
+
+    # ----------------- single-field updates -----------------
+    # Each logs one update record carrying only the field it changes, and with the
+    # Merkle hash scheme only the patient's path is rehashed. A call that would not
+    # change anything logs nothing. All return False when the patient does not exist.
+    def _record_delta(self, node, delta):
+        self._record_change("update", self.row(node), delta)
+
+    @_store_change
+    def set_cured(self, patient_id, is_cured=True):
+        node = self.tree_obj._search(self.root, patient_id)
+        if not node:
+            return False
+        if node.is_cured != is_cured:
+            self._record_delta(node, UpdateDelta(patient_id, new_is_cured=is_cured))
+        return True
+
+    @_store_change
+    def rename(self, patient_id, new_name):
+        node = self.tree_obj._search(self.root, patient_id)
+        if not node:
+            return False
+        if node.patient_name != new_name:
+            self._record_delta(node, UpdateDelta(patient_id, old_name=node.patient_name, new_name=new_name))
+        return True
+
+    @_store_change
+    def add_disease(self, patient_id, disease):
+        # appends a diagnosis the patient does not have yet
+        node = self.tree_obj._search(self.root, patient_id)
+        if not node:
+            return False
+        if not node.has_disease(disease):
+            self._record_delta(node, UpdateDelta(patient_id, removed=[], added=[disease]))
+        return True
+
+    @_store_change
+    def remove_disease(self, patient_id, disease):
+        # drops the first listing of a diagnosis; False if the patient does not have it
+        node = self.tree_obj._search(self.root, patient_id)
+        if not node or not node.has_disease(disease):
+            return False
+        i = node.disease_codes.index(DISEASES.codes[disease])
+        self._record_delta(node, UpdateDelta(patient_id, removed=[(i, disease)], added=[]))
+        return True
+
+    # ----------------- name search -----------------
+    def name_index(self):
+        if self._name_index is None:
+            self.tree_obj.root = self.root
+            self._name_index = NameIndex.build((n.patient_id, n.patient_name) for n in self.tree_obj.inorder_nodes())
+        return self._name_index
+
+    def reindex_name(self, patient_id):
+        # brings the name index in line with the tree for one patient (if it is built yet)
+        if self._name_index is None:
+            return
+        node = self.tree_obj._search(self.root, patient_id)
+        if node:
+            self._name_index.set(patient_id, node.patient_name)
+        else:
+            self._name_index.discard(patient_id)
+
+    def search_name_prefix(self, prefix, limit=None):
+        return [self.tree_obj._search(self.root, pid) for pid in self.name_index().prefix(prefix, limit)]
+
+    def search_name(self, query, limit=10):
+        # typo-tolerant: [(score, node)], best first
+        return [(score, self.tree_obj._search(self.root, pid))
+                for score, pid in self.name_index().fuzzy(query, limit)]
+
+    # ----------------- undo / redo -----------------
+    def is_undo_record(self, name):
+        head = self.version_bytes(name)[:RECORD_HEAD.size]
+        if head.startswith(RECORD_MAGIC):
+            return bool(RECORD_HEAD.unpack(head)[2] & F_UNDO)
+        return head.split(b"\n", 1)[0].strip().endswith(b" undo")
+
+    def _next_undoable(self):
+        # newest change not yet undone; older ones are found by walking the log backwards,
+        # where each undo record cancels the nearest earlier change still standing
+        if self.undo_stack:
+            name = self.undo_stack.pop()
+            if self.has_version(name):
+                return name
+            # compacted away together with everything older
+            self.undo_stack.clear()
+            self._undo_scan = [[], 0]
+            return None
+        if self._undo_scan is None:
+            # history starts at the newest base snapshot (compaction or bulk import)
+            bases = self.snapshot_files()
+            base_version = self.read_snapshot_trailer(bases[-1])[0] if bases else None
+            self._undo_scan = [self.versions_after(base_version), 0]
+        files, pending = self._undo_scan
+        while files:
+            name = files.pop()
+            if not self.has_version(name):
+                files.clear()
+                break
+            if self.is_undo_record(name):
+                pending += 1
+            elif pending:
+                pending -= 1
+            else:
+                self._undo_scan[1] = pending
+                return name
+        self._undo_scan[1] = pending
+        return None
+
+    @_store_change
+    def undo(self, steps=1):
+        """
+        Steps back `steps` changes by applying the inverse of each logged record
+        to the live tree (O(log n) each) and logging it as an undo record, so the
+        log stays append-only and replayable. Returns the number undone.
+        """
+        done = 0
+        while done < steps:
+            name = self._next_undoable()
+            if name is None:
+                break
+            op, old_data, new_data, _ = self.read_version_file(name)
+            if new_data is None and old_data is None:
+                # old text remove records did not keep the removed row
+                self.undo_stack.append(name)
+                raise ValueError(f"version '{name}' cannot be undone")
+            node = self.tree_obj._search(self.root, self.patient_id_of(old_data, new_data))
+            if op == "add":
+                self.change("remove", self.row(node), None, undo=True)
+            elif op == "remove":
+                self.change("add", None, old_data, undo=True)
+            else:
+                current = self.row(node)
+                before = new_data.revert(current) if isinstance(new_data, UpdateDelta) else old_data
+                self.change("update", current, UpdateDelta.between(current, before), undo=True)
+            self.redo_stack.append(name)
+            done += 1
+        return done
+
+    @_store_change
+    def redo(self, steps=1):
+        # re-applies the most recently undone changes as ordinary records; returns the number redone
+        done = 0
+        while done < steps and self.redo_stack:
+            op, old_data, new_data, _ = self.read_version_file(self.redo_stack.pop())
+            if op == "update":
+                current = self.row(self.tree_obj._search(self.root, self.patient_id_of(old_data, new_data)))
+                if not isinstance(new_data, UpdateDelta):
+                    new_data = UpdateDelta.between(current, new_data)
+                old_data = current
+            self.undo_stack.append(self.change(op, old_data, new_data))
+            done += 1
+        return done
+
+    def search(self, patient_id):
+        return self.tree_obj._search(self.root, patient_id)
+
+    # ----------------- binary version records -----------------
+    def _pack_str(self, out, value):
+        raw = value.encode()
+        out += struct.pack("<H", len(raw)) + raw
+
+    def _pack_list(self, out, values):
+        out += struct.pack("<H", len(values))
+        for v in values:
+            self._pack_str(out, v)
+
+    def _unpack_str(self, buf, pos):
+        n, = struct.unpack_from("<H", buf, pos)
+        pos += 2
+        return bytes(buf[pos:pos + n]).decode(), pos + n
+
+    def _unpack_list(self, buf, pos):
+        n, = struct.unpack_from("<H", buf, pos)
+        pos += 2
+        out = []
+        for _ in range(n):
+            v, pos = self._unpack_str(buf, pos)
+            out.append(v)
+        return out, pos
+
+    def encode_record(self, operation, old_data, new_data, h, undo=False):
+        # full rows for add/remove, field deltas (with the old values they overwrite) for update;
+        # an update's new_data may already be the UpdateDelta
+        out = bytearray()
+        if operation == "update":
+            delta = new_data if isinstance(new_data, UpdateDelta) else UpdateDelta.between(old_data, new_data)
+            mask = ((F_NAME if delta.new_name is not None else 0)
+                    | (F_CURED if delta.new_is_cured is not None else 0)
+                    | (F_DISEASES if delta.removed is not None else 0))
+            pid = delta.patient_id
+            if mask & F_NAME:
+                self._pack_str(out, delta.old_name)
+                self._pack_str(out, delta.new_name)
+            if mask & F_CURED:
+                out.append(1 if delta.new_is_cured else 0)
+            if mask & F_DISEASES:
+                out += struct.pack("<H", len(delta.removed))
+                for i, d in delta.removed:
+                    out += struct.pack("<H", i)
+                    self._pack_str(out, d)
+                self._pack_list(out, delta.added)
+        else:
+            row = new_data if new_data is not None else old_data
+            mask, pid = 0, row[0]
+            self._pack_str(out, row[1])
+            out.append(1 if row[2] else 0)
+            self._pack_list(out, row[3])
+        if undo:
+            mask |= F_UNDO
+        if h.startswith(MERKLE_PREFIX):
+            mask |= F_MERKLE
+            h = h[len(MERKLE_PREFIX):]
+        return RECORD_HEAD.pack(RECORD_MAGIC, RECORD_OPS[operation], mask, pid, bytes.fromhex(h)) + bytes(out)
+
+    def decode_record(self, buf):
+        # same shape as read_version_file; updates come back as an UpdateDelta in new_data
+        _, op, mask, pid, digest = RECORD_HEAD.unpack_from(buf, 0)
+        pos = RECORD_HEAD.size
+        operation = RECORD_OP_NAMES[op]
+        digest = (MERKLE_PREFIX if mask & F_MERKLE else "") + digest.hex()
+        if operation == "update":
+            delta = UpdateDelta(pid)
+            if mask & F_NAME:
+                delta.old_name, pos = self._unpack_str(buf, pos)
+                delta.new_name, pos = self._unpack_str(buf, pos)
+            if mask & F_CURED:
+                delta.new_is_cured = buf[pos] == 1
+                pos += 1
+            if mask & F_DISEASES:
+                n, = struct.unpack_from("<H", buf, pos)
+                pos += 2
+                delta.removed = []
+                for _ in range(n):
+                    i, = struct.unpack_from("<H", buf, pos)
+                    d, pos = self._unpack_str(buf, pos + 2)
+                    delta.removed.append((i, d))
+                delta.added, pos = self._unpack_list(buf, pos)
+            return operation, None, delta, digest
+        name, pos = self._unpack_str(buf, pos)
+        cured = buf[pos] == 1
+        diseases, pos = self._unpack_list(buf, pos + 1)
+        row = [pid, name, cured, diseases]
+        if operation == "remove":
+            return operation, row, None, digest
+        return operation, None, row, digest
+
+    # ----------------- version replay & snapshots -----------------
+    def read_version_file(self, name):
+        # returns (operation, old_data, new_data, saved_hash) of one version file
+        return self.decode_version(self.version_bytes(name))
+
+    def decode_version(self, raw):
+        # read_version_file on a version's bytes, binary or text
+        if raw.startswith(RECORD_MAGIC):
+            return self.decode_record(raw)
+        return self.parse_text_record(raw.decode())
+
+    def parse_text_record(self, text):
+        lines = [line.strip() for line in text.splitlines()] + [""]
+        # first word only: undo records are marked "<op> undo"
+        operation, pos = (lines[0].split() or [""])[0], 1
+        old_data = None
+        if operation == "update":
+            old_data = self.convert_str_to_data(lines[pos]) if lines[pos] else None
+            pos += 1
+        line = lines[pos]
+        new_data = None
+        if line and not line.startswith("hash:"):
+            new_data = self.convert_str_to_data(line)
+            line = lines[pos + 1] if pos + 1 < len(lines) else ""
+        saved_hash = line.split(" ", 1)[1].strip() if line and " " in line else ""
+        if operation == "remove":
+            # the row of a remove is the one that was removed, as in binary records
+            old_data, new_data = new_data, None
+        return operation, old_data, new_data, saved_hash
+
+    def apply_operation(self, root, operation, old_data, new_data, tree=None):
+        # Replays one logged operation on top of root (through tree, the live one by default), returns (root, ok)
+        tree = self.tree_obj if tree is None else tree
+        data = new_data if new_data is not None else old_data
+        if data is None:
+            return root, False
+        if operation == "add":
+            return tree._insert(root, *data), True
+        if isinstance(data, UpdateDelta):
+            node = tree._touch(root, data.patient_id)
+            if not node:
+                return root, False
+            data.apply(node)
+            return root, True
+        if operation == "update":
+            node = tree._touch(root, data[0])
+            if not node:
+                return root, False
+            node.patient_name, node.is_cured, node.diseases = data[1], data[2], data[3]
+            return root, True
+        if operation == "remove":
+            return tree._remove(root, data[0]), True
+        return root, False
+
+    def new_tree(self):
+        # an empty tree of the kind the store keeps, for building a tree beside the live one
+        if self.memory_budget:
+            from .paging import PagedPatientTree
+            return PagedPatientTree(self.memory_budget, self.storage_dir, self.tree_obj.page_height,
+                                    self.merkle_digest)
+        return AVLPatientTree()
+
+    def snapshot_files(self):
+        # snapshots are named "snapshot <last folded version>", oldest first
+        out = []
+        for f in os.listdir(self.storage_dir):
+            if not f.startswith("snapshot "):
+                continue
+            try:
+                out.append((self.version_time(f[len("snapshot "):]), f))
+            except ValueError:
+                pass
+        return [f for _, f in sorted(out)]
+
+    def fsync(self, fd):
+        # single place every fsync goes through (instrumentation hooks in here)
+        os.fsync(fd)
+
+    def fsync_dir(self):
+        if os.name == "nt":
+            return
+        fd = os.open(self.storage_dir, os.O_RDONLY)
+        try:
+            self.fsync(fd)
+        finally:
+            os.close(fd)
+
+    # ----------------- sealed segments -----------------
+    def segment_files(self):
+        # segments are named "segment <newest version in it>", oldest first
+        out = []
+        for f in os.listdir(self.storage_dir):
+            if f.startswith("segment ") and not f.endswith(".tmp"):
+                try:
+                    out.append((self.version_time(f[len("segment "):]), f))
+                except ValueError:
+                    pass
+        return [f for _, f in sorted(out)]
+
+    def load_segments(self):
+        self.segments = {}
+        names = self.segment_files()
+        if names:
+            from .segments import SegmentReader
+            for name in names:
+                reader = SegmentReader(os.path.join(self.storage_dir, name))
+                for version in reader.names:
+                    self.segments[version] = reader
+
+    def seal_versions(self, codec="zlib", upto=None, block_size=1 << 14):
+        """
+        Packs the loose version files up to `upto` (default: the version the
+        checkpoint covers) into one segment file of separately compressed blocks
+        (segments.CODECS) and deletes them. Sealed versions stay readable for
+        replay, undo and history through the segment's block index.
+        Returns the segment's name, or None when there was nothing to seal.
+        """
+        from .segments import SegmentReader, train_dictionary, write_segment
+        with self.lock:
+            if upto is None:
+                if not os.path.exists(os.path.join(self.storage_dir, 'current_tree')):
+                    return None
+                upto = self.read_snapshot_trailer('current_tree')[0]
+                if upto is None:
+                    return None
+            limit = self.version_time(upto)
+            loose = [f for f in self.loose_version_files() if self.version_time(f) <= limit]
+            if not loose:
+                return None
+            items = [(name, self.version_bytes(name)) for name in loose]
+            zdict = train_dictionary([data for _, data in items[-2000:]], DISEASES.names) if codec == "zdict" else None
+            name = "segment " + loose[-1]
+            path = write_segment(os.path.join(self.storage_dir, name), items, codec, block_size, zdict, self.fsync)
+            self.fsync_dir()
+            reader = SegmentReader(path)
+            for version in reader.names:
+                self.segments[version] = reader
+            for version in loose:
+                self.remove_storage_file(os.path.join(self.storage_dir, version))
+            self.fsync_dir()
+            return name
+
+    def remove_storage_file(self, path):
+        # version files are written read-only
+        try:
+            os.chmod(path, stat.S_IWRITE if os.name == "nt" else 0o644)
+        except Exception:
+            pass
+        os.remove(path)
+
+    def drop_sealed(self, upto):
+        # deletes the segments holding only versions up to `upto` (folded into a snapshot), returns their names
+        limit = self.version_time(upto)
+        dropped = []
+        for name in self.segment_files():
+            if self.version_time(name[len("segment "):]) > limit:
+                break
+            path = os.path.join(self.storage_dir, name)
+            for version in [v for v, r in self.segments.items() if r.path == path]:
+                del self.segments[version]
+            self.remove_storage_file(path)
+            dropped.append(name)
+        return dropped
+
+    # ----------------- durability -----------------
+    def commit(self):
+        # makes every version file written so far durable, whatever the mode
+        self.committer.commit()
+
+    @contextlib.contextmanager
+    def batch(self):
+        # "per-batch" writers: with records.batch(): <changes>  ends in one group commit
+        try:
+            yield self
+        finally:
+            self.commit()
+
+    def close(self):
+        # stops the interval committer and syncs what is still pending
+        self.committer.close()
+
+    def write_snapshot(self, root, name, version, h, keep_previous=None, tree=None):
+        # Tree file with version/hash metadata, swapped in atomically.
+        # With keep_previous the replaced file is kept under that name as a fallback.
+        # tree: the tree root belongs to, when it is not the live one
+        path = os.path.join(self.storage_dir, name)
+        if name.startswith("snapshot "):
+            self._snapshots = None
+        tmp = path + ".tmp"
+        if self.snapshot_format == "binary":
+            with open(tmp, 'wb') as f:
+                f.write(self._encode_binary_snapshot(root, version, h, tree))
+                f.flush()
+                self.fsync(f.fileno())
+        else:
+            # level-order text with "version:"/"hash:" trailers
+            tree = AVLPatientTree()
+            tree.root = root
+            tree.deconstruct_tree_to_file(tmp)
+            with open(tmp, 'a') as f:
+                f.write(f"version: {version or ''}\n")
+                f.write(f"hash: {h}\n")
+                f.flush()
+                self.fsync(f.fileno())
+        if keep_previous and os.path.exists(path):
+            os.replace(path, os.path.join(self.storage_dir, keep_previous))
+        os.replace(tmp, path)
+        self.fsync_dir()
+        return path
+
+    def _encode_binary_snapshot(self, root, version, h, tree=None):
+        # Columnar level-order layout: a presence byte per slot (0 = None child) and one
+        # column per field for the real nodes, checksummed so loading needs no tree rehash
+        # Diseases are stored as codes into the vocabulary saved once in the payload
+        # The tree is walked depth first with one set of columns per depth, joined at the
+        # end, so the walk holds a path rather than a whole level.
+        vocabulary = list(DISEASES.names)
+        typecode = 'H' if len(vocabulary) <= 0xFFFF else 'I'
+        levels = [(bytearray(b"\1" if root else b""), array('q'), [], bytearray(), array(typecode), array(typecode))]
+        for node, depth in (self.tree_obj if tree is None else tree).preorder_depths(root):
+            if depth + 1 == len(levels):
+                levels.append((bytearray(), array('q'), [], bytearray(), array(typecode), array(typecode)))
+            _, ids, names, cured, counts, codes = levels[depth]
+            ids.append(node.patient_id)
+            names.append(node.patient_name)
+            cured.append(1 if node.is_cured else 0)
+            counts.append(len(node.disease_codes))
+            codes.extend(node.disease_codes)
+            # the child slots, left to right at the next depth since this depth is in order
+            levels[depth + 1][0].extend((node.left is not None, node.right is not None))
+        present, ids, cured, counts, codes = (b"".join(level[i] for level in levels) for i in (0, 1, 3, 4, 5))
+        # a list, not joined text: names may contain any character, newlines included
+        names = [name for level in levels for name in level[2]]
+        payload = marshal.dumps((present.rstrip(b"\0"), ids, names, cured, typecode, counts, codes, vocabulary))
+        magic, codec = SNAPSHOT_MAGIC, self.snapshot_compression
+        if codec:
+            from .segments import compress
+            magic, payload = SNAPSHOT_MAGIC_COMPRESSED, compress(payload, codec)
+        header = f"version: {version or ''}\nhash: {h}\nchecksum: {hashlib.sha256(payload).hexdigest()}\n"
+        if codec:
+            header += f"codec: {codec}\n"
+        return magic + header.encode() + payload
+
+    def read_snapshot_trailer(self, name):
+        # (version, hash) of a snapshot without parsing the tree
+        path = os.path.join(self.storage_dir, name)
+        with open(path, 'rb') as f:
+            head = f.read(len(SNAPSHOT_MAGIC))
+            if head in (SNAPSHOT_MAGIC, SNAPSHOT_MAGIC_COMPRESSED):
+                lines = [f.readline().decode().rstrip("\n") for _ in range(2)]
+            else:
+                f.seek(max(0, os.path.getsize(path) - 512))
+                lines = f.read().decode(errors="replace").splitlines()
+        version, saved_hash = None, None
+        for line in lines:
+            if line.startswith("version: "):
+                version = line[len("version: "):].strip() or None
+            elif line.startswith("hash: "):
+                saved_hash = line[len("hash: "):].strip()
+        return version, saved_hash
+
+    def load_snapshot(self, name, timings=None, tree=None):
+        # Returns (root, version, saved_hash, verified). Binary snapshots are verified by
+        # their payload checksum; text ones still need hash_function(root) == saved_hash.
+        timings = {} if timings is None else timings
+        t = time.perf_counter()
+        with open(os.path.join(self.storage_dir, name), 'rb') as f:
+            raw = f.read()
+        timings["read"] = timings.get("read", 0.0) + time.perf_counter() - t
+
+        t = time.perf_counter()
+        version, saved_hash, verified = None, None, False
+        compressed = raw.startswith(SNAPSHOT_MAGIC_COMPRESSED)
+        if compressed or raw.startswith(SNAPSHOT_MAGIC):
+            pos = len(SNAPSHOT_MAGIC)
+            meta = {}
+            for _ in range(4 if compressed else 3):
+                end = raw.index(b"\n", pos)
+                key, _, value = raw[pos:end].decode().partition(": ")
+                meta[key] = value
+                pos = end + 1
+            payload = memoryview(raw)[pos:]
+            tv = time.perf_counter()
+            if hashlib.sha256(payload).hexdigest() != meta.get("checksum"):
+                raise ValueError(f"snapshot '{name}' checksum mismatch")
+            timings["verify"] = timings.get("verify", 0.0) + time.perf_counter() - tv
+            verified = True
+            version, saved_hash = meta.get("version") or None, meta.get("hash")
+            if compressed:
+                from .segments import decompress
+                payload = decompress(payload, meta["codec"])
+            columns = marshal.loads(payload)
+            present, id_bytes, names, cured = columns[:4]
+            ids = array('q')
+            ids.frombytes(id_bytes)
+            if isinstance(names, str):
+                # older payloads join the names with newlines
+                names = names.split("\n") if ids else []
+            if len(columns) == 5:
+                # older payloads keep the disease names inline
+                diseases = [DISEASES.encode(d.split(",")) if d else () for d in columns[4].split("\n")] if ids else []
+            else:
+                typecode, count_bytes, code_bytes, vocabulary = columns[4:]
+                counts, codes = array(typecode), array(typecode)
+                counts.frombytes(count_bytes)
+                codes.frombytes(code_bytes)
+                # snapshot codes -> codes of this process's vocabulary
+                remap = DISEASES.encode(vocabulary)
+                diseases, pos = [], 0
+                for k in counts:
+                    diseases.append(tuple([remap[c] for c in codes[pos:pos + k]]))
+                    pos += k
+            parse_t = time.perf_counter() - t
+            t = time.perf_counter()
+            root = (self.tree_obj if tree is None else tree).from_columns(present, ids, names, cured, diseases)
+        else:
+            rows = []
+            for line in raw.decode().splitlines():
+                if line.startswith("version: "):
+                    version = line[len("version: "):].strip() or None
+                elif line.startswith("hash: "):
+                    saved_hash = line[len("hash: "):].strip()
+                elif line.strip() == "None":
+                    rows.append(None)
+                else:
+                    data = self.tree_obj._parse_line(line)
+                    if data:
+                        rows.append(data)
+            parse_t = time.perf_counter() - t
+            t = time.perf_counter()
+            nodes = [AVLNode(*r) if r else None for r in rows]
+            root = self.tree_obj.link_level_order(nodes)
+        timings["parse"] = timings.get("parse", 0.0) + parse_t
+        timings["build"] = timings.get("build", 0.0) + time.perf_counter() - t
+        return root, version, saved_hash, verified
+
+    def load_base_snapshot(self, tree=None):
+        # Newest snapshot whose content matches its own hash, else an empty base
+        for name in reversed(self.snapshot_files()):
+            try:
+                root, version, saved_hash, verified = self.load_snapshot(name, tree=tree)
+            except Exception:
+                root, version, verified = None, None, False
+            if version and (verified or self.hash_matches(root, saved_hash)):
+                return root, version
+            print(f"⚠️ Snapshot '{name}' is invalid, skipping.")
+        return None, None
+
+    # ----------------- checkpoints & recovery -----------------
+    def checkpoint(self, h=None):
+        # write temp, fsync, rename over current_tree (previous kept as current_tree.prev), fsync dir
+        self.tree_obj.root = self.root
+        h = h or self.hash_function(self.root)
+        self.write_snapshot(self.root, 'current_tree', self.last_version, h, keep_previous='current_tree.prev')
+        self.ops_since_checkpoint = 0
+        self.bytes_since_checkpoint = 0
+        self.last_checkpoint_time = time.monotonic()
+        return h
+
+    def install_base(self, root):
+        """
+        Makes a tree built outside the log (bulk import) the store's state: it is
+        written as a base snapshot under a fresh version name and checkpointed.
+        Replays and undo start from it; older versions are no longer reachable.
+        """
+        version = self.getCurrentTime()
+        while os.path.exists(os.path.join(self.storage_dir, version)):
+            version = self.getCurrentTime()
+        h = self.hash_function(root)
+        self.write_snapshot(root, "snapshot " + version, version, h)
+        self.manifest.append(version)
+        self.root = self.tree_obj.root = root
+        if self.memory_budget:
+            self.tree_obj.census(root)
+        self.last_version = version
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self._undo_scan = None
+        self._name_index = None
+        self.checkpoint(h)
+        return version
+
+    def maybe_checkpoint(self, h=None):
+        if (self.ops_since_checkpoint >= self.checkpoint_every_ops
+                or self.bytes_since_checkpoint >= self.checkpoint_every_bytes
+                or time.monotonic() - self.last_checkpoint_time >= self.checkpoint_every_seconds):
+            self.checkpoint(h)
+            return True
+        return False
+
+    def recover(self):
+        """
+        Single startup path: newest valid checkpoint/snapshot, then replay of the newer versions.
+        Every replayed version's hash is checked (a Merkle digest only rehashes the changed
+        path); at the first one that fails, the tree is rebuilt up to the version before it,
+        so a rejected change never stays in the tree. Phase timings end up in self.startup_timings.
+        """
+        start = time.perf_counter()
+        timings = {"read": 0.0, "parse": 0.0, "build": 0.0, "replay": 0.0, "verify": 0.0}
+        candidates, legacy = [], False
+        for name in ['current_tree', 'current_tree.prev'] + self.snapshot_files():
+            if not os.path.exists(os.path.join(self.storage_dir, name)):
+                continue
+            try:
+                version, saved_hash = self.read_snapshot_trailer(name)
+            except Exception:
+                continue
+            if saved_hash is None:
+                # current_tree written before checkpoints existed has no trailers
+                legacy = legacy or name == 'current_tree'
+                continue
+            candidates.append((self.version_time(version) if version else datetime.min, name))
+
+        root, base_version, base = None, None, None
+        for _, name in sorted(candidates, reverse=True):
+            try:
+                root, base_version, saved_hash, verified = self.load_snapshot(name, timings)
+            except Exception:
+                verified, saved_hash = False, None
+            if not verified and saved_hash is not None:
+                t = time.perf_counter()
+                verified = self.hash_matches(root, saved_hash)
+                timings["verify"] += time.perf_counter() - t
+            if verified:
+                base = name
+                break
+            print(f"⚠️ Checkpoint '{name}' is invalid, skipping.")
+            root, base_version = None, None
+
+        if base is None and legacy:
+            t = time.perf_counter()
+            self.tree_obj.construct_tree_from_file(os.path.join(self.storage_dir, 'current_tree'))
+            root = self.tree_obj.root
+            timings["build"] += time.perf_counter() - t
+            base = 'current_tree'
+            replay = []
+        else:
+            replay = self.versions_after(base_version)
+
+        self.last_version = base_version
+        reader = LogReader(self)
+        for i, name in enumerate(replay):
+            t = time.perf_counter()
+            try:
+                root, ok, saved_hash = reader.apply(root, name)
+            except Exception:
+                ok, problem = False, f"Could not read version '{name}'"
+            else:
+                problem = f"Version '{name}' could not be applied"
+            timings["replay"] += time.perf_counter() - t
+            if ok:
+                t = time.perf_counter()
+                ok = self.tree_digest(root, reader.merkle) == saved_hash
+                timings["verify"] += time.perf_counter() - t
+                problem = f"Version '{name}' does not match its hash"
+            if not ok:
+                print(f"⚠️ {problem}, recovery stopped there.")
+                # the tree was changed in place and may hold part of the rejected version
+                t = time.perf_counter()
+                root = self._replay_from(base, replay[:i])
+                if self.memory_budget:
+                    self.tree_obj.census(root)
+                timings["replay"] += time.perf_counter() - t
+                break
+            self.last_version = name
+            self.trim(root)
+
+        self.tree_obj.root = root
+        # rebuilt in bulk from the recovered tree when next needed
+        self._name_index = None
+        self.ops_since_checkpoint = 0
+        self.bytes_since_checkpoint = 0
+        self.last_checkpoint_time = time.monotonic()
+        timings["total"] = time.perf_counter() - start
+        timings["source"] = base
+        timings["tail"] = len(replay)
+        timings["replay_records_per_s"] = reader.records_per_second()
+        self.startup_timings = timings
+        return root
+
+    def versions_after(self, version, files=None):
+        files = self.list_version_files() if files is None else files
+        if version is None:
+            return files
+        t = self.version_time(version)
+        return [f for f in files if self.version_time(f) > t]
+
+    # ----------------- versions by time -----------------
+    def base_snapshot(self):
+        # newest "snapshot <version>" file (compaction or bulk import), or None
+        if self._snapshots is None or (self._snapshots and not os.path.exists(
+                os.path.join(self.storage_dir, self._snapshots[-1]))):
+            self._snapshots = self.snapshot_files()
+        return self._snapshots[-1] if self._snapshots else None
+
+    def sync_manifest(self):
+        # rebuilds the manifest from the log when its newest version is not last_version:
+        # a crash between a version file and its key, a replica, a clock that went back
+        last = self.last_version
+        if last is None or self.manifest.synced_with == last:
+            return
+        if self.manifest.last() != last:
+            names = self.list_version_files() + [f[len("snapshot "):] for f in self.snapshot_files()]
+            self.manifest.rebuild(names + [last])
+        self.manifest.synced_with = last
+
+    def as_of(self, when):
+        """
+        The store as it was at `when` (a datetime; naive ones are local time, like
+        version names): (version, root) of the newest version committed at or
+        before it. The version is found by binary search over the manifest, and
+        the tree rebuilt the cheapest way: stepping back from the live tree
+        through the newer versions, or replaying forward from a checkpoint or the
+        base snapshot. A tree stepped back from the live one shares its unchanged
+        subtrees, so it is only good until the next change. How it was built is
+        left in self.last_as_of.
+        """
+        if when.tzinfo is not None:
+            when = when.astimezone().replace(tzinfo=None)
+        with self.lock:
+            start = time.perf_counter()
+            self.sync_manifest()
+            manifest = self.manifest
+            i = manifest.at_or_before(when)
+            if i < 0:
+                raise ValueError(f"no version at or before {when}")
+            head = manifest.index(self.last_version) if self.last_version else None
+            if head is not None and i > head:
+                # versions recovery stopped short of are not part of the store's history
+                i = head
+            version = manifest.name(i)
+            # versions before the base snapshot are folded into it (or replaced by a bulk import)
+            base = self.base_snapshot()
+            floor = manifest.index(base[len("snapshot "):]) if base else 0
+            if floor is None or i < floor:
+                raise ValueError(f"version '{version}' is older than the base snapshot '{base}'")
+
+            ways = []
+            if head is not None:
+                ways.append(((head - i) * AS_OF_BACK_SECONDS, "live", head))
+            if base is None:
+                ways.append(((i + 1) * AS_OF_REPLAY_SECONDS, "first version", -1))
+            for name in ("current_tree", "current_tree.prev", base):
+                path = os.path.join(self.storage_dir, name) if name else None
+                if path is None or not os.path.exists(path):
+                    continue
+                try:
+                    j = manifest.index(self.read_snapshot_trailer(name)[0])
+                except Exception:
+                    continue
+                if j is not None and floor <= j <= i:
+                    cost = os.path.getsize(path) * AS_OF_LOAD_SECONDS_PER_BYTE + (i - j) * AS_OF_REPLAY_SECONDS
+                    ways.append((cost, name, j))
+            if not ways:
+                raise ValueError(f"no checkpoint or log path leads to version '{version}'")
+            _, source, j = min(ways)
+            try:
+                if source == "live":
+                    root = self._step_back(self.root, manifest.names(i + 1, j + 1))
+                elif source == "first version":
+                    root = self._replay_from(None, manifest.names(0, i + 1))
+                else:
+                    root = self._replay_from(source, manifest.names(j + 1, i + 1))
+            except OSError as e:
+                raise ValueError(f"version '{version}' cannot be rebuilt: {e}")
+            self.last_as_of = {"version": version, "source": source, "steps": abs(i - j),
+                               "seconds": time.perf_counter() - start}
+            return version, root
+
+    def _step_back(self, root, names):
+        # root with the given (newest last) versions taken back, by path copying
+        from .version_diff import PathCopyTree
+        tree = PathCopyTree()
+        for name in reversed(names):
+            op, old_data, new_data, _ = self.read_version_file(name)
+            if op == "add":
+                root = tree._remove(root, new_data[0])
+                continue
+            if op == "remove":
+                if old_data is None:
+                    raise ValueError(f"version '{name}' cannot be stepped back")
+                root = tree._insert(root, *old_data)
+                continue
+            if isinstance(new_data, UpdateDelta):
+                node = tree._search(root, new_data.patient_id)
+                old_data = new_data.revert(self.row(node)) if node else None
+            root, ok = tree.apply(root, "update", None, old_data)
+            if not ok:
+                raise ValueError(f"version '{name}' cannot be stepped back")
+        return root
+
+    def _replay_from(self, snapshot, names):
+        # a snapshot file's tree (None: the empty tree) with the given versions replayed on top
+        root = self.load_snapshot(snapshot)[0] if snapshot else None
+        reader = LogReader(self)
+        for name in names:
+            root, ok, _ = reader.apply(root, name)
+            if not ok:
+                raise ValueError(f"version '{name}' could not be applied")
+        return root
+
+    @_store_change
+    def rollback_to(self, when):
+        """
+        Brings the store back to how it was at `when` (see as_of) by logging the
+        patients that differ as ordinary changes, so the log stays append-only
+        and the rollback can itself be undone. Returns (version, changes logged).
+        """
+        from .version_diff import diff_trees
+        version, target = self.as_of(when)
+        # taken in full first: target shares nodes with the tree the changes go to
+        changes = list(diff_trees(self.root, target))
+        for c in changes:
+            if c["change"] == "added":
+                self._record_change("add", None, c["after"])
+            elif c["change"] == "removed":
+                self._record_change("remove", c["before"], None)
+            else:
+                self._record_change("update", c["before"], UpdateDelta.between(c["before"], c["after"]))
+        return version, len(changes)
+
+    def delete_sorted_data(self):
+        files = [f for f in os.listdir(self.storage_dir) if os.path.isfile(os.path.join(self.storage_dir, f))]
+        files = self.filter_invalid_files(files)
+        files = self.sort_file_names(files)
+        
+        if not files:
+            print("No data files found")
+            return
+        
+        print(f"\nFound {len(files)} data files. Starting from FIRST inserted (oldest) to LAST inserted (newest)...")
+        
+        # Start from the FIRST file (oldest/earliest)
+        index = 0
+        
+        while index < len(files):
+            file_path = os.path.join(self.storage_dir, files[index])
+            operation, old_data, patient_data, _ = self.read_version_file(files[index])
+            if patient_data is None:
+                patient_data = old_data
+            
+            if isinstance(patient_data, UpdateDelta):
+                print(f"\n[{index + 1}/{len(files)}] Delete change: {patient_data}")
+            else:
+                print(f"\n[{index + 1}/{len(files)}] Delete patient: ID {patient_data[0]}, Name: {patient_data[1]}, Cured: {patient_data[2]}, Diseases: {patient_data[3]}")
+            print(f"File: {files[index]} (Inserted: {files[index].replace('-', ':').replace(' ', ' at ')})")
+            print(f"Operation: {operation}")
+            
+            # Only accept yes or no
+            while True:
+                choice = input("Delete this record? (yes/no): ").strip().lower()
+                if choice in ['yes', 'y']:
+                    try:
+                        # Remove read-only attribute from file before deletion
+                        try:
+                            if os.name == "nt":
+                                os.chmod(file_path, stat.S_IWRITE)
+                            else:
+                                os.chmod(file_path, 0o644)
+                        except Exception:
+                            pass
+                        
+                        # PERMANENTLY DELETE THE FILE - NO BACKUP
+                        os.remove(file_path)
+                        print(f"✓ PERMANENTLY DELETED file: {files[index]}")
+                        
+                    except Exception as e:
+                        print(f"✗ Error deleting file: {e}")
+                    
+                    index += 1
+                    break
+                    
+                elif choice in ['no', 'n']:
+                    print("Deletion stopped by user.")
+                    return  # Return to menu immediately
+                else:
+                    print("Please answer only with 'yes' or 'no'")
+            
+            if index >= len(files):
+                print("\n🎉 All files processed - storage is now empty!")
+                break
+
+    # ----------------- check_status_from_beginning (replay all files) -----------------
+    def check_status_from_beginning(self):
+        # replay starts from the newest compacted snapshot (empty tree if none)
+        temp_root, base_version = self.load_base_snapshot()
+        files = self.versions_after(base_version)
+        if base_version:
+            print("Starting from snapshot of version:", base_version)
+        print("History files:", files)
+
+        index = 0
+
+        while index < len(files):
+            print("\n1. See Next Node\n2. Display Tree\n3. Stop")
+            try:
+                choice = int(input("Enter choice: "))
+            except Exception:
+                print("Invalid choice")
+                continue
+
+            if choice == 3:
+                break
+
+            if choice == 2:
+                # display through a throwaway tree so the live tree_obj keeps its root
+                replay_tree = AVLPatientTree()
+                replay_tree.root = temp_root
+                replay_tree.display_tree()
+                continue
+
+            try:
+                operation, old_patient_data, patient_data, h = self.read_version_file(files[index])
+            except Exception:
+                print("Could not read data from file")
+                return False
+            if patient_data is None and old_patient_data is None:
+                print("Could not read data from file")
+                return False
+
+            print(f"Operation done: {operation}")
+            if old_patient_data:
+                print(f"Old patient data: {old_patient_data}")
+            print(f"Current patient data: {patient_data}")
+
+            temp_root, ok = self.apply_operation(temp_root, operation, old_patient_data, patient_data)
+            if not ok:
+                print("No suitable operation")
+                return False
+
+            # Verify hash
+            if not self.hash_matches(temp_root, h):
+                print("⚠️ Persistent data corrupted (hash mismatch).")
+                return False
+
+            index += 1
+
+        print("Reached the end of files")
+        return True
+
+
+# ---------------- PERSON 3 INTERACTIVE TESTER ----------------
+
+def parse_when(text, now=None):
+    # "09:24" or "09:24:30" (today), "19-10-2026 09:24[:30]", a version name or ISO 8601
+    text, now = text.strip(), now or datetime.now()
+    for fmt in ("%H:%M", "%H:%M:%S"):
+        try:
+            return datetime.combine(now.date(), datetime.strptime(text, fmt).time())
+        except ValueError:
+            pass
+    for fmt in ("%d-%m-%Y %H:%M", "%d-%m-%Y %H:%M:%S", "%d-%m-%Y %H-%M-%S.%f", "%d-%m-%Y %H-%M-%S"):
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            pass
+    return datetime.fromisoformat(text)
+
+
+class InteractiveAVLTester:
+    def __init__(self):
+        self.records = PatientRecord()
+        # the tester works on the recovered tree itself, not on a separate empty one
+        self.tree = self.records.tree_obj
+        print("AVL Patient Tree Interactive Tester")
+        print("="*40)
+        t = self.records.startup_timings
+        print(f"Loaded from {t['source'] or 'empty storage'} + {t['tail']} version(s) in {t['total']:.3f}s "
+              f"(read {t['read']:.3f}s, parse {t['parse']:.3f}s, build {t['build']:.3f}s, "
+              f"replay {t['replay']:.3f}s at {t['replay_records_per_s']:,.0f} records/s, verify {t['verify']:.3f}s)")
+
+    def get_input(self):
+        try:
+            pid=int(input("Patient ID: "))
+            name=input("Name: ").strip()
+            ci=input("Cured? (y/n): ").strip().lower()
+            cured=ci in ['y','yes']
+            di=input("Diseases (comma sep): ").strip()
+            dis=[d.strip() for d in di.split(',') if d.strip()] if di else []
+            return pid,name,cured,dis
+        except:
+            print("Invalid"); return None
+
+    def logged(self, change, *args):
+        # runs a store change, prints the version record it wrote (if any), returns its result
+        before = self.records.last_version
+        ok = change(*args)
+        if self.records.last_version != before:
+            print(f"Added record {os.path.join(self.records.storage_dir, self.records.last_version)}")
+        return ok
+
+    def test_insert(self):
+        d=self.get_input()
+        if d:
+            pid,name,cured,dis=d
+            if not self.logged(self.records.add, pid,name,cured,dis):
+                print("Already exists"); return
+            print("Inserted",pid); self.tree.check_avl_properties()
+
+    def test_update(self):
+        try:
+            pid=int(input("Update ID: "))
+            n=self.records.search(pid)
+            if not n: print("Not found"); return
+            nn=input("New name(skip): ").strip() or None
+            ci=input("New cured? (y/n skip): ").strip().lower()
+            nic=True if ci in ['y','yes'] else False if ci in ['n','no'] else None
+            di=input("New diseases (comma sep, or +disease / -disease; skip): ").strip()
+            # each changed field is logged as its own small record
+            ok=True
+            if nn is not None: ok=self.logged(self.records.rename, pid,nn) and ok
+            if nic is not None: ok=self.logged(self.records.set_cured, pid,nic) and ok
+            if di.startswith(('+','-')):
+                for d in [d.strip() for d in di.split(',') if d.strip()]:
+                    if d[0]=='-': ok=self.logged(self.records.remove_disease, pid,d[1:].strip()) and ok
+                    else: ok=self.logged(self.records.add_disease, pid,d.lstrip('+').strip()) and ok
+            elif di:
+                ok=self.logged(self.records.update, pid,None,None,[d.strip() for d in di.split(',') if d.strip()]) and ok
+            if ok:
+                print("Updated")
+            else:
+                print("Failed")
+        except:
+            print("Invalid")
+
+    def test_remove(self):
+        try:
+            pid=int(input("Remove ID: "))
+            if not self.logged(self.records.remove, pid): print("Not found"); return
+            print("Removed",pid); self.tree.check_avl_properties()
+        except:
+            print("Invalid")
+
+    def test_search(self):
+        try:
+            pid=int(input("Search ID: "))
+            n=self.records.search(pid)
+            if n: print("Found:",n.patient_name)
+            else: print("Not found")
+        except:
+            print("Invalid")
+
+    def rollback_to_previous_version(self):
+            """
+            Rollback by a number of changes or to a time. k changes back applies the
+            inverse of the last k logged changes to the current tree (see
+            PatientRecord.undo), so they can be redone. A time ("09:24" today, or
+            "19-10-2026 09:24") finds the version current then by binary search
+            over the version manifest and logs the differences (PatientRecord.rollback_to).
+            """
+            manifest = self.records.manifest
+            self.records.sync_manifest()
+            if not len(manifest):
+                print("No previous state (nothing has been recorded yet).")
+                return
+
+            print(f"\n📜 {len(manifest)} versions, oldest {manifest.name(0)}")
+            print(f"🔹 Current (latest) version: {self.records.last_version}")
+
+            answer = input("Enter how many changes to roll back, or a time to go back to: ").strip()
+            try:
+                steps_back = int(answer)
+            except ValueError:
+                steps_back = None
+            if steps_back is None:
+                try:
+                    when = parse_when(answer)
+                    version, n = self.records.rollback_to(when)
+                except ValueError as e:
+                    print(f"⚠️ {e}. Rollback cancelled.")
+                    return
+                self.tree.root = self.records.root
+                print(f"\n✅ Back to version {version}: {n} patient(s) changed "
+                      f"({self.records.last_as_of['source']}, {self.records.last_as_of['seconds'] * 1000:.1f} ms).")
+                return
+
+            if steps_back < 1:
+                print("Invalid rollback range. Rollback cancelled.")
+                return
+
+            try:
+                done = self.records.undo(steps_back)
+            except ValueError as e:
+                print(f"⚠️ {e}. Rollback stopped.")
+                return
+            self.tree.root = self.records.root
+
+            print(f"\n✅ Successfully rolled back {done} change(s).")
+            if done < steps_back:
+                print("Reached the start of the history.")
+            print(f"🔁 {len(self.records.redo_stack)} change(s) can be redone.")
+
+    def redo_rollback(self):
+        try:
+            steps = int(input(f"Enter how many changes to redo (1 to {len(self.records.redo_stack)}): ").strip())
+        except Exception:
+            print("Invalid input."); return
+        done = self.records.redo(steps)
+        self.tree.root = self.records.root
+        print(f"✅ Redid {done} change(s).")
+
+    def delete_storage_data(self):
+        self.records.delete_sorted_data()
+
+    def compact_storage(self):
+        from .compaction import LogCompactor
+        try:
+            days = input("Keep versions newer than how many days? (default 7): ").strip()
+            retention = float(days) * 24 * 3600 if days else 7 * 24 * 3600
+        except Exception:
+            print("Invalid"); return
+        r = LogCompactor(self.records, retention_seconds=retention).run_once()
+        if r["error"]:
+            print(f"⚠️ Compaction aborted: {r['error']}")
+        else:
+            print(f"Folded {r['folded']} versions, reclaimed {r['bytes_reclaimed']} bytes in {r['seconds']:.3f}s")
+
+    def name_search(self):
+        query = input("Name or start of a name: ").strip()
+        matches = [(1.0, n) for n in self.records.search_name_prefix(query, limit=20)]
+        if not matches:
+            print("No name starts with that, closest names:")
+            matches = self.records.search_name(query)
+        if not matches:
+            print("Not found"); return
+        for score, node in matches:
+            print(f"ID: {node.patient_id} | Name: {node.patient_name} | Cured: {node.is_cured} | Diseases: {', '.join(node.diseases)} ({score:.2f})")
+
+    def cohort_query(self):
+        from .cohort import CohortIndex
+        query = input("Cohort query (e.g. flu AND NOT cured AND id:100..500): ").strip()
+        index = CohortIndex.for_records(self.records)
+        try:
+            n = index.count(query)
+        except ValueError as e:
+            print(f"Invalid query: {e}"); return
+        print(f"{n} patient(s) match")
+        for node in index.select(query):
+            print(f"ID: {node.patient_id} | Name: {node.patient_name} | Cured: {node.is_cured} | Diseases: {', '.join(node.diseases)}")
+
+    def run(self):
+        while True:
+            print("\nMenu: 1.Add 2.Update 3.Remove 4.Search 5.Display 6.RollBack 7.check_status_from_beginning 8.DeleteStorage 9.Exit 10.Compact 11.Redo 12.Cohort 13.NameSearch")
+            c=input("Choice: ").strip()
+            if c=='1': self.test_insert()
+            elif c=='2': self.test_update()
+            elif c=='3': self.test_remove()
+            elif c=='4': self.test_search()
+            elif c=='5': self.tree.display_tree()
+            elif c=='6': self.rollback_to_previous_version()
+            elif c=='7': self.records.check_status_from_beginning()
+            elif c=='8': self.delete_storage_data()
+            elif c=='9':
+                self.records.checkpoint()
+                print("Exiting...")
+                break
+            elif c=='10': self.compact_storage()
+            elif c=='11': self.redo_rollback()
+            elif c=='12': self.cohort_query()
+            elif c=='13': self.name_search()
+            else: print("Invalid")
+
+if __name__=="__main__":
+    InteractiveAVLTester().run()
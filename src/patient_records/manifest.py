@@ -0,0 +1,152 @@
+import os
+import struct
+import threading
+from array import array
+from datetime import datetime, timedelta
+
+# Version names are commit times, "%d-%m-%Y %H-%M-%S.%f" in local time (older
+# ones without microseconds), so telling which version was current at some moment
+# means sorting the names. The manifest keeps them sorted instead: one int64 key
+# per version (native byte order, like the snapshot arrays), oldest first,
+# appended as versions are logged. A key is the microseconds since 1970-01-01
+# times two, plus one for a name written without microseconds, so keys sort like
+# the times and still give back the exact name.
+
+KEY = struct.Struct("=q")
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+_DAYS = {}  # "08-10-2025" -> days since 1970-01-01
+
+
+def version_key(name):
+    # "08-10-2025 19-31-46.123456" -> key, without strptime (rebuilds parse every version)
+    day = name[:10]
+    days = _DAYS.get(day)
+    if days is None:
+        days = _DAYS[day] = (datetime(int(day[6:10]), int(day[3:5]), int(day[0:2])) - _EPOCH).days
+    seconds = ((days * 24 + int(name[11:13])) * 60 + int(name[14:16])) * 60 + int(name[17:19])
+    return 2 * (seconds * 1000000 + int(name[20:26] or 0)) + (len(name) == 19)
+
+
+def time_key(when):
+    # newest key at or before a (naive, local) datetime
+    return 2 * ((when - _EPOCH) // _MICROSECOND) + 1
+
+
+def version_name(key):
+    dt = _EPOCH + timedelta(microseconds=key >> 1)
+    return dt.strftime("%d-%m-%Y %H-%M-%S" if key & 1 else "%d-%m-%Y %H-%M-%S.%f")
+
+
+# os.pread/os.pwrite are POSIX only. Elsewhere (Windows) they are a seek and a
+# read or write; the file position is shared, so those pairs take a lock.
+if hasattr(os, "pread"):
+    pread, pwrite = os.pread, os.pwrite
+else:
+    _seek_lock = threading.Lock()
+
+    def pread(fd, n, offset):
+        with _seek_lock:
+            os.lseek(fd, offset, os.SEEK_SET)
+            parts = []
+            while n > 0:
+                chunk = os.read(fd, n)
+                if not chunk:
+                    break
+                parts.append(chunk)
+                n -= len(chunk)
+            return b"".join(parts)
+
+    def pwrite(fd, data, offset):
+        with _seek_lock:
+            os.lseek(fd, offset, os.SEEK_SET)
+            view, done = memoryview(data), 0
+            while done < len(view):
+                done += os.write(fd, view[done:])
+            return done
+
+
+class VersionManifest:
+    """
+    Every version of a store by commit time, in a file of fixed-width keys.
+    Lookups binary search it with pread, so finding the version current at a
+    given time reads O(log V) keys and never lists the storage directory.
+    The log is the source of truth: PatientRecord.sync_manifest rebuilds the
+    file from it when the two disagree.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # a file object rather than a bare fd, so a store dropped without close() does not leak it
+        self.file = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o644), "r+b", buffering=0)
+        self.fd = self.file.fileno()
+        size = os.fstat(self.fd).st_size
+        self.count = size // KEY.size
+        if size % KEY.size:
+            # torn append: drop the partial key
+            os.ftruncate(self.fd, self.count * KEY.size)
+        self.synced_with = None  # last_version the file was last checked against
+
+    def __len__(self):
+        return self.count
+
+    def key(self, i):
+        return KEY.unpack(pread(self.fd, KEY.size, i * KEY.size))[0]
+
+    def name(self, i):
+        return version_name(self.key(i))
+
+    def last(self):
+        return self.name(self.count - 1) if self.count else None
+
+    def names(self, lo, hi):
+        # version names at positions lo .. hi - 1, in one read
+        keys = array('q')
+        if hi > lo:
+            keys.frombytes(pread(self.fd, (hi - lo) * KEY.size, lo * KEY.size))
+        return [version_name(k) for k in keys]
+
+    def bisect_right(self, key):
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if key < self.key(mid):
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def index(self, name):
+        # position of a version, or None when it is not in the manifest
+        key = version_key(name)
+        i = self.bisect_right(key) - 1
+        return i if i >= 0 and self.key(i) == key else None
+
+    def at_or_before(self, when):
+        # position of the newest version committed at or before `when`, -1 if none
+        return self.bisect_right(time_key(when)) - 1
+
+    def append(self, name):
+        # False (and nothing written) when name is not newer than the last version
+        key = version_key(name)
+        if self.count and key <= self.key(self.count - 1):
+            return False
+        pwrite(self.fd, KEY.pack(key), self.count * KEY.size)
+        self.count += 1
+        return True
+
+    def rebuild(self, names):
+        keys = array('q', sorted(set(map(version_key, names))))
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            keys.tofile(f)
+        os.replace(tmp, self.path)
+        self.file.close()
+        self.file = open(self.path, "r+b", buffering=0)
+        self.fd = self.file.fileno()
+        self.count = len(keys)
+
+    def close(self):
+        self.file.close()
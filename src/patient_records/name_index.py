@@ -0,0 +1,142 @@
+import math
+import unicodedata
+from bisect import bisect_left, insort
+
+
+def normalize_name(name):
+    # case-folded, accents stripped, whitespace collapsed: "  José  Núñez" -> "jose nunez"
+    decomposed = unicodedata.normalize("NFKD", name)
+    plain = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(plain.casefold().split())
+
+
+def name_grams(norm, n=3):
+    padded = f" {norm} "
+    return {padded[i:i + n] for i in range(max(len(padded) - n + 1, 1))}
+
+
+def edit_distance(a, b):
+    # Levenshtein distance that also counts a swap of two neighbouring letters as one edit
+    prev2, prev = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        prev2, prev = prev, cur
+    return prev[len(b)]
+
+
+class NameIndex:
+    """
+    Lookup index on normalized patient names:
+      - keys: sorted (name, patient_id) pairs for prefix search by bisection
+      - grams: n-gram -> patient ids, to find candidates for typo-tolerant
+        search, which fuzzy() then ranks by edit distance
+    Kept in step with the tree through set()/discard(); build() makes one in bulk.
+    """
+
+    def __init__(self, n=3):
+        self.n = n
+        self.names = {}  # patient_id -> normalized name
+        self.keys = []
+        self.grams = {}
+
+    @classmethod
+    def build(cls, pairs, n=3):
+        index = cls(n)
+        names = index.names
+        for pid, name in pairs:
+            names[pid] = normalize_name(name)
+        index.keys = sorted((norm, pid) for pid, norm in names.items())
+        grams = index.grams
+        for pid, norm in names.items():
+            for g in name_grams(norm, n):
+                ids = grams.get(g)
+                if ids is None:
+                    grams[g] = {pid}
+                else:
+                    ids.add(pid)
+        return index
+
+    def __len__(self):
+        return len(self.names)
+
+    # ---------- maintenance ----------
+    def set(self, patient_id, name):
+        norm = normalize_name(name)
+        old = self.names.get(patient_id)
+        if old == norm:
+            return
+        if old is not None:
+            self.discard(patient_id)
+        self.names[patient_id] = norm
+        insort(self.keys, (norm, patient_id))
+        for g in name_grams(norm, self.n):
+            self.grams.setdefault(g, set()).add(patient_id)
+
+    def discard(self, patient_id):
+        norm = self.names.pop(patient_id, None)
+        if norm is None:
+            return
+        i = bisect_left(self.keys, (norm, patient_id))
+        del self.keys[i]
+        for g in name_grams(norm, self.n):
+            ids = self.grams[g]
+            ids.discard(patient_id)
+            if not ids:
+                del self.grams[g]
+
+    # ---------- lookup ----------
+    def prefix(self, prefix, limit=None):
+        # patient ids whose normalized name starts with prefix, in name order
+        norm = normalize_name(prefix)
+        keys = self.keys
+        i = bisect_left(keys, (norm,))
+        found = 0
+        while i < len(keys) and keys[i][0].startswith(norm) and (limit is None or found < limit):
+            yield keys[i][1]
+            i += 1
+            found += 1
+
+    def fuzzy(self, query, limit=10, min_score=0.3, shortlist=50):
+        """
+        Best matches for a possibly misspelt name as (score, patient_id), best
+        first. Candidates are names sharing enough n-grams with the query (Dice
+        coefficient >= min_score); the best `shortlist` of them are ranked by
+        edit similarity, 1 - distance / longer length, where swapping two
+        neighbouring letters counts as one edit. Ties go to the shorter, then
+        alphabetically first name.
+        """
+        norm = normalize_name(query)
+        wanted = sorted(name_grams(norm, self.n), key=lambda g: len(self.grams.get(g, ())))
+        # a name reaching min_score shares at least `need` n-grams with the query, so it
+        # must contain one of the len(wanted) - need + 1 rarest; the commoner ones only
+        # add to candidates found that way
+        need = max(1, math.ceil(min_score * len(wanted) / 2))
+        seeds = len(wanted) - need + 1
+        shared = {}
+        for g in wanted[:seeds]:
+            for pid in self.grams.get(g, ()):
+                shared[pid] = shared.get(pid, 0) + 1
+        for g in wanted[seeds:]:
+            ids = self.grams.get(g, ())
+            for pid in shared:
+                if pid in ids:
+                    shared[pid] += 1
+        scored = []
+        for pid, common in shared.items():
+            name = self.names[pid]
+            score = 2 * common / (len(wanted) + len(name_grams(name, self.n)))
+            if score >= min_score:
+                scored.append((score, pid))
+        scored.sort(reverse=True)
+        ranked = []
+        for _, pid in scored[:shortlist]:
+            name = self.names[pid]
+            similarity = 1 - edit_distance(norm, name) / max(len(norm), len(name), 1)
+            ranked.append((-similarity, len(name), name, pid))
+        ranked.sort()
+        return [(-neg, pid) for neg, _, _, pid in ranked[:limit]]
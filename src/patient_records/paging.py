@@ -0,0 +1,376 @@
+import struct
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from itertools import accumulate
+
+from .main import AVLNode, AVLPatientTree
+from .manifest import pread, pwrite
+
+# ---------------- MEMORY BUDGET MODE ----------------
+# The tree is cut into pages: subtrees at most page_height high hanging off the
+# nodes above them. When the nodes in memory outgrow the budget, the least
+# recently used pages are written to a swap file and the root node of each
+# turns, in place, into a SwappedNode holding only the subtree's height and
+# Merkle digest, which is all balancing and hashing read from a child. Reading
+# anything else turns it back into the root with its subtree read in, so parent
+# pointers and nodes held by a caller stay valid through an eviction.
+#
+# Evictions only run between operations (maybe_evict) and every SCAN_TRIM nodes
+# of a read-only walk, never while an insert or remove holds part of a page.
+# Pages are self-contained: evicting a page with an evicted page inside copies
+# that one's bytes in. A faulted page remembers where it came from ("clean")
+# until a change passes through it (_balance, _touch), and goes back out by
+# pointing at those bytes again instead of being written anew.
+
+PAGE_NODE = struct.Struct("<qBBHH")  # patient id, flags, height, name length, disease count
+HAS_LEFT, HAS_RIGHT, CURED = 1, 2, 4
+SCAN_TRIM = 4096
+
+
+def _node_size(node):
+    # bytes a resident node costs: object, attribute dict, name, disease codes, cached digest
+    d = node.__dict__
+    return (sys.getsizeof(node) + sys.getsizeof(d) + sys.getsizeof(d["patient_name"])
+            + sys.getsizeof(d["disease_codes"]) + (sys.getsizeof(d["digest"]) if d["digest"] else 0))
+
+
+class SwappedNode(AVLNode):
+    """
+    Root of an evicted page. Keeps height, digest and page = (tree, swap file,
+    offset, length, nodes); any other attribute read faults the page back in.
+    """
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        self.__dict__["page"][0]._fault(self)
+        return getattr(self, name)
+
+
+class PagedPatientTree(AVLPatientTree):
+    """
+    AVLPatientTree keeping about `budget_bytes` of nodes in memory. `hasher`
+    (PatientRecord.merkle_digest) fills in a page's digest before it goes out
+    so hashing the tree does not fault it back. stats() reports residency,
+    faults and evictions.
+    """
+
+    def __init__(self, budget_bytes, swap_dir=None, page_height=6, hasher=None):
+        super().__init__()
+        self.budget_bytes = budget_bytes
+        self.page_height = page_height
+        self.hasher = hasher
+        self.swap_dir = swap_dir
+        self.swap = tempfile.TemporaryFile(prefix="swap-", dir=swap_dir)
+        self.swap_end = 0
+        self.dead_bytes = 0
+        self.lock = threading.RLock()
+        self.clock = 0
+        self.resident_nodes = 0
+        sample = AVLNode(0, "Patient00000", False, ["flu", "covid"])
+        sample.digest = bytes(32)
+        self.node_bytes = _node_size(sample)
+        self.faults = self.faulted_nodes = self.evictions = self.evicted_nodes = 0
+        self.fault_seconds = 0.0
+        self.started = time.monotonic()
+
+    # ---------- pages ----------
+    def _encode(self, root, out):
+        # preorder records, evicted pages inside copied whole; returns (nodes, nodes that were resident)
+        total = resident = 0
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if type(node) is SwappedNode:
+                _, swap, offset, length, count = node.__dict__["page"]
+                out += pread(swap.fileno(), length, offset)
+                if swap is self.swap:
+                    self.dead_bytes += length
+                total += count
+                continue
+            d = node.__dict__
+            left, right, codes = d["left"], d["right"], d["disease_codes"]
+            name = d["patient_name"].encode()
+            flags = (HAS_LEFT if left is not None else 0) | (HAS_RIGHT if right is not None else 0) \
+                | (CURED if d["is_cured"] else 0)
+            out += PAGE_NODE.pack(d["patient_id"], flags, d["height"], len(name), len(codes))
+            out += name
+            out += struct.pack(f"<{len(codes)}I", *codes)
+            total += 1
+            resident += 1
+            if right is not None:
+                stack.append(right)
+            if left is not None:
+                stack.append(left)
+        return total, resident
+
+    def _decode(self, buf):
+        pos, unpack, size, new = 0, PAGE_NODE.unpack_from, PAGE_NODE.size, object.__new__
+
+        def read():
+            nonlocal pos
+            pid, flags, height, n, k = unpack(buf, pos)
+            pos += size
+            name = str(buf[pos:pos + n], "utf-8")
+            codes = struct.unpack_from(f"<{k}I", buf, pos + n)
+            pos += n + 4 * k
+            mask = 0
+            for c in codes:
+                mask |= 1 << c
+            left = read() if flags & HAS_LEFT else None
+            right = read() if flags & HAS_RIGHT else None
+            node = new(AVLNode)
+            node.__dict__ = {"patient_id": pid, "patient_name": name, "is_cured": bool(flags & CURED),
+                             "disease_codes": codes, "disease_mask": mask, "left": left, "right": right,
+                             "height": height, "digest": None}
+            return node
+        return read()
+
+    def _evict(self, node):
+        # writes node's subtree out and turns node into its SwappedNode; returns the resident nodes freed
+        if self.hasher and node.digest is None:
+            self.hasher(node)
+        self.node_bytes = 0.9 * self.node_bytes + 0.1 * _node_size(node)
+        clean = node.__dict__.get("clean")
+        with self.lock:
+            if clean is not None and clean[1] is self.swap:
+                # unchanged since it was read: the bytes it came from are still right
+                location, resident = clean, clean[4]
+                self.dead_bytes -= clean[3]
+            else:
+                out = bytearray()
+                total, resident = self._encode(node, out)
+                pwrite(self.swap.fileno(), out, self.swap_end)
+                location = (self, self.swap, self.swap_end, len(out), total)
+                self.swap_end += len(out)
+            self.evictions += 1
+            self.evicted_nodes += resident
+        page = {"height": node.height, "digest": node.digest, "page": location}
+        node.__class__ = SwappedNode
+        node.__dict__ = page
+        return resident
+
+    def _fault(self, stub):
+        with self.lock:
+            if type(stub) is not SwappedNode:
+                return  # another thread got there first
+            t = time.perf_counter()
+            page = stub.__dict__
+            _, swap, offset, length, count = page["page"]
+            d = self._decode(pread(swap.fileno(), length, offset)).__dict__
+            # anything set on the stub since (a cleared digest, say) wins over the page
+            d.update((k, v) for k, v in page.items() if k != "page")
+            d["used"] = self.clock
+            d["clean"] = page["page"]
+            stub.__dict__ = d
+            stub.__class__ = AVLNode
+            if swap is self.swap:
+                self.dead_bytes += length
+            self.resident_nodes += count
+            self.faults += 1
+            self.faulted_nodes += count
+            self.fault_seconds += time.perf_counter() - t
+
+    # ---------- eviction ----------
+    def census(self, root=None):
+        # recounts the nodes in memory under root (counts drift when other trees share the swap)
+        root = self.root if root is None else root
+        n, stack = 0, [root] if root is not None else []
+        while stack:
+            node = stack.pop()
+            if type(node) is SwappedNode:
+                continue
+            n += 1
+            d = node.__dict__
+            if d["left"] is not None:
+                stack.append(d["left"])
+            if d["right"] is not None:
+                stack.append(d["right"])
+        self.resident_nodes = n
+        return n
+
+    def _pages(self, root):
+        # resident page roots: nodes at most page_height high whose parent is higher
+        h = self.page_height
+        pages, stack = [], [root] if root is not None and type(root) is not SwappedNode and root.height > h else []
+        while stack:
+            d = stack.pop().__dict__
+            for child in (d["left"], d["right"]):
+                if child is None or type(child) is SwappedNode:
+                    continue
+                if child.height > h:
+                    stack.append(child)
+                else:
+                    pages.append(child)
+        return pages
+
+    def maybe_evict(self, root=None):
+        """
+        Call between operations. Over budget, evicts least recently used pages
+        until 90% of the budget is left; returns how many pages went out.
+        """
+        root = self.root if root is None else root
+        self.clock += 1
+        if self.resident_nodes * self.node_bytes <= self.budget_bytes:
+            return 0
+        target = 0.9 * self.budget_bytes / self.node_bytes
+        evicted = 0
+        for node in sorted(self._pages(root), key=lambda node: node.__dict__.get("used", 0)):
+            if self.resident_nodes <= target:
+                break
+            self.resident_nodes -= self._evict(node)
+            evicted += 1
+        else:
+            # out of pages with the count still high: removed nodes and other
+            # versions' faults inflate it, so count again
+            self.census(root)
+        if self.dead_bytes > max(self.swap_end // 2, 16 << 20):
+            self.compact_swap(root)
+        return evicted
+
+    def compact_swap(self, root=None):
+        # copies the pages still referenced under root into a fresh swap file; stubs of
+        # other trees keep the old file open until they are gone
+        root = self.root if root is None else root
+        with self.lock:
+            swap, end = tempfile.TemporaryFile(prefix="swap-", dir=self.swap_dir), 0
+            stack = [root] if root is not None else []
+            while stack:
+                node = stack.pop()
+                d = node.__dict__
+                if type(node) is SwappedNode:
+                    _, old, offset, length, count = d["page"]
+                    pwrite(swap.fileno(), pread(old.fileno(), length, offset), end)
+                    d["page"] = (self, swap, end, length, count)
+                    end += length
+                    continue
+                stack.extend(child for child in (d["left"], d["right"]) if child is not None)
+            self.swap, self.swap_end, self.dead_bytes = swap, end, 0
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started
+        return {"budget_bytes": self.budget_bytes, "resident_nodes": self.resident_nodes,
+                "resident_bytes": int(self.resident_nodes * self.node_bytes),
+                "faults": self.faults, "faults_per_s": self.faults / elapsed if elapsed else 0.0,
+                "faulted_nodes": self.faulted_nodes, "fault_seconds": self.fault_seconds,
+                "evictions": self.evictions, "evicted_nodes": self.evicted_nodes,
+                "swap_bytes": self.swap_end, "swap_dead_bytes": self.dead_bytes}
+
+    # ---------- tree operations ----------
+    def _search(self, node, patient_id):
+        # iterative; marks the page the search goes into as just used
+        h, marked = self.page_height, False
+        while node is not None:
+            if not marked and node.height <= h:
+                node.used = self.clock
+                marked = True
+            pid = node.patient_id
+            if patient_id == pid:
+                return node
+            node = node.left if patient_id < pid else node.right
+        return None
+
+    def _balance(self, node):
+        # node is on a changed path; a rotation also moves its children and grandchildren
+        d = node.__dict__
+        d.pop("clean", None)
+        for child in (d["left"], d["right"]):
+            if child is not None:
+                c = child.__dict__
+                c.pop("clean", None)
+                for grandchild in (c.get("left"), c.get("right")):
+                    if grandchild is not None:
+                        grandchild.__dict__.pop("clean", None)
+        return super()._balance(node)
+
+    def _touch(self, node, patient_id):
+        # reads patient_id first so a swapped node is faulted in before it is marked changed
+        while node is not None:
+            pid = node.patient_id
+            d = node.__dict__
+            d.pop("clean", None)
+            d["digest"] = None
+            if patient_id == pid:
+                return node
+            node = d["left"] if patient_id < pid else d["right"]
+        return None
+
+    def _insert(self, node, patient_id, patient_name, is_cured, diseases):
+        if node is None:
+            self.resident_nodes += 1
+        return super()._insert(node, patient_id, patient_name, is_cured, diseases)
+
+    def insert(self, patient_id, patient_name, is_cured, diseases):
+        ok = super().insert(patient_id, patient_name, is_cured, diseases)
+        self.maybe_evict()
+        return ok
+
+    def remove(self, patient_id):
+        ok = super().remove(patient_id)
+        self.maybe_evict()
+        return ok
+
+    def update(self, patient_id, new_name=None, new_is_cured=None, new_diseases=None):
+        ok = super().update(patient_id, new_name, new_is_cured, new_diseases)
+        self.maybe_evict()
+        return ok
+
+    def search(self, patient_id):
+        node = super().search(patient_id)
+        self.maybe_evict()
+        return node
+
+    def range_query(self, lo, hi):
+        # a walk only reads, so pages it left behind can go out while it runs
+        for i, node in enumerate(super().range_query(lo, hi), 1):
+            yield node
+            if i % SCAN_TRIM == 0:
+                self.maybe_evict()
+        self.maybe_evict()
+
+    def preorder_depths(self, root):
+        for i, item in enumerate(super().preorder_depths(root), 1):
+            yield item
+            if i % SCAN_TRIM == 0:
+                self.maybe_evict(root)
+        self.maybe_evict(root)
+
+    def from_columns(self, present, ids, names, cured, diseases):
+        """
+        Snapshot columns built into a tree bottom-up in postorder, each subtree
+        evicted as soon as it is page_height high, so the nodes of a snapshot
+        bigger than the budget are never resident all at once. The decoded
+        columns themselves (ids, names, disease codes) and the slot ranks are
+        held for the whole load. The k-th present slot of the level-order mask
+        has its children at slots 2k+1 and 2k+2.
+        """
+        if not present or not present[0]:
+            return None
+        rank = array('q', accumulate(present))
+        n, h = len(present), self.page_height
+        done, stack = [], [(0, False)]
+        while stack:
+            slot, ready = stack.pop()
+            if not ready:
+                if slot >= n or not present[slot]:
+                    done.append(None)
+                    continue
+                k = rank[slot] - 1
+                stack += [(slot, True), (2 * k + 2, False), (2 * k + 1, False)]
+                continue
+            k = rank[slot] - 1
+            right, left = done.pop(), done.pop()
+            node = AVLNode(ids[k], names[k], cured[k] == 1, ())
+            node.set_disease_codes(diseases[k])
+            node.left, node.right = left, right
+            lh = left.height if left else 0
+            rh = right.height if right else 0
+            node.height = 1 + (lh if lh > rh else rh)
+            self.resident_nodes += 1
+            if node.height == h:
+                self.resident_nodes -= self._evict(node)
+            done.append(node)
+        return done.pop()
@@ -0,0 +1,302 @@
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+
+from .main import PatientRecord, UpdateDelta
+from .manifest import version_key
+
+# Read-only queries over a Unix socket, one JSON object per line each way.
+#   {"seq": 1, "op": "get", "ids": [3, 5, 8]}          rows (null when missing), in the order asked
+#   {"seq": 2, "op": "range", "lo": 100, "hi": 200}    rows in patient_id order
+#   {"seq": 3, "op": "cohort", "query": "flu AND NOT cured", "count_only": false}
+#   {"seq": 4, "op": "history", "patient_id": 42}      the logged changes of one patient, oldest first
+#   {"seq": 5, "op": "stats"}
+# A row is [patient_id, name, is_cured, diseases]. Replies echo "seq" and carry
+# "ok"; failed ones "error" instead of a result. range and cohort stop at "limit"
+# rows (MAX_ROWS by default) and say "more": true when they did.
+#
+# Clients may send any number of requests without waiting (pipelining). Replies
+# come back in request order; every complete line of one read is answered under
+# a single hold of the store lock and sent in a single write. Answering runs in
+# the event loop's thread pool, so a slow query or a wait for the store lock
+# holds up only its own connection, which is not read from meanwhile.
+
+MAX_ROWS = 10000
+MAX_LINE = 1 << 20
+
+
+def _row(node):
+    return [node.patient_id, node.patient_name, node.is_cured, list(node.diseases)]
+
+
+class QueryServer:
+    """
+    Serves reads of a PatientRecord on `socket_path`. Changes made through that
+    same object (under its lock) show up in the next request; the server never
+    changes the store.
+    """
+
+    def __init__(self, records, socket_path):
+        self.records = records
+        self.socket_path = socket_path
+        # patient_id -> names of the versions that changed it, filled up to
+        # `indexed`: (manifest position, name of the version just before it)
+        self.history_index = {}
+        self.indexed = (0, None)
+        self.requests = self.errors = self.connections = 0
+        self.largest_pipeline = 0
+        self.ops = {"get": self.get, "range": self.range, "cohort": self.cohort,
+                    "history": self.history, "stats": self.stats}
+        self._loop = None
+        self._stopped = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    # ---------- queries (called with records.lock held) ----------
+    def get(self, ids):
+        search = self.records.search
+        rows = []
+        for pid in ids:
+            node = search(int(pid))
+            rows.append(_row(node) if node else None)
+        return {"rows": rows}
+
+    def range(self, lo, hi, limit=MAX_ROWS):
+        tree = self.records.tree_obj
+        tree.root = self.records.root
+        rows = []
+        for node in tree.range_query(lo, hi):
+            if len(rows) == limit:
+                return {"rows": rows, "more": True}
+            rows.append(_row(node))
+        return {"rows": rows, "more": False}
+
+    def cohort(self, query, count_only=False, limit=MAX_ROWS):
+        from .cohort import CohortIndex
+        index = CohortIndex.for_records(self.records)
+        matches = index.bitmap(query)
+        out = {"count": len(matches)}
+        if not count_only:
+            rows = []
+            for ordinal in matches:
+                if len(rows) == limit:
+                    break
+                rows.append(_row(index.node(ordinal)))
+            out.update(rows=rows, more=len(matches) > len(rows))
+        return out
+
+    def _index_history(self):
+        # indexes the versions appended to the manifest since the last call. The store
+        # lock is taken only to find them and to record the result, so the files (all
+        # of them on the first call or after a manifest rebuild) are read without it
+        records, manifest = self.records, self.records.manifest
+        with records.lock:
+            start = pos, last = self.indexed
+            if pos and (pos > len(manifest) or manifest.name(pos - 1) != last):
+                # the manifest was rebuilt since (PatientRecord.sync_manifest): find our place again
+                pos = manifest.bisect_right(version_key(last))
+            end = len(manifest)
+            names = manifest.names(pos, end)
+        found = []
+        for name in names:
+            try:
+                raw = records.version_bytes(name)
+            except FileNotFoundError:
+                if not records.has_version(name):
+                    continue  # the version of a base snapshot, or compacted away
+                raw = records.version_bytes(name)  # sealed into a segment meanwhile
+            operation, old_data, new_data, _ = records.decode_version(raw)
+            found.append((records.patient_id_of(old_data, new_data), name))
+        with records.lock:
+            if self.indexed != start or end > len(manifest) or (names and manifest.name(end - 1) != names[-1]):
+                return  # indexed by another request meanwhile, or the manifest changed under us
+            for patient_id, name in found:
+                self.history_index.setdefault(patient_id, []).append(name)
+            if names:
+                self.indexed = (end, names[-1])
+
+    def history(self, patient_id):
+        # changes still in the log: those folded into a base snapshot by compaction are gone.
+        # answer() indexed before taking the lock; this picks up what was appended since
+        self._index_history()
+        records, changes = self.records, []
+        for name in self.history_index.get(int(patient_id), ()):
+            if not records.has_version(name):
+                continue  # compacted away since it was indexed
+            operation, old_data, new_data, _ = records.read_version_file(name)
+            change = {"version": name, "operation": operation, "undo": records.is_undo_record(name)}
+            if isinstance(new_data, UpdateDelta):
+                fields = {"name": new_data.new_name, "is_cured": new_data.new_is_cured,
+                          "removed_diseases": [d for _, d in new_data.removed] if new_data.removed is not None else None,
+                          "added_diseases": new_data.added}
+                change["fields"] = {k: v for k, v in fields.items() if v is not None}
+            else:
+                change["old"], change["new"] = old_data, new_data
+            changes.append(change)
+        return {"changes": changes}
+
+    def stats(self):
+        return {"version": self.records.last_version, "requests": self.requests, "errors": self.errors,
+                "connections": self.connections, "largest_pipeline": self.largest_pipeline}
+
+    # ---------- protocol ----------
+    def answer(self, lines):
+        # one reply line per request line, all under one hold of the store lock
+        out = []
+        if any(b'"history"' in line for line in lines):
+            self._index_history()
+        with self.records.lock:
+            for line in lines:
+                request = None
+                try:
+                    request = json.loads(line)
+                    args = {k: v for k, v in request.items() if k not in ("seq", "op")}
+                    reply = self.ops[request["op"]](**args)
+                    reply["ok"] = True
+                except Exception as e:  # bad request: say so and keep the connection
+                    self.errors += 1
+                    request = request if isinstance(request, dict) else {}
+                    reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                if "seq" in request:
+                    reply["seq"] = request["seq"]
+                out.append(json.dumps(reply))
+            # between requests, where the memory budget mode may swap pages out
+            self.records.trim(self.records.root)
+            self.requests += len(lines)
+            if len(lines) > self.largest_pipeline:
+                self.largest_pipeline = len(lines)
+        out.append("")
+        return "\n".join(out).encode()
+
+    # ---------- serving ----------
+    async def serve(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        server = await self._loop.create_unix_server(lambda: _Connection(self), self.socket_path)
+        self._ready.set()
+        async with server:
+            await self._stopped.wait()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def start(self):
+        # serves from a background thread until stop()
+        self._thread = threading.Thread(target=asyncio.run, args=(self.serve(),), name="query-server", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def stop(self):
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+        if self._thread:
+            self._thread.join()
+
+
+class _Connection(asyncio.Protocol):
+    def __init__(self, server):
+        self.server = server
+        self.buffer = bytearray()
+        self.transport = None
+        self.busy = False  # a batch is being answered in the thread pool
+        self.writing_paused = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.server.connections += 1
+
+    def data_received(self, data):
+        self.buffer += data
+        if not self.busy:
+            self._next_batch()
+
+    def _next_batch(self):
+        end = self.buffer.rfind(b"\n")
+        if end < 0:
+            if len(self.buffer) > MAX_LINE:
+                self.transport.close()
+            return
+        lines = [line for line in bytes(self.buffer[:end]).split(b"\n") if line.strip()]
+        del self.buffer[:end + 1]
+        if lines:
+            # one batch at a time keeps the replies in request order
+            self.busy = True
+            self.transport.pause_reading()
+            asyncio.get_running_loop().create_task(self._answer(lines))
+
+    async def _answer(self, lines):
+        reply = await asyncio.get_running_loop().run_in_executor(None, self.server.answer, lines)
+        self.busy = False
+        if self.transport.is_closing():
+            return
+        self.transport.write(reply)
+        if not self.writing_paused:
+            self.transport.resume_reading()
+        self._next_batch()
+
+    # a client that stops reading its replies stops being read from
+    def pause_writing(self):
+        self.writing_paused = True
+        self.transport.pause_reading()
+
+    def resume_writing(self):
+        self.writing_paused = False
+        if not self.busy:
+            self.transport.resume_reading()
+
+
+class QueryClient:
+    """
+    Blocking client. call() sends one request and waits; pipeline() sends a
+    list of requests in one write and returns their replies in order.
+    """
+
+    def __init__(self, socket_path):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(socket_path)
+        self.file = self.sock.makefile("rb")
+        self.seq = 0
+
+    def pipeline(self, requests):
+        out = []
+        for request in requests:
+            self.seq += 1
+            out.append(json.dumps(dict(request, seq=self.seq)))
+        self.sock.sendall(("\n".join(out) + "\n").encode())
+        return [json.loads(self.file.readline()) for _ in requests]
+
+    def call(self, op, **args):
+        reply = self.pipeline([dict(args, op=op)])[0]
+        if not reply["ok"]:
+            raise ValueError(reply["error"])
+        return reply
+
+    def get(self, *ids):
+        return self.call("get", ids=list(ids))["rows"]
+
+    def range(self, lo, hi, limit=MAX_ROWS):
+        return self.call("range", lo=lo, hi=hi, limit=limit)["rows"]
+
+    def cohort(self, query, count_only=False, limit=MAX_ROWS):
+        return self.call("cohort", query=query, count_only=count_only, limit=limit)
+
+    def history(self, patient_id):
+        return self.call("history", patient_id=patient_id)["changes"]
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+
+if __name__ == "__main__":
+    # python -m patient_records.query_server <socket> [storage dir]   (default ../storage)
+    server = QueryServer(PatientRecord(sys.argv[2] if len(sys.argv) > 2 else None), sys.argv[1])
+    print(f"Serving queries on {sys.argv[1]}, Ctrl+C to stop", flush=True)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,386 @@
+import base64
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+from .main import PatientRecord
+from .manifest import version_key
+from .version_diff import PathCopyTree
+
+# Wire format: one JSON object per line.
+#   follower -> primary  {"since": <last applied version or null>}
+#   primary  -> follower {"type": "snapshot", "version", "data"}   (catch-up from a checkpoint or base snapshot)
+#                        {"type": "record", "name", "body"}         (one version file, base64)
+#                        {"type": "heartbeat"}
+# Every primary frame also carries "head" (newest version) and "sent_at" for lag metrics.
+
+
+class ReplicationPrimary:
+    def __init__(self, records, socket_path, poll_interval=0.05, heartbeat_interval=1.0):
+        self.records = records
+        self.socket_path = socket_path
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self._stop = threading.Event()
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.socket_path)
+        self._server.listen()
+        self._server.settimeout(0.2)
+        self._thread = threading.Thread(target=self._accept_loop, name="replication-primary", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if self._server:
+            self._server.close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def _accept_loop(self):
+        while not self._stop.is_set():
+            try:
+                conn, _ = self._server.accept()
+            except socket.timeout:
+                continue
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _send(self, f, frame, head):
+        frame["head"] = head
+        frame["sent_at"] = time.time()
+        f.write(json.dumps(frame) + "\n")
+        f.flush()
+
+    def _serve(self, conn):
+        try:
+            with conn, conn.makefile("rw") as f:
+                self._ship(f)
+        except (OSError, ValueError):
+            # follower went away or sent garbage
+            pass
+
+    def _newest_base(self):
+        # (version, file name) of the newest full tree, the checkpoint or a base snapshot
+        records = self.records
+        best = None, None
+        with records.lock:
+            for name in ["current_tree"] + records.snapshot_files()[-1:]:
+                if not os.path.exists(os.path.join(records.storage_dir, name)):
+                    continue
+                version, _ = records.read_snapshot_trailer(name)
+                if version and (best[0] is None or records.version_time(version) > records.version_time(best[0])):
+                    best = version, name
+        return best
+
+    def _send_base(self, f, head, after=None):
+        # ships the newest full tree and returns its version. A stream that would skip
+        # versions (no tree as new as `after`, the first one gone) is refused instead
+        records = self.records
+        with records.lock:
+            version, name = self._newest_base()
+            if version is None or (after and records.version_time(version) < records.version_time(after)):
+                raise ValueError(f"version '{after}' is gone and no snapshot covers it")
+            # opened under the store lock, so compaction cannot delete it first
+            cf = open(os.path.join(records.storage_dir, name), "rb")
+        with cf:
+            data = cf.read()
+        self._send(f, {"type": "snapshot", "version": version, "data": base64.b64encode(data).decode()}, head)
+        return version
+
+    def _missing_after(self, since):
+        # first version after `since` whose file is gone (folded into a base snapshot), or None
+        records, manifest = self.records, self.records.manifest
+        for name in manifest.names(manifest.bisect_right(version_key(since)), len(manifest)):
+            if not records.has_version(name):
+                return name
+        return None
+
+    def _ship(self, f):
+        # new versions are found by position in the store's manifest, so a poll reads
+        # only the keys appended since the last one
+        records = self.records
+        manifest = records.manifest
+        since = json.loads(f.readline()).get("since")
+        head = records.last_version
+
+        # catch up from the newest checkpoint or base snapshot when the follower has
+        # nothing, is behind it, or some version after its own has been compacted away
+        base, _ = self._newest_base()
+        missing = self._missing_after(since) if since else None
+        if missing or (base and (since is None or records.version_time(since) < records.version_time(base))):
+            since = self._send_base(f, head, after=missing)
+
+        shipped = manifest.bisect_right(version_key(since)) if since else 0
+        last_beat = time.monotonic()
+        while not self._stop.is_set():
+            end = len(manifest)
+            sent = False
+            for name in manifest.names(shipped, end):
+                try:
+                    body = records.version_bytes(name)
+                except FileNotFoundError:
+                    if records.has_version(name):
+                        body = records.version_bytes(name)  # sealed into a segment meanwhile
+                    else:
+                        # compacted away while shipping: go on from the snapshot it went into
+                        shipped = manifest.bisect_right(version_key(self._send_base(f, head, after=name)))
+                        sent = True
+                        break
+                self._send(f, {"type": "record", "name": name, "body": base64.b64encode(body).decode()}, head)
+                shipped += 1
+                sent = True
+            if sent or time.monotonic() - last_beat >= self.heartbeat_interval:
+                if not sent:
+                    self._send(f, {"type": "heartbeat"}, head)
+                last_beat = time.monotonic()
+            time.sleep(self.poll_interval)
+            head = records.last_version or head
+
+
+class ReplicationFollower:
+    """
+    Hot standby: tails the primary's version log over a Unix socket, applies
+    each version to a path-copied tree and checks its saved hash; only then is
+    the version written to its own storage_dir and the new tree served. Serves
+    reads only, and none once it has stopped on a version that did not match.
+    """
+
+    def __init__(self, socket_path, storage_dir):
+        self.socket_path = socket_path
+        self.records = PatientRecord(storage_dir)
+        self.lock = threading.Lock()
+        self.applied = 0
+        self.head = None
+        self.transport_delay = 0.0
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._sock = None
+
+    # ---------- read-only queries ----------
+    def _readable(self):
+        if self.error:
+            raise RuntimeError(f"replica stopped following the primary: {self.error}")
+
+    def search(self, patient_id):
+        self._readable()
+        with self.lock:
+            n = self.records.search(patient_id)
+            return [n.patient_id, n.patient_name, n.is_cured, list(n.diseases)] if n else None
+
+    def range(self, lo, hi):
+        self._readable()
+        with self.lock:
+            return [[n.patient_id, n.patient_name, n.is_cured, list(n.diseases)]
+                    for n in self.records.tree_obj.range_query(lo, hi)]
+
+    def root_hash(self):
+        self._readable()
+        with self.lock:
+            return self.records.hash_function(self.records.root)
+
+    # ---------- lag ----------
+    def lag(self):
+        applied, head = self.records.last_version, self.head
+        seconds = 0.0
+        if head and applied and head != applied:
+            seconds = (self.records.version_time(head) - self.records.version_time(applied)).total_seconds()
+        elif head and not applied:
+            seconds = float("inf")
+        return {
+            "applied_version": applied,
+            "primary_head": head,
+            "lag_seconds": max(seconds, 0.0),
+            "caught_up": head is None or head == applied,
+            "transport_delay_seconds": self.transport_delay,
+            "records_applied": self.applied,
+            "error": self.error,
+        }
+
+    # ---------- apply ----------
+    def _apply_snapshot(self, frame):
+        path = os.path.join(self.records.storage_dir, "current_tree")
+        with open(path + ".tmp", "wb") as f:
+            f.write(base64.b64decode(frame["data"]))
+            f.flush()
+            self.records.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        with self.lock:
+            self.records.recover()
+            self.records.root = self.records.tree_obj.root
+
+    def _apply_record(self, frame):
+        records = self.records
+        name = frame["name"]
+        if records.last_version and records.version_time(name) <= records.version_time(records.last_version):
+            return
+        body = base64.b64decode(frame["body"])
+        op, old_data, new_data, saved_hash = records.decode_version(body)
+        # the served tree is left as it is until the version checks out
+        root, ok = PathCopyTree().apply(records.root, op, old_data, new_data)
+        if not ok or not records.hash_matches(root, saved_hash):
+            raise ValueError(f"version '{name}' does not match its hash")
+        records.write_version_file(name, body)
+        records.manifest.append(name)
+        with self.lock:
+            records.root = records.tree_obj.root = root
+            records.reindex_name(records.patient_id_of(old_data, new_data))
+            records.last_version = name
+            records.ops_since_checkpoint += 1
+            records.maybe_checkpoint(saved_hash)
+        self.applied += 1
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                    s.connect(self.socket_path)
+                    self._sock = s
+                    with s.makefile("rw") as f:
+                        f.write(json.dumps({"since": self.records.last_version}) + "\n")
+                        f.flush()
+                        while not self._stop.is_set():
+                            line = f.readline()
+                            if not line:
+                                break
+                            frame = json.loads(line)
+                            self.head = frame.get("head")
+                            self.transport_delay = time.time() - frame.get("sent_at", time.time())
+                            if frame["type"] == "snapshot":
+                                self._apply_snapshot(frame)
+                            elif frame["type"] == "record":
+                                self._apply_record(frame)
+            except OSError:
+                # primary not up yet, restarted, or we are stopping
+                pass
+            except ValueError as e:
+                # diverged from the primary: stop applying rather than serve bad data
+                self.error = str(e)
+                return
+            self._stop.wait(0.2)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="replication-follower", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._sock:
+            # unblocks the reader thread
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self._thread:
+            self._thread.join()
+        with self.lock:
+            self.records.checkpoint()
+
+
+def check(ops=300):
+    """
+    Two processes over a real Unix socket: this one is the primary, the follower
+    runs as `python -m patient_records.replication follower`. The follower is
+    stopped, the primary writes on and compacts everything the follower had,
+    and a new follower process on the same replica has to reach the same root hash.
+    """
+    import contextlib
+    import shutil
+    import signal
+    import subprocess
+    import tempfile
+    from .compaction import LogCompactor
+
+    workdir = tempfile.mkdtemp(prefix="replication-")
+    sock, replica = os.path.join(workdir, "primary.sock"), os.path.join(workdir, "replica")
+    devnull = open(os.devnull, "w")
+    with contextlib.redirect_stdout(devnull):
+        # no checkpoints on the primary: only the compaction snapshot covers the folded versions
+        records = PatientRecord(os.path.join(workdir, "primary"), checkpoint_every_ops=10 ** 9,
+                                checkpoint_every_bytes=1 << 40)
+    primary = ReplicationPrimary(records, sock)
+    primary.start()
+
+    def follow():
+        # one follower process, stopped (and checkpointed) once it has applied the primary's head
+        proc = subprocess.Popen([sys.executable, "-m", "patient_records.replication", "follower", sock, replica],
+                                stdout=subprocess.PIPE, text=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        try:
+            for _, line in zip(range(60), proc.stdout):
+                if not line.startswith("{"):
+                    continue
+                lag = json.loads(line)
+                if lag["error"]:
+                    raise AssertionError(f"follower stopped: {lag['error']}")
+                if lag["applied_version"] == records.last_version:
+                    return
+            raise AssertionError("follower did not catch up")
+        finally:
+            proc.send_signal(signal.SIGINT)
+            proc.wait(timeout=30)
+
+    def write(lo, hi):
+        with contextlib.redirect_stdout(devnull):
+            for pid in range(lo, hi):
+                records.add(pid, f"Patient{pid}", False, ["flu"])
+                if pid % 3 == 0:
+                    records.set_cured(pid, True)
+            records.remove(lo)
+
+    try:
+        write(0, ops)
+        follow()
+        write(ops, 2 * ops)
+        with contextlib.redirect_stdout(devnull):
+            folded = LogCompactor(records, retention_seconds=0).run_once()["folded"]
+        write(2 * ops, 3 * ops)
+        follow()
+        with contextlib.redirect_stdout(devnull):
+            copy = PatientRecord(replica)
+        got, expected = copy.hash_function(copy.root), records.hash_function(records.root)
+        if got != expected:
+            raise AssertionError(f"replica root hash {got} != primary {expected}")
+        print(f"✓ follower process caught up across {folded} compacted versions, root hash ...{expected[-12:]}")
+    finally:
+        primary.stop()
+        devnull.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    # python -m patient_records.replication primary <socket>            (serves ../storage)
+    # python -m patient_records.replication follower <socket> <replica dir>
+    # python -m patient_records.replication check                       (two-process catch-up check)
+    role = sys.argv[1]
+    if role == "check":
+        check()
+    elif role == "primary":
+        sock = sys.argv[2]
+        primary = ReplicationPrimary(PatientRecord(), sock)
+        primary.start()
+        print(f"Shipping log on {sock}, Ctrl+C to stop")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            primary.stop()
+    else:
+        follower = ReplicationFollower(sys.argv[2], sys.argv[3])
+        follower.start()
+        try:
+            while True:
+                time.sleep(1)
+                print(json.dumps(follower.lag()), flush=True)
+        except KeyboardInterrupt:
+            follower.stop()
@@ -0,0 +1,171 @@
+import marshal
+import os
+import struct
+import zlib
+from array import array
+from collections import Counter
+
+# ---------------- CODECS ----------------
+# "zdict" is zlib with a preset dictionary (see train_dictionary), which is what
+# makes small blocks of short records compress. lzma is imported on first use:
+# some Python builds ship without it.
+
+CODECS = ("none", "zlib", "lzma", "zdict")
+
+
+def _lzma():
+    import lzma
+    return lzma
+
+
+def compress(data, codec, zdict=None, level=6):
+    if codec == "none":
+        return bytes(data)
+    if codec == "zlib":
+        return zlib.compress(data, level)
+    if codec == "zdict":
+        c = zlib.compressobj(level, zdict=zdict)
+        return c.compress(data) + c.flush()
+    if codec == "lzma":
+        return _lzma().compress(data)
+    raise ValueError(f"unknown codec '{codec}'")
+
+
+def decompress(data, codec, zdict=None):
+    if codec == "none":
+        return bytes(data)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "zdict":
+        d = zlib.decompressobj(zdict=zdict)
+        return d.decompress(data) + d.flush()
+    if codec == "lzma":
+        return _lzma().decompress(data)
+    raise ValueError(f"unknown codec '{codec}'")
+
+
+def train_dictionary(samples, vocabulary=(), size=16384):
+    """
+    Preset zlib dictionary for records like `samples`: every vocabulary name the
+    way records spell it (length-prefixed in binary records, comma-separated in
+    text ones), then the samples' most common 8-byte substrings. zlib reaches the
+    end of the dictionary most cheaply, so the most common strings go last.
+    """
+    common = Counter()
+    for data in samples:
+        for i in range(0, max(len(data) - 7, 0), 4):
+            common[bytes(data[i:i + 8])] += 1
+    names = Counter()
+    for data in samples:
+        for name in vocabulary:
+            if name.encode() in data:
+                names[name] += 1
+    parts = []
+    for gram, count in common.most_common():
+        if count < 2 or sum(map(len, parts)) >= size // 2:
+            break
+        parts.append(gram)
+    for name, _ in names.most_common():
+        raw = name.encode()
+        parts.append(struct.pack("<H", len(raw)) + raw + b"," + raw)
+    return b"".join(reversed(parts))[-size:]
+
+
+# ---------------- SEGMENT FILES ----------------
+# SEGMENT_MAGIC, u32 header length, marshal (codec, zdict), compressed blocks,
+# index, footer. The index is zlib-compressed marshal of columns: block file
+# offsets and stored lengths, then per version (oldest first) its name (names
+# joined by newlines), block, offset in the block and length. Each block is
+# compressed on its own, so reading one version decompresses one block.
+
+SEGMENT_MAGIC = b"PSG1\n"
+SEGMENT_FOOTER = struct.Struct("<QQ")  # index offset, index length
+
+
+def write_segment(path, items, codec="zlib", block_size=1 << 14, zdict=None, fsync=os.fsync):
+    # items: (version name, record bytes) oldest first; written to a temp file, synced, renamed
+    if codec not in CODECS:
+        raise ValueError(f"unknown codec '{codec}'")
+    header = marshal.dumps((codec, zdict or b""))
+    out = bytearray(SEGMENT_MAGIC + struct.pack("<I", len(header)) + header)
+    offsets, lengths = array('Q'), array('I')
+    names, entry_blocks, entry_offsets, entry_lengths = [], array('I'), array('I'), array('I')
+    block = bytearray()
+
+    def flush():
+        stored = compress(block, codec, zdict)
+        offsets.append(len(out))
+        lengths.append(len(stored))
+        out.extend(stored)
+        block.clear()
+
+    for name, data in items:
+        if block and len(block) + len(data) > block_size:
+            flush()
+        names.append(name)
+        entry_blocks.append(len(offsets))
+        entry_offsets.append(len(block))
+        entry_lengths.append(len(data))
+        block.extend(data)
+    if block:
+        flush()
+    index = zlib.compress(marshal.dumps((offsets.tobytes(), lengths.tobytes(), "\n".join(names),
+                                         entry_blocks.tobytes(), entry_offsets.tobytes(),
+                                         entry_lengths.tobytes())))
+    out += index + SEGMENT_FOOTER.pack(len(out), len(index))
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(out)
+        f.flush()
+        fsync(f.fileno())
+    os.replace(tmp, path)
+    return path
+
+
+class SegmentReader:
+    """
+    Random access to the versions of one segment file: the block index is read
+    once, a version costs one block read and decompression (the last block is
+    kept, so reading in order decompresses every block once).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(SEGMENT_MAGIC)) != SEGMENT_MAGIC:
+                raise ValueError(f"'{path}' is not a segment file")
+            n, = struct.unpack("<I", f.read(4))
+            self.codec, self.zdict = marshal.loads(f.read(n))
+            f.seek(-SEGMENT_FOOTER.size, os.SEEK_END)
+            offset, length = SEGMENT_FOOTER.unpack(f.read(SEGMENT_FOOTER.size))
+            f.seek(offset)
+            columns = marshal.loads(zlib.decompress(f.read(length)))
+        offsets, lengths, blocks, starts, sizes = array('Q'), array('I'), array('I'), array('I'), array('I')
+        for col, raw in zip((offsets, lengths, blocks, starts, sizes), columns[:2] + columns[3:]):
+            col.frombytes(raw)
+        self.blocks = list(zip(offsets, lengths))
+        self.names = columns[2].split("\n") if columns[2] else []
+        self.entries = dict(zip(self.names, zip(blocks, starts, sizes)))
+        self._block = (None, b"")
+        self.blocks_read = 0
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def _load(self, b):
+        # one read of self._block: readers share this object across threads (compactor,
+        # replication), and another thread may swap the cached block in between
+        block = self._block
+        if block[0] != b:
+            offset, length = self.blocks[b]
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                stored = f.read(length)
+            block = (b, decompress(stored, self.codec, self.zdict or None))
+            self._block = block
+            self.blocks_read += 1
+        return block[1]
+
+    def read(self, name):
+        b, off, n = self.entries[name]
+        return self._load(b)[off:off + n]
@@ -0,0 +1,239 @@
+import hashlib
+import heapq
+import json
+import multiprocessing
+import os
+from bisect import bisect_right
+
+from .main import PatientRecord
+
+
+def _row(node):
+    return [node.patient_id, node.patient_name, node.is_cured, list(node.diseases)] if node else None
+
+
+# ---------------- SHARD PROCESS ----------------
+
+def shard_main(storage_dir, conn):
+    # One shard = one process with its own PatientRecord, version log and hash chain
+    records = PatientRecord(storage_dir)
+    while True:
+        method, args = conn.recv()
+        try:
+            if method == "add":
+                result = records.add(*args)
+            elif method == "update":
+                result = records.update(*args)
+            elif method in ("set_cured", "rename", "add_disease", "remove_disease"):
+                result = getattr(records, method)(*args)
+            elif method == "remove":
+                result = records.remove(*args)
+            elif method == "search":
+                result = _row(records.search(*args))
+            elif method == "range":
+                result = [_row(n) for n in records.tree_obj.range_query(*args)]
+            elif method == "disease":
+                result = [_row(n) for n in records.tree_obj.nodes_with_diseases([args[0]])]
+            elif method == "root_hash":
+                result = records.hash_function(records.root)
+            elif method == "count":
+                result = sum(1 for _ in records.tree_obj.inorder_nodes())
+            elif method == "stop":
+                records.checkpoint()
+                conn.send((True, None))
+                break
+            else:
+                raise ValueError(f"unknown shard method '{method}'")
+            conn.send((True, result))
+        except Exception as e:
+            conn.send((False, repr(e)))
+    conn.close()
+
+
+class ShardHandle:
+    def __init__(self, storage_dir):
+        self.storage_dir = storage_dir
+        self.conn, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=shard_main, args=(storage_dir, child), daemon=True)
+        self.process.start()
+        child.close()
+
+    def send(self, method, *args):
+        self.conn.send((method, args))
+
+    def recv(self):
+        ok, result = self.conn.recv()
+        if not ok:
+            raise RuntimeError(f"shard {self.storage_dir}: {result}")
+        return result
+
+    def call(self, method, *args):
+        self.send(method, *args)
+        return self.recv()
+
+    def stop(self):
+        try:
+            self.call("stop")
+        finally:
+            self.process.join()
+
+
+# ---------------- ROUTER ----------------
+
+class ShardedPatientStore:
+    """
+    Routes patients to N shard processes by patient_id range (mode="range",
+    shard i holds boundaries[i-1] <= id < boundaries[i]) or by id hash
+    (mode="hash"). The layout is kept in <base_dir>/shards.json, along with a
+    split still in progress, which opening the store finishes.
+    """
+
+    def __init__(self, base_dir, shards=4, mode="range", boundaries=None):
+        self.base_dir = base_dir
+        os.makedirs(base_dir, exist_ok=True)
+        self.layout_path = os.path.join(base_dir, "shards.json")
+        if os.path.exists(self.layout_path):
+            with open(self.layout_path) as f:
+                layout = json.load(f)
+        else:
+            if mode == "range" and boundaries is None:
+                # even split of the positive 32-bit id space
+                boundaries = [(2 ** 31) * (i + 1) // shards for i in range(shards - 1)]
+            layout = {"mode": mode, "boundaries": boundaries or [],
+                      "dirs": [f"shard-{i}" for i in range(shards)]}
+        self.mode = layout["mode"]
+        self.boundaries = layout["boundaries"]
+        self.dirs = layout["dirs"]
+        self.pending_split = layout.get("split")
+        self.shards = [ShardHandle(os.path.join(base_dir, d)) for d in self.dirs]
+        self._save_layout()
+        if self.pending_split:
+            self._finish_split()
+
+    def _save_layout(self):
+        tmp = self.layout_path + ".tmp"
+        layout = {"mode": self.mode, "boundaries": self.boundaries, "dirs": self.dirs}
+        if self.pending_split:
+            layout["split"] = self.pending_split
+        with open(tmp, "w") as f:
+            json.dump(layout, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.layout_path)
+
+    def shard_index(self, patient_id):
+        if self.mode == "hash":
+            digest = hashlib.sha256(str(patient_id).encode()).digest()
+            return int.from_bytes(digest[:8], "big") % len(self.shards)
+        return bisect_right(self.boundaries, patient_id)
+
+    # ---------- single-patient API ----------
+    def add(self, patient_id, patient_name, is_cured, diseases):
+        return self.shards[self.shard_index(patient_id)].call("add", patient_id, patient_name, is_cured, diseases)
+
+    def update(self, patient_id, new_name=None, new_is_cured=None, new_diseases=None):
+        return self.shards[self.shard_index(patient_id)].call("update", patient_id, new_name, new_is_cured, new_diseases)
+
+    def set_cured(self, patient_id, is_cured=True):
+        return self.shards[self.shard_index(patient_id)].call("set_cured", patient_id, is_cured)
+
+    def rename(self, patient_id, new_name):
+        return self.shards[self.shard_index(patient_id)].call("rename", patient_id, new_name)
+
+    def add_disease(self, patient_id, disease):
+        return self.shards[self.shard_index(patient_id)].call("add_disease", patient_id, disease)
+
+    def remove_disease(self, patient_id, disease):
+        return self.shards[self.shard_index(patient_id)].call("remove_disease", patient_id, disease)
+
+    def remove(self, patient_id):
+        return self.shards[self.shard_index(patient_id)].call("remove", patient_id)
+
+    def search(self, patient_id):
+        return self.shards[self.shard_index(patient_id)].call("search", patient_id)
+
+    # ---------- scatter-gather ----------
+    def _scatter(self, shards, method, *args):
+        # send to every shard first so they work in parallel, then gather
+        for s in shards:
+            s.send(method, *args)
+        return [s.recv() for s in shards]
+
+    def range(self, lo, hi):
+        if self.mode == "range":
+            first, last = self.shard_index(lo), self.shard_index(hi)
+            parts = self._scatter(self.shards[first:last + 1], "range", lo, hi)
+            return [row for part in parts for row in part]
+        parts = self._scatter(self.shards, "range", lo, hi)
+        return list(heapq.merge(*parts, key=lambda row: row[0]))
+
+    def with_disease(self, disease):
+        parts = self._scatter(self.shards, "disease", disease)
+        return list(heapq.merge(*parts, key=lambda row: row[0]))
+
+    def count(self):
+        return sum(self._scatter(self.shards, "count"))
+
+    def root_hash(self):
+        # combined root hash over the shard root hashes, in shard order
+        return hashlib.sha256(",".join(self._scatter(self.shards, "root_hash")).encode()).hexdigest()
+
+    # ---------- splits ----------
+    def split(self, index, at):
+        """
+        Range mode only: moves ids >= at out of shard `index` into a new shard
+        placed right after it. Both shards log the move in their own chains.
+        Returns the number of patients moved.
+        """
+        if self.mode != "range":
+            raise ValueError("only range-partitioned stores can be split")
+        lo = self.boundaries[index - 1] if index > 0 else float("-inf")
+        hi = self.boundaries[index] if index < len(self.boundaries) else float("inf")
+        if not lo < at < hi:
+            raise ValueError(f"split point {at} is outside shard {index}")
+        name = f"shard-{max(int(d.split('-')[1]) for d in self.dirs) + 1}"
+        # recorded before anything moves, so a crash part way through is finished on the next open
+        self.pending_split = {"index": index, "at": at, "dir": name}
+        self._save_layout()
+        return self._finish_split()
+
+    def _finish_split(self):
+        # every step can be repeated: copy the rows the new shard is missing, publish the
+        # layout (the split still recorded), remove the moved rows from the old shard, done
+        index, at, name = self.pending_split["index"], self.pending_split["at"], self.pending_split["dir"]
+        source = self.shards[index]
+        if name not in self.dirs:
+            hi = self.boundaries[index] if index < len(self.boundaries) else float("inf")
+            target = ShardHandle(os.path.join(self.base_dir, name))
+            copied = {row[0] for row in target.call("range", at, hi)}
+            for row in source.call("range", at, hi):
+                if row[0] not in copied:
+                    target.call("add", *row)
+            self.shards.insert(index + 1, target)
+            self.dirs.insert(index + 1, name)
+            self.boundaries.insert(index, at)
+            self._save_layout()
+        hi = self.boundaries[index + 1] if index + 1 < len(self.boundaries) else float("inf")
+        moved = source.call("range", at, hi)
+        for row in moved:
+            source.call("remove", row[0])
+        self.pending_split = None
+        self._save_layout()
+        return len(moved)
+
+    def close(self):
+        for s in self.shards:
+            s.stop()
+
+
+if __name__ == "__main__":
+    import sys
+    import tempfile
+    base = sys.argv[1] if len(sys.argv) > 1 else tempfile.mkdtemp()
+    store = ShardedPatientStore(base, shards=4, boundaries=[250, 500, 750])
+    for pid in range(0, 1000, 7):
+        store.add(pid, f"P{pid}", pid % 2 == 0, ["flu"] if pid % 3 else ["covid"])
+    print("patients:", store.count(), "root hash:", store.root_hash())
+    print("range 240-260:", [r[0] for r in store.range(240, 260)])
+    print("moved on split:", store.split(0, 125), "layout:", store.boundaries)
+    store.close()
@@ -0,0 +1,218 @@
+import json
+import sys
+
+from .main import AVLNode, AVLPatientTree, LogReader, PatientRecord, UpdateDelta
+
+# Diff of two versions of the store. The older one is replayed once from the base
+# snapshot; the newer one is replayed on top of it by path copying, so every patient
+# the versions in between did not touch stays in subtrees both trees share. The
+# diff walk skips those by identity and only looks at the copied paths.
+
+
+class PathCopyTree(AVLPatientTree):
+    """
+    AVL tree whose operations copy a node before changing it, leaving the tree
+    they started from intact. Copies made by this tree are changed in place.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.owned = {}  # id -> node made by this tree (kept alive so ids stay unique)
+
+    def _own(self, node):
+        if node is None or id(node) in self.owned:
+            return node
+        node.patient_id  # faults in a node swapped out by the memory budget mode before its dict is copied
+        clone = object.__new__(AVLNode)
+        clone.__dict__.update(node.__dict__)
+        clone.digest = None
+        self.owned[id(clone)] = clone
+        return clone
+
+    def _insert(self, node, patient_id, patient_name, is_cured, diseases):
+        if not node:
+            node = AVLNode(patient_id, patient_name, is_cured, diseases)
+            self.owned[id(node)] = node
+            return node
+        return super()._insert(self._own(node), patient_id, patient_name, is_cured, diseases)
+
+    def _remove(self, node, patient_id):
+        return super()._remove(self._own(node), patient_id)
+
+    def _balance(self, node):
+        # a rotation also rewires the heavy child (and its inner child for a double rotation)
+        bal = self.get_balance(node)
+        if bal > 1:
+            node.left = self._own(node.left)
+            if self.get_balance(node.left) < 0:
+                node.left.right = self._own(node.left.right)
+        elif bal < -1:
+            node.right = self._own(node.right)
+            if self.get_balance(node.right) > 0:
+                node.right.left = self._own(node.right.left)
+        return super()._balance(node)
+
+    def copy_path(self, root, patient_id):
+        # (new root, own copy of the patient's node or None)
+        root = node = self._own(root)
+        while node:
+            if patient_id == node.patient_id:
+                return root, node
+            if patient_id < node.patient_id:
+                node.left = node = self._own(node.left)
+            else:
+                node.right = node = self._own(node.right)
+        return root, None
+
+    def apply(self, root, operation, old_data, new_data):
+        # PatientRecord.apply_operation without touching root's tree, returns (root, ok)
+        data = new_data if new_data is not None else old_data
+        if data is None:
+            return root, False
+        if operation == "add":
+            return self._insert(root, *data), True
+        if operation == "remove":
+            return self._remove(root, data[0]), True
+        if operation != "update":
+            return root, False
+        root, node = self.copy_path(root, data.patient_id if isinstance(data, UpdateDelta) else data[0])
+        if not node:
+            return root, False
+        if isinstance(data, UpdateDelta):
+            data.apply(node)
+        else:
+            node.patient_name, node.is_cured, node.diseases = data[1], data[2], data[3]
+        return root, True
+
+
+def version_trees(records, version_a, version_b):
+    """
+    Roots of the store at two versions (None = the base snapshot), version_a not
+    newer than version_b. Versions folded into the base snapshot are gone.
+    """
+    root, base_version = records.load_base_snapshot()
+    files = records.versions_after(base_version)
+    for version in (version_a, version_b):
+        if version is not None and version != base_version and version not in files:
+            raise ValueError(f"version '{version}' is not in the log after the base snapshot")
+    a = files.index(version_a) + 1 if version_a in files else 0
+    b = files.index(version_b) + 1 if version_b in files else 0
+    if a > b:
+        raise ValueError("version_a is newer than version_b")
+    reader = LogReader(records)
+    for name in files[:a]:
+        root, ok, _ = reader.apply(root, name)
+        if not ok:
+            raise ValueError(f"version '{name}' could not be applied")
+    tree, root_b = PathCopyTree(), root
+    for name in files[a:b]:
+        root_b, ok = tree.apply(root_b, *records.read_version_file(name)[:3])
+        if not ok:
+            raise ValueError(f"version '{name}' could not be applied")
+    return root, root_b
+
+
+def _row(node):
+    return [node.patient_id, node.patient_name, node.is_cured, node.diseases]
+
+
+def _changed_fields(a, b):
+    fields = []
+    if a.patient_name != b.patient_name:
+        fields.append("patient_name")
+    if a.is_cured != b.is_cured:
+        fields.append("is_cured")
+    if a.disease_codes != b.disease_codes:
+        fields.append("diseases")
+    return fields
+
+
+def diff_trees(root_a, root_b):
+    """
+    Changes from tree a to tree b in patient_id order, as dicts with patient_id,
+    change ("added", "removed" or "changed"), before/after rows and, for changed
+    patients, the fields that differ. Both trees are walked in order together
+    as stacks of pending subtrees and nodes; when both walks are at the same
+    subtree object it is skipped whole, otherwise the taller subtree is split.
+    Trees sharing everything but k changed paths cost O(k log n).
+    """
+    # stack entries: (node, expanded); the walk's next element is on top
+    sa = [(root_a, False)] if root_a else []
+    sb = [(root_b, False)] if root_b else []
+
+    def split(stack):
+        node, _ = stack.pop()
+        if node.right:
+            stack.append((node.right, False))
+        stack.append((node, True))
+        if node.left:
+            stack.append((node.left, False))
+
+    while sa and sb:
+        a, a_done = sa[-1]
+        b, b_done = sb[-1]
+        if not a_done and not b_done:
+            if a is b:
+                sa.pop()
+                sb.pop()
+            elif a.height >= b.height:
+                split(sa)
+            else:
+                split(sb)
+        elif not a_done:
+            split(sa)
+        elif not b_done:
+            split(sb)
+        elif a.patient_id < b.patient_id:
+            sa.pop()
+            yield {"patient_id": a.patient_id, "change": "removed", "before": _row(a), "after": None}
+        elif b.patient_id < a.patient_id:
+            sb.pop()
+            yield {"patient_id": b.patient_id, "change": "added", "before": None, "after": _row(b)}
+        else:
+            sa.pop()
+            sb.pop()
+            if a is not b:
+                fields = _changed_fields(a, b)
+                if fields:
+                    yield {"patient_id": a.patient_id, "change": "changed",
+                           "before": _row(a), "after": _row(b), "fields": fields}
+    for stack, change in ((sa, "removed"), (sb, "added")):
+        while stack:
+            node, done = stack[-1]
+            if not done:
+                split(stack)
+                continue
+            stack.pop()
+            row = _row(node)
+            yield {"patient_id": node.patient_id, "change": change,
+                   "before": row if change == "removed" else None, "after": row if change == "added" else None}
+
+
+def diff_versions(records, version_a, version_b):
+    # diff_trees between two versions; given newest first, the changes come out reversed
+    if (version_a is not None and version_b is not None
+            and records.version_time(version_a) > records.version_time(version_b)):
+        for change in diff_versions(records, version_b, version_a):
+            change["change"] = {"added": "removed", "removed": "added"}.get(change["change"], change["change"])
+            change["before"], change["after"] = change["after"], change["before"]
+            yield change
+        return
+    yield from diff_trees(*version_trees(records, version_a, version_b))
+
+
+def write_jsonl(changes, out):
+    # one JSON object per line, written as the changes are produced; returns the count
+    n = 0
+    for change in changes:
+        out.write(json.dumps(change) + "\n")
+        n += 1
+    return n
+
+
+if __name__ == "__main__":
+    # python -m patient_records.version_diff <version A> [version B]   (B defaults to the newest version)
+    records = PatientRecord()
+    version_a = sys.argv[1] if len(sys.argv) > 1 else None
+    version_b = sys.argv[2] if len(sys.argv) > 2 else records.last_version
+    write_jsonl(diff_versions(records, version_a, version_b), sys.stdout)